@@ -17,7 +17,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 # 導入日誌配置
 from pathlib import Path
-import sys, os
+import sys, os, tempfile
 sys.path.insert(0, str(BASE_DIR))
 from logging_config import LOGGING
 
@@ -48,7 +48,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "employee.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "employee.query_budget.QueryBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -128,6 +130,9 @@ USE_THOUSAND_SEPARATOR = True
 STATIC_URL = "static/"
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# 匯入工作上傳的檔案，網頁與匯入工作程序（run_import_worker）須能存取同一目錄
+IMPORT_STORAGE_DIR = os.environ.get('IMPORT_STORAGE_DIR', os.path.join(BASE_DIR, 'media', 'imports'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -135,3 +140,35 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/salary/'
+
+# 每個請求的查詢預算（依 URL 名稱設定，未設定的項目沿用 default）
+# queries: 查詢次數上限；db_ms: 資料庫耗時上限（毫秒）；None 表示不限制
+QUERY_BUDGET_ENABLED = True
+QUERY_BUDGETS = {
+    'default': {'queries': 50, 'db_ms': 1000},
+    'salary_list': {'queries': 15},
+    'salary_detail': {'queries': 15},
+    'payroll_management': {'queries': 15},
+    'get_pending_leaves_api': {'queries': 10},
+    'payroll_job_status': {'queries': 10},
+    'import_session_status': {'queries': 10},
+    'health_check': {'queries': 10},
+    'metrics_api': {'queries': 2},
+    # 匯入與批次處理的查詢次數隨資料量增加，只限制資料庫耗時
+    'import_employees_api': {'queries': None, 'db_ms': 30000},
+    'import_punches_excel_api': {'queries': None, 'db_ms': 30000},
+    'bulk_punch_api': {'queries': None, 'db_ms': 10000},
+    'import_session_errors': {'queries': None, 'db_ms': 10000},
+    'salary_export': {'queries': None, 'db_ms': 10000},
+}
+
+# Prometheus 指標（/api/metrics/）
+# 各行程將指標快照寫入 METRICS_DIR，網頁與薪資工作程序須使用同一目錄才能彙總；設為空值則只輸出目前行程的指標
+# 抓取端須帶 Authorization: Bearer <METRICS_TOKEN>；未設定 METRICS_TOKEN 時只有登入的管理員可讀取
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'hrsystem_metrics'))
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# 測試期間的指標快照寫入暫存目錄
+TEST_RUNNER = 'employee.test_runner.TestRunner'
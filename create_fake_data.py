@@ -3,7 +3,9 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HRSystem.settings')
 django.setup()
 
+from django.utils import timezone
 from employee.models import Department, Employee, Salary, Punch, Leave
+from employee.punch_ingest import insert_punches
 from datetime import date, datetime, timedelta
 import random
 
@@ -113,7 +115,7 @@ def generate_punch_records():
     today = date.today()
     two_months_ago = today - timedelta(days=60)
     
-    total_records = 0
+    punches = []
     
     # 針對每位員工產生打卡記錄
     for employee in created_employees:
@@ -131,12 +133,7 @@ def generate_punch_records():
                 ).replace(hour=punch_in_hour, minute=punch_in_minute)
                 
                 # 創建上班打卡記錄
-                Punch.objects.create(
-                    employee=employee,
-                    punch_time=punch_in_time,
-                    punch_type='IN'
-                )
-                total_records += 1
+                punches.append(Punch(employee=employee, punch_time=timezone.make_aware(punch_in_time), punch_type='IN'))
                 
                 # 下班打卡時間：17:30 到 19:00 之間的隨機時間
                 punch_out_hour = random.randint(17, 18)
@@ -147,16 +144,13 @@ def generate_punch_records():
                 ).replace(hour=punch_out_hour, minute=punch_out_minute)
                 
                 # 創建下班打卡記錄
-                Punch.objects.create(
-                    employee=employee,
-                    punch_time=punch_out_time,
-                    punch_type='OUT'
-                )
-                total_records += 1
+                punches.append(Punch(employee=employee, punch_time=timezone.make_aware(punch_out_time), punch_type='OUT'))
                 
             # 前進一天
             current_date += timedelta(days=1)
     
+    # 相同員工、時間與類型的打卡已存在時不會重複寫入
+    total_records = len(insert_punches(punches))
     print(f"已為所有員工生成 {total_records} 筆打卡記錄")
 
 # 產生請假記錄
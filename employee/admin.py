@@ -1,8 +1,9 @@
 from django.contrib import admin
+from django.db.models import Count
 from .models import (
     Department, Employee, Salary, Punch, Leave, 
-    PayrollPeriod, SalaryItem, SalaryDetail, 
-    WorkSchedule, EmployeeSchedule
+    PayrollPeriod, PayrollJob, SalaryItem, SalaryDetail, 
+    WorkSchedule, EmployeeSchedule, Holiday, ImportSession
 )
 
 @admin.register(Department)
@@ -10,9 +11,13 @@ class DepartmentAdmin(admin.ModelAdmin):
     list_display = ('name', 'employee_count')
     search_fields = ('name',)
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(employee_total=Count('employee'))
+
     def employee_count(self, obj):
-        return obj.employee_set.count()
+        return obj.employee_total
     employee_count.short_description = '員工數量'
+    employee_count.admin_order_field = 'employee_total'
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
@@ -37,6 +42,20 @@ class PayrollPeriodAdmin(admin.ModelAdmin):
     date_hierarchy = 'start_date'
     ordering = ('-start_date',)
 
+@admin.register(PayrollJob)
+class PayrollJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'period', 'status', 'processed_employees', 'total_employees', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('processed_employees', 'total_employees', 'last_employee_id', 'worker', 'created_at', 'started_at', 'heartbeat_at', 'finished_at', 'error_message')
+    list_select_related = ('period', 'created_by')
+
+@admin.register(ImportSession)
+class ImportSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'original_name', 'status', 'last_row_number', 'total_rows', 'error_count', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('file', 'total_rows', 'last_row_number', 'processed_rows', 'created_count', 'updated_count', 'unchanged_count', 'error_count', 'worker', 'created_at', 'started_at', 'heartbeat_at', 'finished_at', 'error_message')
+    list_select_related = ('created_by',)
+
 @admin.register(SalaryItem)
 class SalaryItemAdmin(admin.ModelAdmin):
     list_display = ('name', 'item_type', 'is_fixed', 'amount', 'percentage', 'apply_to_parttime')
@@ -49,15 +68,22 @@ class SalaryDetailInline(admin.TabularInline):
 
 @admin.register(Salary)
 class SalaryAdmin(admin.ModelAdmin):
-    list_display = ('employee', 'period', 'base_amount', 'overtime_amount', 'total_salary', 'is_confirmed')
-    list_filter = ('is_confirmed', 'period')
+    list_display = ('employee', 'period', 'base_amount', 'overtime_amount', 'total_salary', 'is_confirmed', 'is_stale')
+    list_filter = ('is_confirmed', 'is_stale', 'period')
     search_fields = ('employee__name',)
     inlines = [SalaryDetailInline]
     
+    readonly_fields = ('gross_amount', 'total_allowances', 'total_deductions', 'net_amount')
+    
     def get_readonly_fields(self, request, obj=None):
         if obj and obj.is_confirmed:
-            return ('employee', 'period', 'base_amount', 'overtime_hours', 'overtime_amount', 'working_hours')
-        return ()
+            return ('employee', 'period', 'base_amount', 'overtime_hours', 'overtime_amount', 'working_hours') + self.readonly_fields
+        return self.readonly_fields
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # 明細可能在內嵌表單中被修改，重新彙總金額
+        form.instance.refresh_totals()
 
 @admin.register(WorkSchedule)
 class WorkScheduleAdmin(admin.ModelAdmin):
@@ -74,6 +100,13 @@ class EmployeeScheduleAdmin(admin.ModelAdmin):
     search_fields = ('employee__name', 'work_schedule__name')
     date_hierarchy = 'start_date'
 
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'name', 'kind', 'is_makeup_workday')
+    list_filter = ('kind', 'is_makeup_workday')
+    search_fields = ('name',)
+    date_hierarchy = 'date'
+
 @admin.register(Punch)
 class PunchAdmin(admin.ModelAdmin):
     list_display = ('employee', 'punch_time', 'punch_type')
@@ -0,0 +1,189 @@
+"""
+出勤資料處理
+將打卡記錄整理為可重複使用的記憶體結構，並配對為工作區間，供薪資計算使用
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Punch
+
+
+# 單一工作區間的最長時數：上班打卡超過此時數仍未下班視為缺少下班打卡
+MAX_SHIFT_HOURS = 16
+MAX_SHIFT = timedelta(hours=MAX_SHIFT_HOURS)
+
+# 工時計算以整數微秒（打卡時間的精度）為單位，最後才轉換為 Decimal 時數
+MICROSECOND = timedelta(microseconds=1)
+MICROSECONDS_PER_HOUR = 3600 * 1000000
+
+
+def duration_microseconds(delta):
+    """時間長度的整數微秒數（timedelta 以微秒儲存，轉換沒有誤差）"""
+    return delta // MICROSECOND
+
+
+def hours_to_microseconds(hours):
+    """時數轉換為整數微秒數"""
+    return int(Decimal(str(hours)) * MICROSECONDS_PER_HOUR)
+
+
+def microseconds_to_hours(microseconds):
+    """整數微秒數轉換為 Decimal 時數（不捨入）"""
+    return Decimal(microseconds) / MICROSECONDS_PER_HOUR
+
+
+def period_datetime_range(period):
+    """
+    將薪資期間轉換為目前時區的 [開始, 結束) 時間範圍
+
+    與 punch_time__date__range 的結果相同，但可使用 punch_time 索引。
+    """
+    tz = timezone.get_current_timezone()
+    range_start = timezone.make_aware(datetime.combine(period.start_date, time.min), tz)
+    range_end = timezone.make_aware(
+        datetime.combine(period.end_date + timedelta(days=1), time.min), tz
+    )
+    return range_start, range_end
+
+
+def pair_punches(punches, max_shift=MAX_SHIFT, dropped=None):
+    """
+    將依時間排序的打卡記錄配對為工作區間
+
+    以單次走訪的狀態機處理，時間複雜度為 O(n)：
+    - 上班後再次上班（未超過最長時數）視為重複打卡，保留最早一筆
+    - 上班超過最長時數仍未下班，視為缺少下班打卡，該筆上班捨棄
+    - 沒有對應上班的下班打卡（含區間結束後的重複下班打卡）捨棄，不延長已結束的區間
+    - 下班時間可跨日（夜班），一天內可有多個區間（分段班）
+
+    Args:
+        punches: 依時間排序的 (打卡時間, 打卡類型) 序列
+        max_shift: 單一工作區間的最長時間
+        dropped: 列表，提供時附加未用於工作區間的 (打卡時間, 打卡類型, 原因)
+
+    Returns:
+        list: [開始時間, 結束時間] 的列表
+    """
+    def drop(punch_time, punch_type, reason):
+        if dropped is not None:
+            dropped.append((punch_time, punch_type, reason))
+
+    intervals = []
+    open_in = None
+    for punch_time, punch_type in punches:
+        if punch_type == 'IN':
+            if open_in is not None:
+                if punch_time - open_in <= max_shift:
+                    drop(punch_time, punch_type, '重複上班打卡')
+                    continue
+                drop(open_in, 'IN', '缺少下班打卡')
+            open_in = punch_time
+        elif punch_type == 'OUT':
+            if open_in is None:
+                drop(punch_time, punch_type, '缺少上班打卡')
+            elif punch_time - open_in <= max_shift:
+                intervals.append([open_in, punch_time])
+                open_in = None
+            else:
+                drop(open_in, 'IN', '缺少下班打卡')
+                drop(punch_time, punch_type, '缺少上班打卡')
+                open_in = None
+    if open_in is not None:
+        drop(open_in, 'IN', '缺少下班打卡')
+    return intervals
+
+
+class PunchTimeline:
+    """
+    員工於薪資期間內依時間排序的打卡記錄
+
+    打卡記錄只查詢一次，配對後依上班打卡的日期歸屬工作日（跨日夜班歸屬上班當日），
+    工作時數與加班計算共用同一份結果。
+    """
+
+    def __init__(self, punches=None, start_date=None, end_date=None):
+        """
+        Args:
+            punches: 依時間排序的 (打卡時間, 打卡類型) 列表
+            start_date, end_date: 只回傳此區間內的工作日，None 表示不限
+        """
+        self.punches = punches or []
+        self.start_date = start_date
+        self.end_date = end_date
+
+    @classmethod
+    def for_employee(cls, employee, period):
+        """以單一查詢建立員工的打卡時間軸"""
+        timelines = cls.for_employees(period, employee_ids=[employee.id])
+        return timelines.get(employee.id, cls(start_date=period.start_date, end_date=period.end_date))
+
+    @classmethod
+    def for_employees(cls, period, employees=None, employee_ids=None):
+        """
+        以單一查詢建立多位員工的打卡時間軸
+
+        期間最後一天開始的跨日班別，其下班打卡落在期間之後，因此會多載入最長班別時數的打卡。
+
+        Args:
+            period: 薪資期間物件
+            employees: 員工 QuerySet（以子查詢篩選）
+            employee_ids: 員工 ID 列表，適用於少量員工
+
+        Returns:
+            dict: {員工 ID: PunchTimeline}
+        """
+        range_start, range_end = period_datetime_range(period)
+        punches = Punch.objects.filter(
+            punch_time__gte=range_start, punch_time__lt=range_end + MAX_SHIFT
+        )
+        if employees is not None:
+            punches = punches.filter(employee__in=employees)
+        if employee_ids is not None:
+            punches = punches.filter(employee_id__in=employee_ids)
+        punches = punches.order_by('employee_id', 'punch_time', 'id').values_list(
+            'employee_id', 'punch_time', 'punch_type'
+        )
+        return cls.group(punches, period.start_date, period.end_date)
+
+    @classmethod
+    def group(cls, punches, start_date=None, end_date=None):
+        """
+        將依 (員工, 時間) 排序的打卡記錄分組為各員工的時間軸
+
+        Args:
+            punches: (員工 ID, 打卡時間, 打卡類型) 序列
+
+        Returns:
+            dict: {員工 ID: PunchTimeline}
+        """
+        grouped = defaultdict(list)
+        for employee_id, punch_time, punch_type in punches:
+            grouped[employee_id].append((punch_time, punch_type))
+        return {
+            employee_id: cls(employee_punches, start_date, end_date)
+            for employee_id, employee_punches in grouped.items()
+        }
+
+    def intervals(self):
+        """配對後的工作區間"""
+        return pair_punches(self.punches)
+
+    def days(self):
+        """
+        依日期排序的 (工作日, 當日工作區間) 列表
+
+        工作日為上班打卡的當地日期，只包含有工作區間的日期。
+        """
+        tz = timezone.get_current_timezone()
+        work_days = defaultdict(list)
+        for start, end in self.intervals():
+            work_date = start.astimezone(tz).date()
+            if self.start_date is not None and work_date < self.start_date:
+                continue
+            if self.end_date is not None and work_date > self.end_date:
+                continue
+            work_days[work_date].append((start, end))
+        return sorted(work_days.items())
@@ -0,0 +1,279 @@
+"""
+向量化出勤計算核心（選用，需安裝 numpy）
+以陣列運算一次計算多位員工的每日工時、午休扣除、加班時數與加班費，
+適用於全公司試算與情境模擬；金額僅在最後四捨五入時轉回 Decimal。
+
+浮點運算的結果與逐日 Decimal 計算可能相差最後一位，因此薪資處理一律使用逐日計算，
+本模組不接入薪資處理流程，只供試算及 check_attendance_kernel 指令比對。
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import numpy as np
+except ImportError:  # numpy 為選用套件
+    np = None
+
+from .attendance import PunchTimeline
+from .holidays import refresh_holiday_cache
+from .models import AMOUNT_QUANTUM, HOURS_QUANTUM, Employee
+from .schedules import EMPTY_SCHEDULE_INDEX, ScheduleResolver
+
+
+def is_available():
+    """是否可使用向量化計算（已安裝 numpy）"""
+    return np is not None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('向量化出勤計算需要安裝 numpy（pip install numpy）')
+
+
+def _to_decimal(value, quantum):
+    """將浮點數結果四捨五入為 Decimal"""
+    return Decimal(repr(float(value))).quantize(quantum, rounding=ROUND_HALF_UP)
+
+
+class AttendanceArrays:
+    """
+    向量化計算的輸入陣列
+
+    每日陣列的每個元素代表一位員工的一個工作日；工作區間陣列的每個元素為一個
+    已配對的工作區間（UNIX 秒數），以 interval_day 對應所屬工作日。
+    班別相關欄位於當日未指派班別或班別未設定休息時段時為 NaN。
+    """
+
+    def __init__(self, employee_ids, employee_index, is_holiday, hourly_rates,
+                 interval_day, interval_start, interval_end,
+                 standard_hours=None, break_start=None, break_end=None):
+        self.employee_ids = employee_ids      # 員工 ID 列表，對應 employee_index
+        self.employee_index = employee_index  # 每日所屬員工的索引
+        self.is_holiday = is_holiday
+        self.hourly_rates = hourly_rates      # 每位員工的加班計算時薪
+        self.interval_day = interval_day      # 每個工作區間所屬工作日的索引
+        self.interval_start = interval_start
+        self.interval_end = interval_end
+        nan = np.full(len(employee_index), np.nan)
+        self.standard_hours = nan if standard_hours is None else standard_hours  # 當日班別標準工時
+        self.break_start = nan if break_start is None else break_start            # 當日班別休息時段
+        self.break_end = nan if break_end is None else break_end
+
+    @classmethod
+    def from_timelines(cls, service, employees, timelines, schedules=None):
+        """
+        由打卡時間軸建立輸入陣列
+
+        Args:
+            service: SalaryCalculationService 物件（提供時薪與假日判斷）
+            employees: 員工列表
+            timelines: {員工 ID: PunchTimeline}
+            schedules: {員工 ID: EmployeeScheduleIndex}，None 表示皆未指派班別
+        """
+        _require_numpy()
+        schedules = schedules or {}
+        employee_ids = []
+        hourly_rates = []
+        employee_index = []
+        standard_hours = []
+        break_start = []
+        break_end = []
+        work_dates = []
+        interval_day = []
+        interval_start = []
+        interval_end = []
+
+        for index, employee in enumerate(employees):
+            employee_ids.append(employee.id)
+            hourly_rates.append(float(service._get_hourly_rate(employee)))
+            timeline = timelines.get(employee.id) or PunchTimeline()
+            schedule = schedules.get(employee.id, EMPTY_SCHEDULE_INDEX)
+            for work_date, intervals in timeline.days():
+                day = len(work_dates)
+                for start, end in intervals:
+                    interval_day.append(day)
+                    interval_start.append(start.timestamp())
+                    interval_end.append(end.timestamp())
+                employee_index.append(index)
+                work_dates.append(work_date)
+
+                shift = schedule.shift_on(work_date)
+                window = shift.break_window(work_date) if shift is not None else None
+                standard_hours.append(float(shift.standard_hours) if shift is not None else np.nan)
+                break_start.append(window[0].timestamp() if window else np.nan)
+                break_end.append(window[1].timestamp() if window else np.nan)
+
+        # 假日判斷只對不重複的日期執行一次
+        holiday_flags = {work_date: service._is_holiday(work_date) for work_date in set(work_dates)}
+
+        return cls(
+            employee_ids=employee_ids,
+            employee_index=np.asarray(employee_index, dtype=np.int64),
+            is_holiday=np.asarray([holiday_flags[d] for d in work_dates], dtype=bool),
+            hourly_rates=np.asarray(hourly_rates, dtype=np.float64),
+            interval_day=np.asarray(interval_day, dtype=np.int64),
+            interval_start=np.asarray(interval_start, dtype=np.float64),
+            interval_end=np.asarray(interval_end, dtype=np.float64),
+            standard_hours=np.asarray(standard_hours, dtype=np.float64),
+            break_start=np.asarray(break_start, dtype=np.float64),
+            break_end=np.asarray(break_end, dtype=np.float64),
+        )
+
+
+class AttendanceKernel:
+    """
+    向量化出勤計算
+
+    規則與 SalaryCalculationService._calculate_daily_microseconds / _get_overtime_rate 相同，
+    可覆寫參數進行情境模擬；standard_hours 與午休參數用於未指派班別的日期。
+    """
+
+    def __init__(self, standard_hours=8, overtime_rate=1.33, holiday_rate=2.0,
+                 lunch_threshold_hours=5, lunch_hours=1):
+        _require_numpy()
+        self.standard_hours = float(standard_hours)
+        self.overtime_rate = float(overtime_rate)
+        self.holiday_rate = float(holiday_rate)
+        self.lunch_threshold_hours = float(lunch_threshold_hours)
+        self.lunch_hours = float(lunch_hours)
+
+    @classmethod
+    def from_service(cls, service):
+        """使用薪資計算服務目前的設定"""
+        return cls(
+            standard_hours=service.standard_hours,
+            overtime_rate=service.overtime_rate,
+            holiday_rate=service.holiday_rate,
+        )
+
+    def daily(self, arrays):
+        """
+        計算每日工時
+
+        Returns:
+            tuple: (每日工作時數, 每日加班時數, 每日加班費) 三個 float 陣列
+        """
+        # 各工作區間的時數
+        day = arrays.interval_day
+        seconds = arrays.interval_end - arrays.interval_start
+
+        # 班別設定休息時段：扣除與休息時段重疊的時間
+        has_break_window = ~np.isnan(arrays.break_start[day])
+        with np.errstate(invalid='ignore'):
+            overlap = (
+                np.minimum(arrays.interval_end, arrays.break_end[day])
+                - np.maximum(arrays.interval_start, arrays.break_start[day])
+            )
+        overlap = np.where(has_break_window, np.clip(np.nan_to_num(overlap), 0.0, None), 0.0)
+        interval_hours = (seconds - overlap) / 3600.0
+
+        # 未設定休息時段：連續工作超過門檻才扣午休
+        interval_hours = np.where(
+            ~has_break_window & (interval_hours > self.lunch_threshold_hours),
+            interval_hours - self.lunch_hours,
+            interval_hours,
+        )
+
+        # 加總為每日工時
+        hours = np.bincount(day, weights=interval_hours, minlength=len(arrays.employee_index))
+
+        standard_hours = np.where(
+            np.isnan(arrays.standard_hours), self.standard_hours, arrays.standard_hours
+        )
+        working_hours = np.minimum(hours, standard_hours)
+        overtime_hours = np.maximum(hours - standard_hours, 0.0)
+
+        multiplier = np.where(arrays.is_holiday, self.holiday_rate, self.overtime_rate)
+        overtime_amount = (
+            overtime_hours * arrays.hourly_rates[arrays.employee_index] * multiplier
+        )
+        return working_hours, overtime_hours, overtime_amount
+
+    def totals(self, arrays):
+        """
+        計算每位員工的期間合計
+
+        Returns:
+            dict: {員工 ID: (工作時數, 加班時數, 加班費)}，皆為四捨五入後的 Decimal
+        """
+        working_hours, overtime_hours, overtime_amount = self.daily(arrays)
+        count = len(arrays.employee_ids)
+        sums = [
+            np.bincount(arrays.employee_index, weights=values, minlength=count)
+            for values in (working_hours, overtime_hours, overtime_amount)
+        ]
+        return {
+            employee_id: (
+                _to_decimal(sums[0][index], HOURS_QUANTUM),
+                _to_decimal(sums[1][index], HOURS_QUANTUM),
+                _to_decimal(sums[2][index], AMOUNT_QUANTUM),
+            )
+            for index, employee_id in enumerate(arrays.employee_ids)
+        }
+
+
+def compute_period_totals(service, period, employees=None, kernel=None):
+    """
+    以向量化核心計算期間內員工的工時與加班費
+
+    Args:
+        service: SalaryCalculationService 物件
+        period: 薪資期間物件
+        employees: 員工 QuerySet，預設為所有在職員工
+        kernel: AttendanceKernel，預設使用服務目前的設定
+
+    Returns:
+        dict: {員工 ID: (工作時數, 加班時數, 加班費)}
+    """
+    refresh_holiday_cache()
+    if employees is None:
+        employees = Employee.objects.filter(active=True)
+    employees = employees.order_by('id')
+    if kernel is None:
+        kernel = AttendanceKernel.from_service(service)
+
+    timelines = PunchTimeline.for_employees(period, employees)
+    schedules = ScheduleResolver.for_employees(period, employees)
+    arrays = AttendanceArrays.from_timelines(service, list(employees), timelines, schedules)
+    return kernel.totals(arrays)
+
+
+def cross_check(service, period, employees=None):
+    """
+    與逐日 Decimal 計算結果比對
+
+    兩者皆四捨五入至儲存精度後比較，允許最後一位差 1（浮點與 Decimal 的捨入差異）。
+
+    Returns:
+        list: 不一致的 (員工 ID, 向量化結果, 逐日計算結果)
+    """
+    refresh_holiday_cache()
+    if employees is None:
+        employees = Employee.objects.filter(active=True)
+    employees = employees.order_by('id')
+
+    timelines = PunchTimeline.for_employees(period, employees)
+    schedules = ScheduleResolver.for_employees(period, employees)
+    employees = list(employees)
+    arrays = AttendanceArrays.from_timelines(service, employees, timelines, schedules)
+    vectorized = AttendanceKernel.from_service(service).totals(arrays)
+
+    mismatches = []
+    for employee in employees:
+        scalar = service._calculate_work_hours_and_overtime(
+            employee,
+            period,
+            timelines.get(employee.id) or PunchTimeline(),
+            schedules.get(employee.id, EMPTY_SCHEDULE_INDEX),
+        )
+        scalar = (
+            scalar[0].quantize(HOURS_QUANTUM, rounding=ROUND_HALF_UP),
+            scalar[1].quantize(HOURS_QUANTUM, rounding=ROUND_HALF_UP),
+            scalar[2].quantize(AMOUNT_QUANTUM, rounding=ROUND_HALF_UP),
+        )
+        tolerances = (HOURS_QUANTUM, HOURS_QUANTUM, AMOUNT_QUANTUM)
+        if any(
+            abs(v - s) > tolerance
+            for v, s, tolerance in zip(vectorized[employee.id], scalar, tolerances)
+        ):
+            mismatches.append((employee.id, vectorized[employee.id], scalar))
+    return mismatches
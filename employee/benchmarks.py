@@ -0,0 +1,287 @@
+"""
+薪資效能基準測試
+以固定亂數種子產生合成公司資料（員工、打卡、請假與班別），
+量測薪資處理、薪資列表、薪資匯出與打卡匯入的耗時、查詢次數及記憶體峰值
+"""
+import io
+import random
+import time
+import tracemalloc
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+import openpyxl
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Department, Employee, EmployeeSchedule, Leave, PayrollPeriod, Punch, WorkSchedule
+)
+from .services import SalaryCalculationService
+
+
+# 預設的公司規模（員工數）
+BENCHMARK_SIZES = (100, 1000, 10000)
+
+# 合成資料的最後一天固定，結果不受執行日期影響
+BENCHMARK_END_DATE = date(2025, 12, 31)
+
+# 合成資料每批寫入的筆數
+SYNTHETIC_BATCH_SIZE = 5000
+
+BENCHMARK_USERNAME = 'benchmark'
+
+
+def build_synthetic_company(employee_count, days=365, seed=1, end_date=BENCHMARK_END_DATE):
+    """
+    產生合成公司資料
+
+    相同的員工數、天數與種子產生完全相同的資料：約三分之一為兼職員工，
+    平日打卡（含少量缺少下班打卡及重複上班打卡），每人每年數筆請假，
+    五分之一的員工指派有休息時段的固定班。
+
+    Args:
+        employee_count: 員工數
+        days: 產生打卡記錄的天數（至 end_date 為止）
+        seed: 亂數種子
+        end_date: 資料的最後一天
+
+    Returns:
+        PayrollPeriod: end_date 所在月份的薪資期間
+    """
+    rnd = random.Random(seed)
+    tz = timezone.get_current_timezone()
+    start_date = end_date - timedelta(days=days - 1)
+
+    SalaryCalculationService().create_default_salary_items()
+    departments = Department.objects.bulk_create([
+        Department(name=name) for name in ('研發', '業務', '營運', '財務', '人資')
+    ])
+    regular_shift = WorkSchedule.objects.create(
+        name='固定班（基準測試）',
+        schedule_type='REGULAR',
+        start_time=dt_time(9, 0),
+        end_time=dt_time(18, 0),
+        break_start=dt_time(12, 0),
+        break_end=dt_time(13, 0),
+    )
+
+    employees = []
+    for index in range(employee_count):
+        full_time = index % 3 != 0
+        employees.append(Employee(
+            employee_id=f'B{index:06d}',
+            name=f'基準員工{index}',
+            department=departments[index % len(departments)],
+            hire_date=start_date,
+            employment_type='FT' if full_time else 'PT',
+            base_salary=Decimal(rnd.choice(['32000', '45000.50', '51234', '68000'])) if full_time else None,
+            hourly_rate=None if full_time else Decimal(rnd.choice(['183', '200.5', '215'])),
+        ))
+    employees = Employee.objects.bulk_create(employees, batch_size=SYNTHETIC_BATCH_SIZE)
+    if employees[0].pk is None:
+        # 資料庫不回傳主鍵時重新讀取
+        employees = list(Employee.objects.filter(employee_id__startswith='B').order_by('id'))
+
+    EmployeeSchedule.objects.bulk_create([
+        EmployeeSchedule(employee=employee, work_schedule=regular_shift, start_date=start_date)
+        for employee in employees[::5]
+    ], batch_size=SYNTHETIC_BATCH_SIZE)
+
+    punches = []
+    leaves = []
+    for employee in employees:
+        for offset in range(days):
+            work_date = start_date + timedelta(days=offset)
+            if work_date.weekday() >= 5 or rnd.random() < 0.05:
+                continue
+            punch_in = timezone.make_aware(datetime.combine(work_date, dt_time(8)), tz) + timedelta(
+                minutes=rnd.randint(0, 120), seconds=rnd.randint(0, 59)
+            )
+            punches.append(Punch(employee=employee, punch_time=punch_in, punch_type='IN'))
+            if rnd.random() < 0.02:
+                punches.append(Punch(
+                    employee=employee, punch_time=punch_in + timedelta(minutes=2), punch_type='IN'
+                ))
+            if rnd.random() < 0.97:
+                punches.append(Punch(
+                    employee=employee,
+                    punch_time=punch_in + timedelta(minutes=rnd.randint(480, 660)),
+                    punch_type='OUT',
+                ))
+
+        for _ in range(max(1, days // 120)):
+            leave_start = start_date + timedelta(days=rnd.randint(0, days - 1))
+            leaves.append(Leave(
+                employee=employee,
+                leave_type=rnd.choice(['PERSONAL', 'SICK', 'ANNUAL']),
+                start_date=leave_start,
+                end_date=leave_start + timedelta(days=rnd.randint(0, 3)),
+                status=rnd.choice(['APPROVED', 'APPROVED', 'APPROVED', 'PENDING']),
+            ))
+
+        if len(punches) >= SYNTHETIC_BATCH_SIZE:
+            Punch.objects.bulk_create(punches, batch_size=SYNTHETIC_BATCH_SIZE)
+            punches = []
+    Punch.objects.bulk_create(punches, batch_size=SYNTHETIC_BATCH_SIZE)
+    Leave.objects.bulk_create(leaves, batch_size=SYNTHETIC_BATCH_SIZE)
+
+    period_start = end_date.replace(day=1)
+    return PayrollPeriod.objects.create(
+        start_date=period_start,
+        end_date=end_date,
+        pay_date=end_date + timedelta(days=5),
+    )
+
+
+def build_punch_workbook(employee_ids, rows, start_date, seed=1):
+    """
+    產生打卡匯入用的 Excel 檔案內容
+
+    Args:
+        employee_ids: 可使用的員工編號
+        rows: 打卡筆數
+        start_date: 打卡記錄的第一天
+
+    Returns:
+        bytes: xlsx 檔案內容
+    """
+    rnd = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['employee_id', 'punch_type', 'punch_time'])
+    for index in range(rows):
+        punch_time = datetime.combine(
+            start_date + timedelta(days=index // (2 * len(employee_ids))), dt_time(8)
+        ) + timedelta(minutes=rnd.randint(0, 600))
+        sheet.append([
+            employee_ids[(index // 2) % len(employee_ids)],
+            'IN' if index % 2 == 0 else 'OUT',
+            punch_time.strftime('%Y-%m-%d %H:%M:%S'),
+        ])
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def measure(operation, func, trace_memory=True):
+    """
+    量測單一操作
+
+    Args:
+        operation: 操作名稱
+        func: 不需參數的函式，回傳 (處理筆數, 狀態說明)
+        trace_memory: 是否以 tracemalloc 記錄記憶體峰值（會使耗時略為增加）
+
+    Returns:
+        dict: 操作名稱、耗時、查詢次數、資料庫耗時、記憶體峰值、處理筆數及狀態
+    """
+    # 以 execute_wrapper 計數；CaptureQueriesContext 最多只保留 9000 筆查詢
+    queries = {'count': 0, 'seconds': 0.0}
+
+    def count_query(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries['seconds'] += time.perf_counter() - started
+            queries['count'] += 1
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with connection.execute_wrapper(count_query):
+            started = time.perf_counter()
+            rows, status = func()
+            seconds = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    return {
+        'operation': operation,
+        'seconds': round(seconds, 4),
+        'queries': queries['count'],
+        'db_seconds': round(queries['seconds'], 4),
+        'peak_memory_kb': round(peak_memory / 1024) if peak_memory is not None else None,
+        'rows': rows,
+        'status': status,
+    }
+
+
+def _response_status(response, content_type):
+    """檢查回應是否成功，JSON 錯誤回應會附上錯誤訊息"""
+    if response.status_code != 200:
+        return f'HTTP {response.status_code}'
+    if not response['Content-Type'].startswith(content_type):
+        if response['Content-Type'].startswith('application/json'):
+            return f"error: {response.json().get('message', '')}"
+        return f"unexpected {response['Content-Type']}"
+    if content_type == 'application/json' and response.json().get('status') != 'success':
+        return f"error: {response.json().get('message', '')}"
+    return 'ok'
+
+
+def run_benchmark(employee_count, days=365, seed=1, workers=1, import_rows=5000, trace_memory=True):
+    """
+    在目前的資料庫（應為空的測試資料庫）中產生合成公司並量測各項操作
+
+    Returns:
+        list: measure() 的結果，每筆加上員工數
+    """
+    results = []
+    company = {}
+
+    def generate():
+        company['period'] = build_synthetic_company(employee_count, days=days, seed=seed)
+        return Punch.objects.count(), 'ok'
+
+    results.append(measure('generate', generate, trace_memory=False))
+    period = company['period']
+
+    user = get_user_model().objects.create_user(BENCHMARK_USERNAME, is_staff=True)
+    client = Client()
+    client.force_login(user)
+
+    def process_payroll():
+        service = SalaryCalculationService()
+        return service.process_payroll_for_period(period, workers=workers), 'ok'
+
+    def salary_list():
+        response = client.get(reverse('salary_list'), {'period': period.id})
+        return len(response.context['salaries']), _response_status(response, 'text/html')
+
+    def salary_export():
+        response = client.get(reverse('salary_export'), {'period': period.id})
+        return response.content.count(b'\n') - 1, _response_status(response, 'text/csv')
+
+    # 匯入的打卡落在合成資料之後，不影響已計算的薪資
+    workbook = build_punch_workbook(
+        list(Employee.objects.order_by('id').values_list('employee_id', flat=True)[:1000]),
+        import_rows,
+        period.end_date + timedelta(days=1),
+        seed=seed,
+    )
+
+    def import_punches():
+        response = client.post(reverse('import_punches_excel_api'), {
+            'file': SimpleUploadedFile('punches.xlsx', workbook),
+        })
+        return import_rows, _response_status(response, 'application/json')
+
+    for operation, func in (
+        ('process_payroll', process_payroll),
+        ('salary_list', salary_list),
+        ('salary_export', salary_export),
+        ('import_punches_excel', import_punches),
+    ):
+        results.append(measure(operation, func, trace_memory=trace_memory))
+
+    for result in results:
+        result['employees'] = employee_count
+    return results
@@ -0,0 +1,267 @@
+"""
+員工資料批次匯入
+先解析整個 CSV/Excel 檔案，部門一次查詢並批次建立，員工依識別欄位與既有資料比對後
+分為新增、更新與未變動，於單一交易中以 bulk_create/bulk_update 分批寫入；
+網頁匯入與 import_employees 指令共用
+"""
+import csv
+import io
+import time
+from datetime import date, datetime
+
+import openpyxl
+from django.db import transaction
+
+from .models import Department, Employee
+from .punch_ingest import employee_code
+
+
+# 檔案中的欄位；department_name 對應至部門
+EMPLOYEE_IMPORT_FIELDS = ['employee_id', 'name', 'email', 'phone', 'department_name', 'hire_date']
+
+# 比對與寫入的員工欄位（識別欄位本身不更新）
+EMPLOYEE_UPDATE_FIELDS = ['employee_id', 'name', 'email', 'phone', 'department', 'hire_date']
+
+# 可用於比對既有員工的識別欄位
+EMPLOYEE_KEY_FIELDS = ('employee_id', 'email')
+
+# 每批查詢或寫入的筆數
+EMPLOYEE_BATCH_SIZE = 1000
+
+# 回應中列出的錯誤訊息上限，超過的只計入錯誤筆數
+MAX_REPORTED_ERRORS = 100
+
+
+class EmployeeImportError(ValueError):
+    """匯入檔案無法處理（如格式不符或缺少必要欄位）"""
+
+
+def required_fields(key_field='employee_id'):
+    """必要欄位：識別欄位及 employee_id 以外的所有欄位"""
+    return [
+        field for field in EMPLOYEE_IMPORT_FIELDS
+        if field != 'employee_id' or key_field == 'employee_id'
+    ]
+
+
+def read_employee_file(uploaded_file, file_name, key_field='employee_id'):
+    """
+    逐列讀取員工資料檔案
+
+    Args:
+        uploaded_file: 檔案物件（CSV 為 UTF-8 編碼，可帶 BOM）
+        file_name: 檔案名稱，依副檔名判斷格式（.csv 或 .xlsx）
+        key_field: 識別欄位，用於檢查必要欄位
+
+    Yields:
+        tuple: (列號, {欄位名稱: 值})，列號與試算表中的列號相同
+    """
+    extension = file_name.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        rows = csv.reader(io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline=''))
+        workbook = None
+    elif extension == 'xlsx':
+        workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+    else:
+        raise EmployeeImportError('請上傳有效的 CSV 或 Excel 檔案 (.csv, .xlsx)。')
+
+    try:
+        headers = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+        missing = [field for field in required_fields(key_field) if field not in headers]
+        if missing:
+            raise EmployeeImportError(f'檔案缺少必要的欄位: {", ".join(missing)}')
+
+        for row_number, row in enumerate(rows, start=2):
+            if not any(value not in (None, '') for value in row):
+                continue  # 空白列
+            yield row_number, {
+                header: row[index] if index < len(row) else None
+                for index, header in enumerate(headers) if header
+            }
+    finally:
+        if workbook is not None:
+            workbook.close()
+
+
+def parse_employee_row(row, key_field='employee_id'):
+    """
+    驗證並轉換單列員工資料
+
+    Returns:
+        dict: 員工欄位值（部門以 department_name 表示）
+    """
+    for field in required_fields(key_field):
+        if row.get(field) is None:
+            raise KeyError(field)
+
+    hire_date = row['hire_date']
+    if isinstance(hire_date, datetime):
+        # Excel 日期儲存格讀取為 datetime
+        hire_date = hire_date.date()
+    elif not isinstance(hire_date, date):
+        hire_date = datetime.strptime(str(hire_date).strip(), '%Y-%m-%d').date()
+
+    values = {
+        'name': str(row['name']).strip(),
+        'email': str(row['email']).strip(),
+        'phone': employee_code(row['phone']),
+        'department_name': str(row['department_name']).strip(),
+        'hire_date': hire_date,
+    }
+    if row.get('employee_id') not in (None, ''):
+        values['employee_id'] = employee_code(row['employee_id'])
+    if not values.get(key_field):
+        raise KeyError(key_field)
+    return values
+
+
+def resolve_departments(names):
+    """
+    依名稱取得部門，不存在的部門批次建立（同名部門有多筆時使用最早建立者）
+
+    Returns:
+        dict: {部門名稱: 部門}
+    """
+    names = set(names)
+    departments = {}
+    for department in Department.objects.filter(name__in=names).order_by('-id'):
+        departments[department.name] = department
+
+    missing = sorted(names - set(departments))
+    if missing:
+        created = Department.objects.bulk_create([Department(name=name) for name in missing])
+        if any(department.pk is None for department in created):
+            # 資料庫不回傳主鍵時重新查詢
+            created = Department.objects.filter(name__in=missing).order_by('-id')
+        for department in created:
+            departments[department.name] = department
+    return departments
+
+
+def import_employees(rows, key_field='employee_id', batch_size=EMPLOYEE_BATCH_SIZE, error_rows=None):
+    """
+    批次匯入員工資料
+
+    先解析所有資料列，再以識別欄位比對既有員工：不存在者新增，欄位有變動者更新，其餘不寫入。
+    同一識別值在檔案中出現多次時以最後一列為準。無效的列略過並記錄錯誤，其餘照常寫入。
+    匯入欄位不含薪資相關欄位，bulk_update 不觸發 signal 也不影響薪資計算。
+
+    Args:
+        rows: (列號, {欄位名稱: 值}) 的序列，如 read_employee_file() 的結果
+        key_field: 比對既有員工的欄位（employee_id 或 email）
+        batch_size: 每批查詢或寫入的筆數
+        error_rows: 列表，提供時附加所有錯誤的 (列號, 訊息)，不受 MAX_REPORTED_ERRORS 限制
+
+    Returns:
+        dict: 讀取列數、新增、更新、未變動、重複及錯誤筆數、錯誤訊息（最多 MAX_REPORTED_ERRORS 筆）、
+              耗時及每秒處理列數
+    """
+    if key_field not in EMPLOYEE_KEY_FIELDS:
+        raise ValueError(f'識別欄位必須為 {"、".join(EMPLOYEE_KEY_FIELDS)}')
+
+    started = time.perf_counter()
+    stats = {
+        'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0,
+        'error_count': 0, 'errors': [],
+    }
+
+    def add_error(row_number, message):
+        stats['error_count'] += 1
+        if len(stats['errors']) < MAX_REPORTED_ERRORS:
+            stats['errors'].append(f'第 {row_number} 行錯誤: {message}')
+        if error_rows is not None:
+            error_rows.append((row_number, message))
+
+    # 解析階段：不查詢資料庫
+    records = {}
+    for row_number, row in rows:
+        stats['rows'] += 1
+        try:
+            values = parse_employee_row(row, key_field)
+        except KeyError as e:
+            add_error(row_number, f'缺少欄位 {e.args[0]}')
+            continue
+        except ValueError as e:
+            add_error(row_number, f'日期格式不正確或資料無效 - {e}')
+            continue
+        if values[key_field] in records:
+            stats['duplicates'] += 1
+        records[values[key_field]] = (row_number, values)
+
+    departments = resolve_departments(values['department_name'] for _, values in records.values())
+
+    keys = list(records)
+    existing = {}
+    ambiguous = set()
+    for start in range(0, len(keys), batch_size):
+        for employee in Employee.objects.filter(**{f'{key_field}__in': keys[start:start + batch_size]}):
+            key = getattr(employee, key_field)
+            if key in existing:
+                ambiguous.add(key)
+            existing[key] = employee
+
+    # 以電子郵件比對時，檔案中的員工編號不可已屬於其他員工（員工編號唯一）
+    code_owners = {}
+    if key_field != 'employee_id':
+        codes = [values['employee_id'] for _, values in records.values() if 'employee_id' in values]
+        for start in range(0, len(codes), batch_size):
+            code_owners.update(
+                Employee.objects.filter(
+                    employee_id__in=codes[start:start + batch_size]
+                ).values_list('employee_id', 'id')
+            )
+    used_codes = set()
+
+    to_create = []
+    to_update = []
+    for key, (row_number, values) in records.items():
+        if key in ambiguous:
+            add_error(row_number, f'有多名員工的 {key_field} 為 {key}，無法判斷要更新哪一位')
+            continue
+        code = values.get('employee_id')
+        if key_field != 'employee_id' and code is not None:
+            owner = code_owners.get(code)
+            employee = existing.get(key)
+            if code in used_codes or (owner is not None and (employee is None or employee.pk != owner)):
+                add_error(row_number, f'員工編號 {code} 已屬於其他員工')
+                continue
+            used_codes.add(code)
+        fields = {
+            'name': values['name'],
+            'email': values['email'],
+            'phone': values['phone'],
+            'department': departments[values['department_name']],
+            'hire_date': values['hire_date'],
+        }
+        if 'employee_id' in values:
+            fields['employee_id'] = values['employee_id']
+
+        employee = existing.get(key)
+        if employee is None:
+            to_create.append(Employee(**fields))
+            continue
+        changed = False
+        for field, value in fields.items():
+            current = employee.department_id if field == 'department' else getattr(employee, field)
+            if (value.pk if field == 'department' else value) != current:
+                setattr(employee, field, value)
+                changed = True
+        if changed:
+            to_update.append(employee)
+        else:
+            stats['unchanged'] += 1
+
+    with transaction.atomic():
+        for start in range(0, len(to_create), batch_size):
+            Employee.objects.bulk_create(to_create[start:start + batch_size])
+        if to_update:
+            update_fields = [field for field in EMPLOYEE_UPDATE_FIELDS if field != key_field]
+            Employee.objects.bulk_update(to_update, update_fields, batch_size=batch_size)
+    stats['created'] = len(to_create)
+    stats['updated'] = len(to_update)
+
+    seconds = time.perf_counter() - started
+    stats['seconds'] = round(seconds, 3)
+    stats['rows_per_second'] = round(stats['rows'] / seconds) if seconds else None
+    return stats
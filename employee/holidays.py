@@ -0,0 +1,121 @@
+"""
+假日行事曆
+將 Holiday 資料表編譯為每年一份的假日旗標表，快取於行程內，查詢為 O(1)。
+每次計算開始時以 refresh_holiday_cache() 比對資料表版本（單一查詢），
+任何行程（web、薪資或匯入工作程序）修改假日後，其他行程的下一次計算即重新編譯。
+"""
+import threading
+from datetime import date
+
+from django.db.models import Count, Max
+
+from .metrics import record_cache
+from .models import Holiday
+
+
+# 每年固定日期的國定假日（月, 日），農曆節日與補班日請於 Holiday 資料表設定
+FIXED_NATIONAL_HOLIDAYS = [
+    (1, 1),   # 元旦
+    (2, 28),  # 和平紀念日
+    (4, 4),   # 兒童節
+    (4, 5),   # 清明節
+    (5, 1),   # 勞動節
+    (10, 10), # 國慶日
+]
+
+_calendars = {}
+_version = None  # 快取內容所對應的資料表版本
+_lock = threading.Lock()
+
+
+class HolidayCalendar:
+    """單一年度的假日旗標表，以一年中的第幾天為索引"""
+
+    def __init__(self, year, holiday_dates=(), makeup_workdates=()):
+        self.year = year
+        self._first_ordinal = date(year, 1, 1).toordinal()
+        days = date(year + 1, 1, 1).toordinal() - self._first_ordinal
+        flags = bytearray(days)
+
+        # 週六、週日
+        for offset in range(days):
+            if date.fromordinal(self._first_ordinal + offset).weekday() >= 5:
+                flags[offset] = 1
+
+        # 固定國定假日與資料表中的假日
+        for month, day in FIXED_NATIONAL_HOLIDAYS:
+            flags[date(year, month, day).toordinal() - self._first_ordinal] = 1
+        for holiday_date in holiday_dates:
+            flags[holiday_date.toordinal() - self._first_ordinal] = 1
+
+        # 補班日優先於所有假日規則
+        for workdate in makeup_workdates:
+            flags[workdate.toordinal() - self._first_ordinal] = 0
+
+        self._flags = bytes(flags)
+
+    def is_holiday(self, day):
+        """判斷指定日期是否為假日"""
+        return self._flags[day.toordinal() - self._first_ordinal] == 1
+
+    @classmethod
+    def compile(cls, year):
+        """由 Holiday 資料表編譯指定年度的行事曆（單一查詢）"""
+        holiday_dates = []
+        makeup_workdates = []
+        for holiday_date, is_makeup_workday in Holiday.objects.filter(
+            date__year=year
+        ).values_list('date', 'is_makeup_workday'):
+            if is_makeup_workday:
+                makeup_workdates.append(holiday_date)
+            else:
+                holiday_dates.append(holiday_date)
+        return cls(year, holiday_dates, makeup_workdates)
+
+
+def get_holiday_calendar(year):
+    """取得指定年度的假日行事曆，尚未編譯時才查詢"""
+    calendar = _calendars.get(year)
+    record_cache('holiday_calendar', calendar is not None)
+    if calendar is None:
+        calendar = HolidayCalendar.compile(year)
+        with _lock:
+            _calendars[year] = calendar
+    return calendar
+
+
+def is_holiday(day):
+    """判斷指定日期是否為假日"""
+    return get_holiday_calendar(day.year).is_holiday(day)
+
+
+def holiday_table_version():
+    """
+    Holiday 資料表的版本（筆數、最後更新時間）
+
+    新增或修改假日會更新最後更新時間，刪除會改變筆數。
+    """
+    version = Holiday.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+    return version['count'], version['updated_at']
+
+
+def refresh_holiday_cache():
+    """
+    比對 Holiday 資料表版本，其他行程修改過假日時清除本行程的快取
+
+    於每次薪資計算開始時呼叫一次，計算過程中的假日判斷不再查詢資料表。
+    """
+    global _version
+    version = holiday_table_version()
+    with _lock:
+        if version != _version:
+            _calendars.clear()
+            _version = version
+
+
+def invalidate_holiday_cache():
+    """清除本行程的假日行事曆快取"""
+    global _version
+    with _lock:
+        _calendars.clear()
+        _version = None
@@ -0,0 +1,350 @@
+"""
+可續傳的匯入工作
+上傳的檔案先保存至 settings.IMPORT_STORAGE_DIR 並建立 ImportSession，由 run_import_worker 指令啟動的
+工作程序逐批處理：每批的寫入、錯誤列與檢查點（最後一列列號）在同一交易中提交，
+中斷或失敗後從檢查點之後的列續跑，已提交的批次不會重複寫入。被略過的列保存於 ImportRowError，
+可下載為錯誤報表，修正後直接重新匯入。
+"""
+import csv
+import io
+import logging
+import time
+from datetime import timedelta
+
+import openpyxl
+from django.db import transaction
+from django.utils import timezone
+
+from .employee_import import (
+    EMPLOYEE_IMPORT_FIELDS, EMPLOYEE_KEY_FIELDS, EmployeeImportError, import_employees, read_employee_file
+)
+from .metrics import record_import
+from .models import ImportRowError, ImportSession
+from .payroll_jobs import worker_name
+from .punch_ingest import (
+    PUNCH_IMPORT_HEADERS, PunchImportError, import_punch_rows, load_all_employee_map, read_punch_workbook
+)
+
+
+logger = logging.getLogger(__name__)
+
+# 每批處理的列數，每批提交後記錄檢查點
+IMPORT_CHUNK_SIZE = 1000
+
+# 處理中的匯入工作超過此秒數未回報進度，視為工作程序已中止，重新排入佇列續跑
+IMPORT_STALE_SECONDS = 600
+
+# 各匯入種類接受的副檔名
+IMPORT_EXTENSIONS = {
+    'EMPLOYEES': ('csv', 'xlsx'),
+    'PUNCHES': ('xlsx',),
+}
+
+# 各匯入種類的指標名稱（與同步匯入 API 相同）
+METRIC_KINDS = {
+    'EMPLOYEES': 'employees',
+    'PUNCHES': 'punches',
+}
+
+
+class ImportSessionError(ValueError):
+    """無法建立或續跑匯入工作（如檔案格式不符或缺少必要欄位）"""
+
+
+class ImportSessionLost(Exception):
+    """匯入工作已被重新排入佇列並由其他工作程序接手"""
+
+
+def _extension(file_name):
+    return file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+
+
+def read_session_rows(session, file):
+    """
+    逐列讀取匯入工作的檔案
+
+    Yields:
+        tuple: (列號, {欄位名稱: 值})
+    """
+    if session.kind == 'EMPLOYEES':
+        return read_employee_file(file, session.original_name, key_field=session.key_field)
+    return read_punch_workbook(file)
+
+
+def count_rows(file, file_name):
+    """
+    計算檔案的資料列數（不含標題列，含空白列），用於顯示進度
+
+    Excel 檔案優先使用工作表記錄的範圍，未記錄時逐列計算。
+    """
+    if _extension(file_name) == 'csv':
+        reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+        return max(0, sum(1 for _ in reader) - 1)
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.active
+        max_row = worksheet.max_row
+        if not max_row:
+            max_row = sum(1 for _ in worksheet.iter_rows(values_only=True))
+        return max(0, max_row - 1)
+    finally:
+        workbook.close()
+
+
+def create_import_session(uploaded_file, kind, user=None, key_field='employee_id',
+                          chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    保存上傳的檔案並建立匯入工作
+
+    建立前先檢查檔案格式與必要欄位，檔案有誤時不建立工作也不保留檔案。
+
+    Args:
+        uploaded_file: 上傳的檔案
+        kind: 匯入種類（EMPLOYEES 或 PUNCHES）
+        user: 建立工作的使用者
+        key_field: 員工資料匯入時比對既有員工的欄位
+        chunk_size: 每批處理的列數
+
+    Returns:
+        ImportSession: 等待中的匯入工作
+    """
+    if kind not in IMPORT_EXTENSIONS:
+        raise ImportSessionError(f'不支援的匯入種類: {kind}')
+    extensions = IMPORT_EXTENSIONS[kind]
+    if _extension(uploaded_file.name) not in extensions:
+        raise ImportSessionError(
+            f'請上傳有效的檔案 ({", ".join(f".{extension}" for extension in extensions)})。'
+        )
+    if kind == 'EMPLOYEES' and key_field not in EMPLOYEE_KEY_FIELDS:
+        raise ImportSessionError(f'識別欄位必須為 {"、".join(EMPLOYEE_KEY_FIELDS)}')
+    if chunk_size < 1:
+        raise ImportSessionError('每批列數必須大於或等於 1')
+
+    session = ImportSession(
+        kind=kind,
+        original_name=uploaded_file.name,
+        key_field=key_field if kind == 'EMPLOYEES' else '',
+        chunk_size=chunk_size,
+        created_by=user,
+    )
+    session.file.save(uploaded_file.name, uploaded_file, save=False)
+    try:
+        with session.file.open('rb') as file:
+            rows = read_session_rows(session, file)
+            try:
+                next(rows, None)  # 讀取標題列並檢查必要欄位
+            finally:
+                rows.close()
+        with session.file.open('rb') as file:
+            session.total_rows = count_rows(file, session.original_name)
+        session.save()
+    except (EmployeeImportError, PunchImportError) as e:
+        session.file.delete(save=False)
+        raise ImportSessionError(str(e))
+    except (UnicodeDecodeError, csv.Error) as e:
+        session.file.delete(save=False)
+        raise ImportSessionError(f'無法讀取檔案，請確認為 UTF-8 編碼的 CSV: {e}')
+    except Exception:
+        session.file.delete(save=False)
+        raise
+    return session
+
+
+def resume_import_session(session):
+    """
+    將失敗的匯入工作重新排入佇列，從檢查點之後的列續跑
+
+    Returns:
+        bool: 是否已重新排入
+    """
+    if not session.file or not session.file.storage.exists(session.file.name):
+        raise ImportSessionError('匯入檔案已不存在，請重新上傳。')
+    return bool(
+        ImportSession.objects.filter(pk=session.pk, status='FAILED').update(
+            status='PENDING', worker='', error_message='', finished_at=None
+        )
+    )
+
+
+def requeue_stale_sessions(stale_seconds=IMPORT_STALE_SECONDS):
+    """
+    將停止回報進度的處理中匯入工作重新排入佇列
+
+    Returns:
+        int: 重新排入的工作數
+    """
+    return ImportSession.objects.filter(
+        status='RUNNING', heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_seconds)
+    ).update(status='PENDING', worker='')
+
+
+def claim_session(session, worker=None):
+    """
+    認領指定的等待中匯入工作並標記為處理中
+
+    Returns:
+        bool: 是否認領成功
+    """
+    now = timezone.now()
+    claimed = ImportSession.objects.filter(pk=session.pk, status='PENDING').update(
+        status='RUNNING', worker=worker or worker_name(), started_at=now, heartbeat_at=now
+    )
+    if claimed:
+        session.refresh_from_db()
+    return bool(claimed)
+
+
+def claim_next_session(worker=None):
+    """
+    取得下一個等待中的匯入工作並標記為處理中
+
+    Returns:
+        ImportSession | None: 認領到的工作，沒有等待中的工作時為 None
+    """
+    for session in ImportSession.objects.filter(status='PENDING').order_by('created_at', 'id')[:10]:
+        if claim_session(session, worker):
+            return session
+    return None
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _commit_chunk(session, chunk, employee_map):
+    """在單一交易中寫入一批資料列、錯誤列及檢查點"""
+    started = time.perf_counter()
+    error_rows = []
+    with transaction.atomic():
+        if session.kind == 'EMPLOYEES':
+            stats = import_employees(
+                chunk, key_field=session.key_field, batch_size=session.chunk_size, error_rows=error_rows
+            )
+        else:
+            stats = import_punch_rows(
+                chunk, employee_map, batch_size=session.chunk_size, error_rows=error_rows
+            )
+
+        # 打卡匯入中已存在的記錄不重複寫入，計為未變動
+        unchanged = stats['unchanged'] if session.kind == 'EMPLOYEES' else stats['duplicates']
+        rows = dict(chunk)
+        ImportRowError.objects.bulk_create([
+            ImportRowError(
+                session=session,
+                row_number=row_number,
+                message=message,
+                row_data={key: _json_value(value) for key, value in rows.get(row_number, {}).items()},
+            )
+            for row_number, message in error_rows
+        ])
+
+        session.last_row_number = chunk[-1][0]
+        session.processed_rows += stats['rows']
+        session.created_count += stats['created']
+        session.updated_count += stats.get('updated', 0)
+        session.unchanged_count += unchanged
+        session.error_count += stats['error_count']
+        # 以執行者為條件更新，工作已被其他工作程序接手時整批回復
+        if not ImportSession.objects.filter(
+            pk=session.pk, status='RUNNING', worker=session.worker
+        ).update(
+            last_row_number=session.last_row_number,
+            processed_rows=session.processed_rows,
+            created_count=session.created_count,
+            updated_count=session.updated_count,
+            unchanged_count=session.unchanged_count,
+            error_count=session.error_count,
+            heartbeat_at=timezone.now(),
+        ):
+            raise ImportSessionLost()
+
+    record_import(
+        METRIC_KINDS[session.kind], time.perf_counter() - started,
+        created=stats['created'], updated=stats.get('updated', 0),
+        unchanged=unchanged, error=stats['error_count']
+    )
+
+
+def run_import_session(session):
+    """
+    執行匯入工作
+
+    逐列讀取檔案，略過檢查點之前（已提交）的列，每累積 chunk_size 列提交一批。
+    成功完成後刪除保存的檔案；失敗時保留檔案與檢查點，可以 resume_import_session() 續跑。
+
+    Args:
+        session: 已認領（處理中）的匯入工作
+
+    Returns:
+        ImportSession: 更新後的工作
+    """
+    try:
+        employee_map = load_all_employee_map() if session.kind == 'PUNCHES' else None
+        with session.file.open('rb') as file:
+            rows = read_session_rows(session, file)
+            try:
+                chunk = []
+                for row_number, row in rows:
+                    if row_number <= session.last_row_number:
+                        continue  # 已提交的列
+                    chunk.append((row_number, row))
+                    if len(chunk) >= session.chunk_size:
+                        _commit_chunk(session, chunk, employee_map)
+                        chunk = []
+                if chunk:
+                    _commit_chunk(session, chunk, employee_map)
+            finally:
+                rows.close()
+    except ImportSessionLost:
+        logger.warning('匯入工作 %s 已由其他工作程序接手', session.pk)
+    except Exception as e:
+        logger.exception('匯入工作 %s 失敗', session.pk)
+        _finish_session(session, 'FAILED', str(e))
+    else:
+        if _finish_session(session, 'SUCCEEDED'):
+            session.file.delete(save=False)
+            ImportSession.objects.filter(pk=session.pk).update(file='')
+
+    session.refresh_from_db()
+    return session
+
+
+def _finish_session(session, status, error_message=''):
+    return ImportSession.objects.filter(pk=session.pk, worker=session.worker).update(
+        status=status,
+        error_message=error_message,
+        finished_at=timezone.now(),
+    )
+
+
+class _Echo:
+    """csv.writer 寫入時直接回傳內容，供串流回應使用"""
+
+    def write(self, value):
+        return value
+
+
+def iter_error_report(session):
+    """
+    產生匯入工作的錯誤報表（CSV，含 BOM 以便 Excel 開啟）
+
+    前面的欄位與匯入檔案相同，修正後可直接重新匯入；最後兩欄為原始列號與錯誤訊息。
+
+    Yields:
+        str: CSV 內容
+    """
+    fields = EMPLOYEE_IMPORT_FIELDS if session.kind == 'EMPLOYEES' else PUNCH_IMPORT_HEADERS
+    writer = csv.writer(_Echo())
+    yield '\ufeff'
+    yield writer.writerow(list(fields) + ['原始列號', '錯誤訊息'])
+    errors = ImportRowError.objects.filter(session=session).order_by('row_number').values_list(
+        'row_number', 'message', 'row_data'
+    )
+    for row_number, message, row_data in errors.iterator():
+        yield writer.writerow(
+            [row_data.get(field, '') if row_data.get(field) is not None else '' for field in fields]
+            + [row_number, message]
+        )
@@ -0,0 +1,75 @@
+"""
+請假扣薪計算
+以單一範圍查詢載入薪資期間內的核准請假，並以掃描線合併重疊的請假區間，
+同一天不會被重複扣薪
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from .models import Leave
+
+
+UNPAID_LEAVE_TYPES = ['PERSONAL', 'SICK']  # 需要扣薪的假別
+
+
+def load_unpaid_leaves(period, employees=None, employee_ids=None):
+    """
+    以單一查詢載入與期間重疊的核准無薪假，依員工分組
+
+    Args:
+        period: 薪資期間物件
+        employees: 員工 QuerySet（以子查詢篩選）
+        employee_ids: 員工 ID 列表，適用於少量員工
+
+    Returns:
+        dict: {員工 ID: [依開始日期排序的請假記錄]}
+    """
+    leaves = Leave.objects.filter(
+        status='APPROVED',
+        leave_type__in=UNPAID_LEAVE_TYPES,
+        start_date__lte=period.end_date,
+        end_date__gte=period.start_date,
+    )
+    if employees is not None:
+        leaves = leaves.filter(employee__in=employees)
+    if employee_ids is not None:
+        leaves = leaves.filter(employee_id__in=employee_ids)
+
+    grouped = defaultdict(list)
+    for leave in leaves.order_by('employee_id', 'start_date', 'id'):
+        grouped[leave.employee_id].append(leave)
+    return grouped
+
+
+def sweep_unpaid_days(leaves, period):
+    """
+    計算期間內的無薪假天數
+
+    請假依開始日期掃描，只計入尚未被前面請假涵蓋的日期，
+    重疊或重複的請假記錄不會重複扣薪。
+
+    Args:
+        leaves: 請假記錄（非無薪假的假別會略過）
+        period: 薪資期間物件
+
+    Returns:
+        tuple: (無薪假總天數, [(請假記錄, 實際計入天數), ...])
+    """
+    unpaid_leaves = sorted(
+        (leave for leave in leaves if leave.leave_type in UNPAID_LEAVE_TYPES),
+        key=lambda leave: (leave.start_date, leave.id or 0),
+    )
+
+    total_days = 0
+    counted = []
+    covered_until = period.start_date - timedelta(days=1)  # 已計入的最後一天
+    for leave in unpaid_leaves:
+        start = max(leave.start_date, covered_until + timedelta(days=1))
+        end = min(leave.end_date, period.end_date)
+        if start > end:
+            continue
+        days = (end - start).days + 1
+        total_days += days
+        counted.append((leave, days))
+        covered_until = end
+    return total_days, counted
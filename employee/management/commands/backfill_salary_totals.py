@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from employee.models import Salary, SalaryDetail
+from employee.salary_details import backfill_salary_totals
+
+
+class Command(BaseCommand):
+    help = '依薪資明細回填薪資記錄的應發、扣除及實發金額欄位（與 0013 遷移使用相同的計算）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批處理的薪資筆數（預設 500）'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 開始回填薪資記錄...')
+        updated_count = backfill_salary_totals(Salary, SalaryDetail, batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ 回填完成，共更新 {updated_count} 筆薪資記錄')
+        )
@@ -0,0 +1,139 @@
+import json
+import os
+import platform
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from employee.benchmarks import BENCHMARK_SIZES, run_benchmark
+from employee.metrics import isolated_metrics
+
+
+class Command(BaseCommand):
+    help = '以合成公司資料量測薪資處理、薪資列表、匯出及打卡匯入的效能（使用臨時測試資料庫）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default=','.join(str(size) for size in BENCHMARK_SIZES[:2]),
+            help=f'以逗號分隔的公司規模（員工數），預設 {",".join(str(s) for s in BENCHMARK_SIZES[:2])}'
+        )
+        parser.add_argument('--days', type=int, default=365, help='產生打卡記錄的天數（預設 365）')
+        parser.add_argument('--seed', type=int, default=1, help='亂數種子（預設 1）')
+        parser.add_argument('--workers', type=int, default=1, help='薪資處理的平行行程數（預設 1）')
+        parser.add_argument(
+            '--import-rows',
+            type=int,
+            default=5000,
+            help='打卡匯入測試的 Excel 筆數（預設 5000）'
+        )
+        parser.add_argument(
+            '--no-memory',
+            action='store_true',
+            help='不記錄記憶體峰值（tracemalloc 會使耗時增加）'
+        )
+        parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+        parser.add_argument('--compare', help='與先前輸出的 JSON 結果比較')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes 必須為以逗號分隔的整數')
+        if not sizes or min(sizes) < 1:
+            raise CommandError('--sizes 必須大於或等於 1')
+        if options['days'] < 28:
+            raise CommandError('--days 必須大於或等於 28')
+        if options['workers'] < 1:
+            raise CommandError('--workers 必須大於或等於 1')
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    baseline = {
+                        (result['employees'], result['operation']): result
+                        for result in json.load(f)['results']
+                    }
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'無法讀取比較基準: {e}')
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'days': options['days'],
+            'seed': options['seed'],
+            'workers': options['workers'],
+            'import_rows': options['import_rows'],
+            'results': [],
+        }
+
+        setup_test_environment()
+        try:
+            # 合成資料的薪資處理與匯入不計入系統指標
+            with isolated_metrics(''):
+                for size in sizes:
+                    self.stdout.write(f'🏭 產生 {size} 名員工、{options["days"]} 天的合成公司資料...')
+                    report['results'].extend(self._run_size(size, options, baseline))
+        finally:
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'💾 結果已寫入 {options["output"]}')
+
+        failed = [result for result in report['results'] if result['status'] != 'ok']
+        if failed:
+            raise CommandError(
+                '、'.join(f"{r['operation']}（{r['employees']} 人）：{r['status']}" for r in failed)
+            )
+        self.stdout.write(self.style.SUCCESS('✅ 基準測試完成'))
+
+    def _run_size(self, size, options, baseline):
+        """於臨時測試資料庫中執行單一規模的基準測試"""
+        test_settings = connection.settings_dict['TEST']
+        original_test_name = test_settings.get('NAME')
+        with tempfile.TemporaryDirectory(prefix='hr_benchmark_') as temp_dir:
+            if connection.vendor == 'sqlite':
+                # 使用暫存目錄中的資料庫檔案，結束後隨目錄刪除
+                test_settings['NAME'] = os.path.join(temp_dir, f'benchmark_{size}.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                results = run_benchmark(
+                    size,
+                    days=options['days'],
+                    seed=options['seed'],
+                    workers=options['workers'],
+                    import_rows=options['import_rows'],
+                    trace_memory=not options['no_memory'],
+                )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings['NAME'] = original_test_name
+
+        self._report(size, results, baseline)
+        return results
+
+    def _report(self, size, results, baseline):
+        """輸出單一規模的量測結果，提供比較基準時附上變化"""
+        for result in results:
+            line = (
+                f"   {result['operation']:<22}{result['seconds']:>10.3f} 秒"
+                f"{result['queries']:>8} 次查詢"
+            )
+            if result['peak_memory_kb'] is not None:
+                line += f"{result['peak_memory_kb']:>10} KB"
+            previous = baseline.get((size, result['operation'])) if baseline else None
+            if previous and previous['seconds']:
+                change = (result['seconds'] - previous['seconds']) / previous['seconds'] * 100
+                line += f"  （耗時 {change:+.1f}%，查詢 {result['queries'] - previous['queries']:+d}）"
+            if result['status'] != 'ok':
+                self.stdout.write(self.style.WARNING(f"{line}  ⚠️ {result['status']}"))
+            else:
+                self.stdout.write(line)
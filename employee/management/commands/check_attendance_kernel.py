@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from employee import attendance_kernel
+from employee.models import Employee, PayrollPeriod
+from employee.services import SalaryCalculationService
+
+
+class Command(BaseCommand):
+    help = '比對向量化出勤計算與逐日計算的結果（需安裝 numpy）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period_id', type=int, help='薪資期間 ID')
+
+    def handle(self, *args, **options):
+        if not attendance_kernel.is_available():
+            raise CommandError('未安裝 numpy，無法使用向量化出勤計算')
+
+        try:
+            period = PayrollPeriod.objects.get(id=options['period_id'])
+        except PayrollPeriod.DoesNotExist:
+            raise CommandError(f'薪資期間不存在: {options["period_id"]}')
+
+        service = SalaryCalculationService()
+        employees = Employee.objects.filter(active=True)
+
+        started = time.perf_counter()
+        totals = attendance_kernel.compute_period_totals(service, period, employees)
+        self.stdout.write(
+            f'⚡ 向量化計算 {len(totals)} 名員工，耗時 {time.perf_counter() - started:.3f} 秒'
+        )
+
+        mismatches = attendance_kernel.cross_check(service, period, employees)
+        for employee_id, vectorized, scalar in mismatches:
+            self.stdout.write(
+                self.style.WARNING(f'   員工 {employee_id}: 向量化 {vectorized} ≠ 逐日 {scalar}')
+            )
+
+        if mismatches:
+            raise CommandError(f'共有 {len(mismatches)} 名員工結果不一致')
+        self.stdout.write(self.style.SUCCESS('✅ 向量化計算與逐日計算結果一致'))
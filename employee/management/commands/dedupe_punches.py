@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from employee.punch_ingest import EMPLOYEE_LOOKUP_BATCH_SIZE, remove_duplicate_punches
+
+
+class Command(BaseCommand):
+    help = '刪除重複的打卡記錄（相同員工、打卡時間與打卡類型只保留一筆），依員工分批處理並標記受影響的薪資'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EMPLOYEE_LOOKUP_BATCH_SIZE,
+            help=f'每批處理的員工數（預設 {EMPLOYEE_LOOKUP_BATCH_SIZE}）'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只計算重複筆數，不刪除'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size 必須大於或等於 1')
+
+        def progress(processed, total, removed):
+            self.stdout.write(f'🔍 已檢查 {processed}/{total} 名員工，重複 {removed} 筆')
+
+        removed = remove_duplicate_punches(
+            batch_size=options['batch_size'], dry_run=options['dry_run'], progress=progress
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'✅ 共有 {removed} 筆重複的打卡記錄（未刪除）'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ 已刪除 {removed} 筆重複的打卡記錄'))
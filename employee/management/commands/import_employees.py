@@ -1,45 +1,57 @@
-import csv
-from datetime import datetime
-from django.core.management.base import BaseCommand
-from employee.models import Department, Employee
+from django.core.management.base import BaseCommand, CommandError
+from employee.employee_import import (
+    EMPLOYEE_BATCH_SIZE, EMPLOYEE_KEY_FIELDS, EmployeeImportError, import_employees, read_employee_file
+)
+
 
 class Command(BaseCommand):
-    help = 'Imports employee data from a CSV file.'
+    help = '由 CSV 或 Excel 檔案批次匯入員工資料（與網頁匯入共用相同的匯入流程）'
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='The path to the CSV file to import.')
+        parser.add_argument('csv_file', type=str, help='要匯入的 CSV 或 Excel (.xlsx) 檔案路徑')
+        parser.add_argument(
+            '--key',
+            choices=EMPLOYEE_KEY_FIELDS,
+            default='email',
+            help='比對既有員工的欄位（預設 email）'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EMPLOYEE_BATCH_SIZE,
+            help=f'每批查詢或寫入的筆數（預設 {EMPLOYEE_BATCH_SIZE}）'
+        )
 
     def handle(self, *args, **options):
         csv_file_path = options['csv_file']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size 必須大於或等於 1')
 
         try:
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    department_name = row['department_name']
-                    department, created = Department.objects.get_or_create(name=department_name)
-
-                    hire_date_str = row['hire_date']
-                    hire_date = datetime.strptime(hire_date_str, '%Y-%m-%d').date()
-
-                    employee, created = Employee.objects.update_or_create(
-                        email=row['email'], # 使用 email 作為唯一識別碼
-                        defaults={
-                            'name': row['name'],
-                            'phone': row['phone'],
-                            'department': department,
-                            'hire_date': hire_date,
-                        }
-                    )
-
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(f'成功建立員工: {employee.name}'))
-                    else:
-                        self.stdout.write(self.style.SUCCESS(f'成功更新員工: {employee.name}'))
-
+            with open(csv_file_path, 'rb') as file:
+                stats = import_employees(
+                    read_employee_file(file, csv_file_path, key_field=options['key']),
+                    key_field=options['key'],
+                    batch_size=options['batch_size'],
+                )
         except FileNotFoundError:
-            self.stderr.write(self.style.ERROR(f'錯誤: 檔案未找到 - {csv_file_path}'))
-        except KeyError as e:
-            self.stderr.write(self.style.ERROR(f'錯誤: CSV 檔案缺少必要的欄位 - {e}'))
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f'匯入時發生錯誤: {e}'))
+            raise CommandError(f'檔案未找到 - {csv_file_path}')
+        except (EmployeeImportError, UnicodeDecodeError) as e:
+            raise CommandError(f'無法匯入檔案: {e}')
+
+        for error in stats['errors']:
+            self.stderr.write(self.style.WARNING(f'⚠️ {error}'))
+        if stats['error_count'] > len(stats['errors']):
+            self.stderr.write(
+                self.style.WARNING(f"⚠️ 另有 {stats['error_count'] - len(stats['errors'])} 筆錯誤未列出")
+            )
+        if stats['duplicates']:
+            self.stdout.write(f"🔁 {stats['duplicates']} 列的識別值重複，以最後一列為準")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ 匯入完成：讀取 {stats['rows']} 列，新增 {stats['created']} 筆、更新 {stats['updated']} 筆、"
+                f"未變動 {stats['unchanged']} 筆，錯誤 {stats['error_count']} 筆，"
+                f"耗時 {stats['seconds']:.3f} 秒"
+            )
+        )
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from employee.models import PayrollPeriod
+from employee.payroll_jobs import (
+    JOB_BATCH_SIZE, claim_job, enqueue_payroll_job, requeue_stale_jobs, run_payroll_job
+)
+from employee.services import SalaryCalculationService
+
+
+class Command(BaseCommand):
+    help = '處理指定薪資期間的所有員工薪資（分批提交，中斷後重新執行會從檢查點續跑）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period_id', type=int, help='薪資期間 ID')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='平行計算的行程數（預設 1，於目前行程中計算）'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=JOB_BATCH_SIZE,
+            help=f'每批提交的員工數（預設 {JOB_BATCH_SIZE}）'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers 必須大於或等於 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size 必須大於或等於 1')
+
+        try:
+            period = PayrollPeriod.objects.get(id=options['period_id'])
+        except PayrollPeriod.DoesNotExist:
+            raise CommandError(f'薪資期間不存在: {options["period_id"]}')
+
+        # 以薪資處理工作記錄檢查點；前次中斷的工作會從檢查點續跑
+        requeue_stale_jobs()
+        try:
+            job = enqueue_payroll_job(period)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not claim_job(job):
+            raise CommandError(f'此薪資期間已有處理中的工作 #{job.pk}（{job.worker}）')
+
+        if job.last_employee_id:
+            self.stdout.write(
+                f'🧮 續跑薪資期間 {period}（已完成 {job.processed_employees} 名員工，{workers} 個行程）...'
+            )
+        else:
+            self.stdout.write(f'🧮 開始處理薪資期間 {period}（{workers} 個行程）...')
+
+        service = SalaryCalculationService()
+        job = run_payroll_job(job, batch_size=options['batch_size'], workers=workers, service=service)
+        if job.status != 'SUCCEEDED':
+            raise CommandError(
+                f'薪資處理{job.get_status_display()}（已完成 {job.processed_employees} 名員工，'
+                f'重新執行將從檢查點續跑）：{job.error_message}'
+            )
+
+        summary = service.last_run_summary
+        for shard in summary['shards']:
+            self.stdout.write(
+                f"   分片 {shard['index']}: 員工 {shard['first_employee_id']}~{shard['last_employee_id']}，"
+                f"{shard['employees']} 人，計算 {shard['calculated']} 人，耗時 {shard['seconds']:.3f} 秒"
+            )
+        details = summary['details']
+        self.stdout.write(
+            f"   明細：新增 {details['created']} 筆，更新 {details['updated']} 筆，"
+            f"刪除 {details['deleted']} 筆，未變動 {details['unchanged']} 筆"
+        )
+        self.stdout.write(f"   寫入耗時 {summary['write_seconds']:.3f} 秒")
+        for stage in job.stage_list:
+            self.stdout.write(
+                f"   {stage['label']}：{stage['seconds']:.3f} 秒（{stage['percent']}%），"
+                f"{stage['queries']} 次查詢，寫入 {stage['rows']} 筆"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ 薪資處理完成，共處理 {job.processed_employees} 名員工，總耗時 {summary['total_seconds']:.3f} 秒"
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from employee.models import PayrollPeriod, Salary
+from employee.services import SalaryCalculationService
+
+
+class Command(BaseCommand):
+    help = '重新計算被標記為需重新計算的未確認薪資'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            type=int,
+            help='只處理指定的薪資期間 ID'
+        )
+
+    def handle(self, *args, **options):
+        period = None
+        if options['period']:
+            try:
+                period = PayrollPeriod.objects.get(id=options['period'])
+            except PayrollPeriod.DoesNotExist:
+                raise CommandError(f'薪資期間不存在: {options["period"]}')
+
+        stale_salaries = Salary.objects.filter(is_stale=True, is_confirmed=False)
+        if period is not None:
+            stale_salaries = stale_salaries.filter(period=period)
+        self.stdout.write(f'🔍 共有 {stale_salaries.count()} 筆薪資需要重新計算')
+
+        service = SalaryCalculationService()
+        recomputed_count = service.recompute_stale_salaries(period)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ 重新計算完成，共更新 {recomputed_count} 筆薪資')
+        )
@@ -0,0 +1,92 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from employee.import_sessions import (
+    IMPORT_STALE_SECONDS, ImportSessionError, claim_next_session, claim_session, requeue_stale_sessions,
+    resume_import_session, run_import_session
+)
+from employee.models import ImportSession
+from employee.payroll_jobs import worker_name
+
+
+class Command(BaseCommand):
+    help = '啟動匯入工作程序，依序分批處理佇列中的匯入工作（中斷後從最後提交的批次續跑）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='處理完目前所有等待中的工作後結束'
+        )
+        parser.add_argument(
+            '--session',
+            type=int,
+            help='只處理指定的匯入工作（失敗的工作會從檢查點續跑）'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='沒有工作時的輪詢間隔秒數（預設 5）'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=IMPORT_STALE_SECONDS,
+            help=f'處理中的工作超過此秒數未回報進度時重新排入佇列續跑（預設 {IMPORT_STALE_SECONDS}）'
+        )
+
+    def handle(self, *args, **options):
+        name = worker_name()
+
+        if options['session']:
+            try:
+                session = ImportSession.objects.get(pk=options['session'])
+            except ImportSession.DoesNotExist:
+                raise CommandError(f'匯入工作 #{options["session"]} 不存在')
+            if session.status == 'FAILED':
+                try:
+                    resume_import_session(session)
+                except ImportSessionError as e:
+                    raise CommandError(str(e))
+            if not claim_session(session, name):
+                raise CommandError(f'匯入工作 #{session.pk} {session.get_status_display()}，無法處理')
+            self._run(session)
+            return
+
+        self.stdout.write(f'🚀 匯入工作程序 {name} 已啟動')
+        try:
+            while True:
+                requeued = requeue_stale_sessions(options['stale_after'])
+                if requeued:
+                    self.stdout.write(f'♻️ 重新排入 {requeued} 個中斷的匯入工作，將從檢查點續跑')
+
+                session = claim_next_session(name)
+                if session is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                self._run(session)
+        except KeyboardInterrupt:
+            self.stdout.write('👋 工作程序已停止')
+
+    def _run(self, session):
+        if session.last_row_number > 1:
+            self.stdout.write(
+                f'📥 續跑匯入工作 #{session.pk}：{session.original_name}（從第 {session.last_row_number + 1} 列開始）'
+            )
+        else:
+            self.stdout.write(f'📥 開始匯入工作 #{session.pk}：{session.original_name}')
+        session = run_import_session(session)
+        message = (
+            f'匯入工作 #{session.pk} {session.get_status_display()}，'
+            f'已處理 {session.processed_rows} 列：新增 {session.created_count} 筆、'
+            f'更新 {session.updated_count} 筆、錯誤 {session.error_count} 筆'
+        )
+        if session.status == 'SUCCEEDED':
+            self.stdout.write(self.style.SUCCESS(f'✅ {message}'))
+        elif session.status == 'FAILED':
+            self.stdout.write(self.style.ERROR(f'❌ {message}：{session.error_message}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'⏹️ {message}（已由其他工作程序接手）'))
@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from employee.payroll_jobs import (
+    JOB_BATCH_SIZE, JOB_STALE_SECONDS, claim_next_job, requeue_stale_jobs, run_payroll_job, worker_name
+)
+
+
+class Command(BaseCommand):
+    help = '啟動薪資處理工作程序，依序執行佇列中的薪資處理工作'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='處理完目前所有等待中的工作後結束'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='沒有工作時的輪詢間隔秒數（預設 5）'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=JOB_BATCH_SIZE,
+            help=f'每批處理的員工數（預設 {JOB_BATCH_SIZE}）'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=JOB_STALE_SECONDS,
+            help=f'處理中的工作超過此秒數未回報進度時重新排入佇列續跑（預設 {JOB_STALE_SECONDS}）'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='每批平行計算的行程數（預設 1）'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size 必須大於或等於 1')
+        if options['workers'] < 1:
+            raise CommandError('--workers 必須大於或等於 1')
+
+        name = worker_name()
+        self.stdout.write(f'🚀 薪資處理工作程序 {name} 已啟動')
+
+        try:
+            while True:
+                requeued = requeue_stale_jobs(options['stale_after'])
+                if requeued:
+                    self.stdout.write(f'♻️ 重新排入 {requeued} 個中斷的工作，將從檢查點續跑')
+
+                job = claim_next_job(name)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+
+                if job.last_employee_id:
+                    self.stdout.write(
+                        f'🧮 續跑工作 #{job.pk}：{job.period}（已完成 {job.processed_employees} 名員工）'
+                    )
+                else:
+                    self.stdout.write(f'🧮 開始處理工作 #{job.pk}：{job.period}')
+                job = run_payroll_job(
+                    job, batch_size=options['batch_size'], workers=options['workers']
+                )
+                message = (
+                    f'工作 #{job.pk} {job.get_status_display()}，'
+                    f'已處理 {job.processed_employees}/{job.total_employees} 名員工'
+                )
+                if job.status == 'SUCCEEDED':
+                    self.stdout.write(self.style.SUCCESS(f'✅ {message}'))
+                elif job.status == 'CANCELLED':
+                    self.stdout.write(self.style.WARNING(f'⏹️ {message}'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'❌ {message}：{job.error_message}'))
+        except KeyboardInterrupt:
+            self.stdout.write('👋 工作程序已停止')
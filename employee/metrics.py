@@ -0,0 +1,515 @@
+"""
+Prometheus 格式的系統指標
+指標於行程內以字典累計，定期寫入 settings.METRICS_DIR 中每個行程各自的快照檔；
+/api/metrics/ 讀取目錄內所有快照加總後輸出，多個工作行程（網頁及薪資工作程序）共用同一目錄即可彙總。
+所有指標皆為可加總的計數器與直方圖；本機已結束行程的快照於讀取時併入彙總檔後刪除，計數器不會倒退。
+"""
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 不支援檔案鎖，不彙總已結束行程的快照
+    fcntl = None
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# 未設定 METRICS_FLUSH_INTERVAL 時，快照寫入的最短間隔（秒）
+DEFAULT_FLUSH_INTERVAL = 5
+
+# 請求耗時直方圖的分組上限（秒）
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 薪資處理耗時直方圖的分組上限（秒）
+PAYROLL_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+# 請求數標籤只記錄標準的 HTTP 方法，其他任意方法記為 other，避免標籤數量無限增加
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+
+# 快照檔名為 metrics_<主機名稱>_<行程 ID>.json；已結束行程的快照併入彙總檔後刪除
+SNAPSHOT_PREFIX = 'metrics_'
+AGGREGATE_FILENAME = 'metrics_aggregate.json'
+LOCK_FILENAME = '.metrics.lock'
+
+
+class Metric:
+    """指標定義：名稱、類型、說明、標籤名稱及直方圖分組"""
+
+    def __init__(self, name, kind, help_text, labelnames=(), buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else None
+
+
+METRICS = {
+    metric.name: metric for metric in (
+        Metric('hr_http_requests_total', 'counter',
+               '依 URL 名稱、方法及狀態碼統計的請求數', ('view', 'method', 'status')),
+        Metric('hr_http_request_duration_seconds', 'histogram',
+               '依 URL 名稱統計的請求耗時', ('view',), REQUEST_BUCKETS),
+        Metric('hr_db_queries_total', 'counter',
+               '依 URL 名稱統計的資料庫查詢次數', ('view',)),
+        Metric('hr_db_query_duration_seconds_total', 'counter',
+               '依 URL 名稱統計的資料庫查詢耗時', ('view',)),
+        Metric('hr_payroll_runs_total', 'counter',
+               '薪資處理次數', ('mode', 'result')),
+        Metric('hr_payroll_run_duration_seconds', 'histogram',
+               '薪資處理耗時', ('mode',), PAYROLL_BUCKETS),
+        Metric('hr_payroll_employees_processed_total', 'counter',
+               '薪資處理的員工數', ('mode',)),
+        Metric('hr_payroll_stage_seconds_total', 'counter',
+               '薪資計算各階段的耗時', ('stage',)),
+        Metric('hr_payroll_stage_queries_total', 'counter',
+               '薪資計算各階段的查詢次數', ('stage',)),
+        Metric('hr_import_rows_total', 'counter',
+               '匯入的資料列數', ('kind', 'result')),
+        Metric('hr_import_duration_seconds_total', 'counter',
+               '匯入耗時，與匯入列數相除即為吞吐量', ('kind',)),
+        Metric('hr_cache_requests_total', 'counter',
+               '行程內快取的查詢次數，依命中與否區分', ('cache', 'result')),
+    )
+}
+
+_values = {}
+_lock = threading.Lock()
+_state = {'dirty': False, 'flushed_at': 0.0, 'owns_snapshot': False}
+
+
+def _metric(name, labels):
+    metric = METRICS[name]
+    if len(labels) != len(metric.labelnames):
+        raise ValueError(f'{name} 需要標籤 {metric.labelnames}')
+    return metric, tuple(str(label) for label in labels)
+
+
+def inc(name, *labels, amount=1):
+    """計數器增加 amount"""
+    metric, labels = _metric(name, labels)
+    with _lock:
+        _values[(name, labels)] = _values.get((name, labels), 0) + amount
+        _state['dirty'] = True
+
+
+def observe(name, value, *labels):
+    """直方圖記錄一次觀測值"""
+    metric, labels = _metric(name, labels)
+    with _lock:
+        series = _values.get((name, labels))
+        if series is None:
+            # [各分組累計次數..., 總和, 次數]
+            series = _values[(name, labels)] = [0] * len(metric.buckets) + [0.0, 0]
+        for index, bound in enumerate(metric.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+        _state['dirty'] = True
+
+
+def record_cache(cache, hit):
+    """記錄行程內快取的命中或未命中"""
+    inc('hr_cache_requests_total', cache, 'hit' if hit else 'miss')
+
+
+def record_import(kind, seconds, **rows):
+    """
+    記錄一次匯入
+
+    Args:
+        kind: 匯入種類（如 employees、punches）
+        seconds: 匯入耗時
+        rows: 依結果分類的列數，如 created=10, updated=2, error=1
+    """
+    for result, count in rows.items():
+        if count:
+            inc('hr_import_rows_total', kind, result, amount=count)
+    inc('hr_import_duration_seconds_total', kind, amount=seconds)
+    maybe_flush()
+
+
+def record_payroll_run(mode, seconds, employees, stages=None, succeeded=True):
+    """
+    記錄一次薪資處理
+
+    Args:
+        mode: 計算方式（bulk、batched、single）
+        seconds: 處理耗時
+        employees: 處理的員工數
+        stages: StageRecorder.as_dict() 的各階段彙總
+        succeeded: 是否成功完成
+    """
+    inc('hr_payroll_runs_total', mode, 'success' if succeeded else 'failure')
+    observe('hr_payroll_run_duration_seconds', seconds, mode)
+    if employees:
+        inc('hr_payroll_employees_processed_total', mode, amount=employees)
+    for stage, stats in (stages or {}).items():
+        inc('hr_payroll_stage_seconds_total', stage, amount=stats['seconds'])
+        inc('hr_payroll_stage_queries_total', stage, amount=stats['queries'])
+    flush()
+
+
+def reset_metrics():
+    """清除本行程的指標（不影響其他行程的快照）"""
+    with _lock:
+        _values.clear()
+        _state['dirty'] = True
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def _snapshot_path(directory):
+    return os.path.join(directory, f'{SNAPSHOT_PREFIX}{socket.gethostname()}_{os.getpid()}.json')
+
+
+def _snapshot_files(directory):
+    """目錄內各行程的快照檔名（不含彙總檔）"""
+    try:
+        return [
+            filename for filename in os.listdir(directory)
+            if filename.startswith(SNAPSHOT_PREFIX) and filename.endswith('.json')
+            and filename != AGGREGATE_FILENAME
+        ]
+    except OSError:
+        return []
+
+
+def _is_dead_snapshot(filename):
+    """快照是否屬於本機已結束的行程（其他主機或容器的快照由其自行彙總）"""
+    stem = filename[len(SNAPSHOT_PREFIX):-len('.json')]
+    host, _, pid = stem.rpartition('_')
+    if not pid.isdigit() or host not in ('', socket.gethostname()):
+        return False  # 舊格式 metrics_<pid>.json 視為本機的快照
+    pid = int(pid)
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False  # 行程存在但無權限
+    return False
+
+
+@contextmanager
+def _directory_lock(directory):
+    """目錄的獨占鎖，彙總與讀取快照時使用，避免讀到已併入彙總檔但尚未刪除的快照"""
+    with open(os.path.join(directory, LOCK_FILENAME), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    """先寫入暫存檔再取代，讀取端不會讀到寫到一半的檔案"""
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def _merge(totals, data):
+    """將快照內容 [[指標名稱, 標籤, 值], ...] 加總至 totals"""
+    for name, labels, value in data or ():
+        metric = METRICS.get(name)
+        if metric is None:
+            continue
+        key = (name, tuple(labels))
+        if metric.kind == 'histogram':
+            if len(value) != len(metric.buckets) + 2:
+                continue  # 分組設定已變更的舊快照
+            current = totals.setdefault(key, [0] * len(value))
+            for index, item in enumerate(value):
+                current[index] += item
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def _serialize(values):
+    return [
+        [name, list(labels), list(value) if isinstance(value, list) else value]
+        for (name, labels), value in values.items()
+    ]
+
+
+def _read_aggregate(directory):
+    """
+    Returns:
+        tuple: (彙總的快照內容, 已併入但可能尚未刪除的快照檔名)
+    """
+    data = _read_json(os.path.join(directory, AGGREGATE_FILENAME)) or {}
+    return data.get('values', []), data.get('folded', [])
+
+
+def compact_snapshots(directory, include_own=False):
+    """
+    將本機已結束行程的快照併入彙總檔後刪除（呼叫端須持有目錄鎖）
+
+    彙總檔同時記錄已併入的檔名：刪除前中斷時，讀取端依此略過已計入的快照，計數器不會重複計算或倒退。
+
+    Args:
+        include_own: 一併併入與本行程同名的快照（行程 ID 被重複使用時，屬於已結束的舊行程）
+    """
+    existing = set(_snapshot_files(directory))
+    values, folded = _read_aggregate(directory)
+    pending = [filename for filename in folded if filename in existing]
+    own = os.path.basename(_snapshot_path(directory))
+    dead = sorted(
+        filename for filename in existing - set(pending)
+        if _is_dead_snapshot(filename) or (include_own and filename == own)
+    )
+    if not dead and not pending and not folded:
+        return
+    path = os.path.join(directory, AGGREGATE_FILENAME)
+    totals = {}
+    _merge(totals, values)
+    for filename in dead:
+        _merge(totals, _read_json(os.path.join(directory, filename)))
+    values = _serialize(totals)
+    if dead:
+        _write_json(path, {'values': values, 'folded': pending + dead})
+
+    remaining = []
+    for filename in pending + dead:
+        try:
+            os.remove(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            remaining.append(filename)
+    # 已刪除的檔名不再保留，之後重複使用相同行程 ID 的快照才不會被略過
+    _write_json(path, {'values': values, 'folded': remaining})
+
+
+def flush():
+    """
+    將本行程的指標寫入快照檔
+
+    未記錄任何指標的行程（如一般的 manage.py 指令）不產生快照檔。
+    第一次寫入前先將同名的舊快照（行程 ID 被重複使用）併入彙總檔，避免覆寫使計數器倒退。
+    """
+    directory = _metrics_dir()
+    if not directory:
+        return
+    with _lock:
+        if not _values and not _state['owns_snapshot']:
+            _state['dirty'] = False
+            return
+        data = _serialize(_values)
+        _state['dirty'] = False
+        _state['flushed_at'] = time.monotonic()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if not _state['owns_snapshot']:
+            if fcntl is not None:
+                with _directory_lock(directory):
+                    compact_snapshots(directory, include_own=True)
+            _state['owns_snapshot'] = True
+        _write_json(_snapshot_path(directory), data)
+    except OSError as e:
+        logger.warning('無法寫入指標快照 %s: %s', directory, e)
+
+
+def maybe_flush():
+    """距上次寫入超過 METRICS_FLUSH_INTERVAL 秒且有變動時寫入快照"""
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+    if _state['dirty'] and time.monotonic() - _state['flushed_at'] >= interval:
+        flush()
+
+
+def _reset_after_fork():
+    # 子行程繼承的數值屬於父行程，已由父行程寫入快照，子行程從零開始累計
+    global _lock
+    _lock = threading.Lock()
+    _values.clear()
+    _state['dirty'] = False
+    _state['flushed_at'] = 0.0
+    _state['owns_snapshot'] = False
+
+
+@contextmanager
+def isolated_metrics(directory):
+    """
+    暫時將本行程的指標寫入另一個目錄，結束後捨棄期間記錄的指標
+
+    測試與基準測試使用，其指標不會寫入 settings.METRICS_DIR，也不會在行程結束時寫入。
+
+    Args:
+        directory: 暫用的快照目錄；空值則只保留於本行程
+    """
+    from django.test.utils import override_settings
+
+    with _lock:
+        saved_values = dict(_values)
+        saved_state = dict(_state)
+        _values.clear()
+        _state.update(dirty=False, flushed_at=0.0, owns_snapshot=False)
+    try:
+        with override_settings(METRICS_DIR=directory):
+            yield
+    finally:
+        with _lock:
+            _values.clear()
+            _values.update(saved_values)
+            _state.update(saved_state)
+
+
+atexit.register(flush)
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _collect_snapshots(directory):
+    values, folded = _read_aggregate(directory)
+    totals = {}
+    _merge(totals, values)
+    for filename in _snapshot_files(directory):
+        if filename not in folded:
+            _merge(totals, _read_json(os.path.join(directory, filename)))
+    return totals
+
+
+def collect():
+    """
+    彙總所有行程的指標
+
+    讀取前先將本機已結束行程的快照併入彙總檔，快照檔數量不會隨行程數持續增加。
+
+    Returns:
+        dict: {(指標名稱, 標籤): 值}；計數器為數值，直方圖為 [各分組累計次數..., 總和, 次數]
+    """
+    directory = _metrics_dir()
+    if not directory:
+        with _lock:
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in _values.items()}
+
+    flush()
+    if fcntl is None or not os.path.isdir(directory):
+        return _collect_snapshots(directory)
+    with _directory_lock(directory):
+        compact_snapshots(directory)
+        return _collect_snapshots(directory)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(metric, labels, extra=()):
+    pairs = list(zip(metric.labelnames, labels)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def render_metrics():
+    """
+    以 Prometheus 文字格式輸出所有行程的指標
+
+    Returns:
+        str: text/plain; version=0.0.4 格式的內容
+    """
+    totals = collect()
+    series_by_metric = {}
+    for (name, labels), value in totals.items():
+        series_by_metric.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, metric in METRICS.items():
+        lines.append(f'# HELP {name} {metric.help_text}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, value in sorted(series_by_metric.get(name, [])):
+            if metric.kind == 'histogram':
+                # 觀測時已計入所有上限大於等於觀測值的分組，各分組即為累計次數
+                for bound, count in zip(metric.buckets, value):
+                    label_text = _format_labels(metric, labels, [('le', str(float(bound)))])
+                    lines.append(f'{name}_bucket{label_text} {count}')
+                label_text = _format_labels(metric, labels, [('le', '+Inf')])
+                lines.append(f'{name}_bucket{label_text} {value[-1]}')
+                label_text = _format_labels(metric, labels)
+                lines.append(f'{name}_sum{label_text} {_format_value(value[-2])}')
+                lines.append(f'{name}_count{label_text} {value[-1]}')
+            else:
+                lines.append(f'{name}{_format_labels(metric, labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryTimer:
+    """只記錄查詢次數與耗時的 execute_wrapper"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    記錄每個請求的耗時、狀態碼及資料庫查詢
+
+    依解析出的 URL 名稱分組，無法解析的請求（如 404）記為 unresolved、非標準的 HTTP 方法記為 other，
+    避免標籤數量無限增加。
+    settings.METRICS_ENABLED 為 False 時不做任何記錄。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        seconds = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match is not None and match.view_name else 'unresolved'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        inc('hr_http_requests_total', view_name, method, response.status_code)
+        observe('hr_http_request_duration_seconds', seconds, view_name)
+        if timer.count:
+            inc('hr_db_queries_total', view_name, amount=timer.count)
+            inc('hr_db_query_duration_seconds_total', view_name, amount=timer.seconds)
+        maybe_flush()
+        return response
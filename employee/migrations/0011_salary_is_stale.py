@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0010_alter_employee_department_alter_employee_email_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salary',
+            name='is_stale',
+            field=models.BooleanField(db_index=True, default=False, help_text='打卡、請假、員工薪資或薪資項目變更後標記，重新計算後清除', verbose_name='需重新計算'),
+        ),
+        migrations.AddField(
+            model_name='salary',
+            name='stale_at',
+            field=models.DateTimeField(blank=True, help_text='最近一次標記為需重新計算的時間；計算開始後才標記的記錄於寫入時保留標記', null=True, verbose_name='標記時間'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0011_salary_is_stale'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holiday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='日期')),
+                ('name', models.CharField(max_length=100, verbose_name='名稱')),
+                ('kind', models.CharField(choices=[('NATIONAL', '國定假日'), ('LUNAR', '農曆節日'), ('COMPENSATORY', '補假'), ('COMPANY', '公司假日'), ('OTHER', '其他')], default='NATIONAL', max_length=20, verbose_name='類型')),
+                ('is_makeup_workday', models.BooleanField(default=False, help_text='勾選表示此日為補行上班日，即使是週末或固定假日也視為工作日', verbose_name='補班日')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+            options={
+                'verbose_name': '假日',
+                'verbose_name_plural': '假日',
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:02
+
+from django.db import migrations, models
+
+from employee.salary_details import backfill_salary_totals
+
+
+def backfill_totals(apps, schema_editor):
+    # 升級時既有的薪資記錄依明細回填，不會顯示為 0
+    backfill_salary_totals(apps.get_model('employee', 'Salary'), apps.get_model('employee', 'SalaryDetail'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0012_holiday'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salary',
+            name='gross_amount',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='基本薪資 + 加班費 + 加給/獎金', max_digits=12, verbose_name='應發總額'),
+        ),
+        migrations.AddField(
+            model_name='salary',
+            name='net_amount',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=12, verbose_name='實發金額'),
+        ),
+        migrations.AddField(
+            model_name='salary',
+            name='total_allowances',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='加給/獎金合計'),
+        ),
+        migrations.AddField(
+            model_name='salary',
+            name='total_deductions',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='扣除合計'),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
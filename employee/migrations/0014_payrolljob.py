@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0013_salary_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', '等待中'), ('RUNNING', '處理中'), ('SUCCEEDED', '已完成'), ('FAILED', '失敗'), ('CANCELLED', '已取消')], db_index=True, default='PENDING', max_length=20, verbose_name='狀態')),
+                ('total_employees', models.PositiveIntegerField(default=0, verbose_name='員工總數')),
+                ('processed_employees', models.PositiveIntegerField(default=0, verbose_name='已處理員工數')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='已要求取消')),
+                ('error_message', models.TextField(blank=True, verbose_name='錯誤訊息')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='執行者')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始時間')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='最後回報時間')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='結束時間')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='建立者')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='employee.payrollperiod', verbose_name='薪資期間')),
+            ],
+            options={
+                'verbose_name': '薪資處理工作',
+                'verbose_name_plural': '薪資處理工作',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
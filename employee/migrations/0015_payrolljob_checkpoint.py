@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0014_payrolljob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrolljob',
+            name='last_employee_id',
+            field=models.PositiveIntegerField(blank=True, help_text='已完成寫入的最後一位員工 ID，續跑時從下一位員工開始', null=True, verbose_name='檢查點'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0015_payrolljob_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrolljob',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict, help_text='各計算階段的執行次數、耗時、查詢次數及寫入筆數', verbose_name='階段耗時'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:53
+
+import django.db.models.deletion
+import employee.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0016_payrolljob_stage_timings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('EMPLOYEES', '員工資料'), ('PUNCHES', '打卡記錄')], max_length=20, verbose_name='匯入種類')),
+                ('status', models.CharField(choices=[('PENDING', '等待中'), ('RUNNING', '處理中'), ('SUCCEEDED', '已完成'), ('FAILED', '失敗')], db_index=True, default='PENDING', max_length=20, verbose_name='狀態')),
+                ('file', models.FileField(blank=True, help_text='上傳後保存的檔案，完成後刪除', storage=employee.models.import_file_storage, upload_to='%Y/%m/', verbose_name='匯入檔案')),
+                ('original_name', models.CharField(max_length=255, verbose_name='原始檔名')),
+                ('key_field', models.CharField(blank=True, help_text='員工資料匯入時比對既有員工的欄位', max_length=20, verbose_name='識別欄位')),
+                ('chunk_size', models.PositiveIntegerField(default=1000, verbose_name='每批列數')),
+                ('total_rows', models.PositiveIntegerField(default=0, help_text='不含標題列', verbose_name='總列數')),
+                ('last_row_number', models.PositiveIntegerField(default=1, help_text='已提交的最後一列列號（標題列為第 1 列），續跑時從下一列開始', verbose_name='檢查點')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='已處理列數')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='新增筆數')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='更新筆數')),
+                ('unchanged_count', models.PositiveIntegerField(default=0, verbose_name='未變動筆數')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='錯誤筆數')),
+                ('error_message', models.TextField(blank=True, verbose_name='錯誤訊息')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='執行者')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始時間')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='最後回報時間')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='結束時間')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='建立者')),
+            ],
+            options={
+                'verbose_name': '匯入工作',
+                'verbose_name_plural': '匯入工作',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRowError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.PositiveIntegerField(verbose_name='列號')),
+                ('message', models.TextField(verbose_name='錯誤訊息')),
+                ('row_data', models.JSONField(blank=True, default=dict, verbose_name='原始資料')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_errors', to='employee.importsession', verbose_name='匯入工作')),
+            ],
+            options={
+                'verbose_name': '匯入錯誤',
+                'verbose_name_plural': '匯入錯誤',
+                'ordering': ['session', 'row_number'],
+            },
+        ),
+    ]
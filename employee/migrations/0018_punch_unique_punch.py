@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:57
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_punches(apps, schema_editor):
+    """
+    建立唯一限制前刪除重複的打卡記錄（只保留主鍵最小的一筆）
+
+    資料量大時請先執行 dedupe_punches 指令分批清除，此處只處理剩餘的重複記錄。
+    """
+    Punch = apps.get_model('employee', 'Punch')
+    groups = Punch.objects.values('employee_id', 'punch_time', 'punch_type').annotate(
+        keep_id=Min('id'), copies=Count('id')
+    ).filter(copies__gt=1).order_by()
+    for group in list(groups):
+        Punch.objects.filter(
+            employee_id=group['employee_id'],
+            punch_time=group['punch_time'],
+            punch_type=group['punch_type'],
+        ).exclude(id=group['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee', '0017_importsession_importrowerror'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_punches, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='punch',
+            constraint=models.UniqueConstraint(fields=('employee', 'punch_time', 'punch_type'), name='unique_punch'),
+        ),
+    ]
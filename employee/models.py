@@ -1,4 +1,55 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.utils import timezone
+
+
+HOURS_QUANTUM = Decimal('0.1')    # 時數儲存精度
+AMOUNT_QUANTUM = Decimal('0.01')  # 金額儲存精度
+
+
+def round_amount(value):
+    """金額四捨五入至小數兩位"""
+    return Decimal(value).quantize(AMOUNT_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def round_hours(value):
+    """時數四捨五入至小數一位"""
+    return Decimal(value).quantize(HOURS_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def salary_totals(base_amount, overtime_amount, details):
+    """
+    依薪資明細計算薪資記錄的彙總欄位
+
+    各明細金額先捨入至儲存精度再加總，應發金額 = 基本薪資 + 加班費 + 加給/獎金。
+
+    Args:
+        base_amount: 基本薪資
+        overtime_amount: 加班費
+        details: (項目類型, 金額) 的序列
+
+    Returns:
+        dict: {欄位名稱: 金額}，欄位即 Salary.TOTAL_FIELDS
+    """
+    total_allowances = Decimal('0')
+    total_deductions = Decimal('0')
+    for item_type, amount in details:
+        amount = round_amount(amount)
+        if item_type in SalaryItem.ADDITION_TYPES:
+            total_allowances += amount
+        else:
+            total_deductions += amount
+
+    gross_amount = round_amount(base_amount) + round_amount(overtime_amount) + total_allowances
+    return {
+        'gross_amount': gross_amount,
+        'total_allowances': total_allowances,
+        'total_deductions': total_deductions,
+        'net_amount': gross_amount - total_deductions,
+    }
 
 class Department(models.Model):
     name = models.CharField(max_length=100)
@@ -67,6 +118,216 @@ class PayrollPeriod(models.Model):
         verbose_name = '薪資期間'
         verbose_name_plural = '薪資期間'
 
+class PayrollJob(models.Model):
+    STATUS_CHOICES = [
+        ('PENDING', '等待中'),
+        ('RUNNING', '處理中'),
+        ('SUCCEEDED', '已完成'),
+        ('FAILED', '失敗'),
+        ('CANCELLED', '已取消'),
+    ]
+    ACTIVE_STATUSES = ['PENDING', 'RUNNING']
+
+    period = models.ForeignKey(
+        PayrollPeriod,
+        on_delete=models.CASCADE,
+        verbose_name='薪資期間'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='PENDING',
+        db_index=True,
+        verbose_name='狀態'
+    )
+    total_employees = models.PositiveIntegerField(default=0, verbose_name='員工總數')
+    processed_employees = models.PositiveIntegerField(default=0, verbose_name='已處理員工數')
+    last_employee_id = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='檢查點',
+        help_text='已完成寫入的最後一位員工 ID，續跑時從下一位員工開始'
+    )
+    cancel_requested = models.BooleanField(default=False, verbose_name='已要求取消')
+    error_message = models.TextField(blank=True, verbose_name='錯誤訊息')
+    worker = models.CharField(max_length=100, blank=True, verbose_name='執行者')
+    stage_timings = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='階段耗時',
+        help_text='各計算階段的執行次數、耗時、查詢次數及寫入筆數'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='建立者'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='開始時間')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='最後回報時間')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='結束時間')
+
+    def __str__(self):
+        return f"{self.period} - {self.get_status_display()}"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    @property
+    def progress_percent(self):
+        """完成百分比"""
+        if self.status == 'SUCCEEDED':
+            return 100
+        if not self.total_employees:
+            return 0
+        return min(100, int(self.processed_employees * 100 / self.total_employees))
+
+    @property
+    def stage_list(self):
+        """各計算階段的耗時列表（依計算順序）"""
+        from .payroll_stages import stage_rows
+        return stage_rows(self.stage_timings)
+
+    @property
+    def elapsed_seconds(self):
+        """已執行秒數"""
+        if self.started_at is None:
+            return 0
+        end = self.finished_at or timezone.now()
+        return max(0, (end - self.started_at).total_seconds())
+
+    @property
+    def eta_seconds(self):
+        """依目前處理速度估計的剩餘秒數，無法估計時為 None"""
+        if self.status != 'RUNNING' or not self.processed_employees:
+            return None
+        remaining = max(0, self.total_employees - self.processed_employees)
+        return self.elapsed_seconds / self.processed_employees * remaining
+
+    class Meta:
+        verbose_name = '薪資處理工作'
+        verbose_name_plural = '薪資處理工作'
+        ordering = ['-created_at']
+
+def import_file_storage():
+    """匯入檔案的儲存位置（settings.IMPORT_STORAGE_DIR）"""
+    return FileSystemStorage(location=settings.IMPORT_STORAGE_DIR)
+
+
+class ImportSession(models.Model):
+    KIND_CHOICES = [
+        ('EMPLOYEES', '員工資料'),
+        ('PUNCHES', '打卡記錄'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', '等待中'),
+        ('RUNNING', '處理中'),
+        ('SUCCEEDED', '已完成'),
+        ('FAILED', '失敗'),
+    ]
+    ACTIVE_STATUSES = ['PENDING', 'RUNNING']
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='匯入種類')
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='PENDING',
+        db_index=True,
+        verbose_name='狀態'
+    )
+    file = models.FileField(
+        upload_to='%Y/%m/',
+        storage=import_file_storage,
+        blank=True,
+        verbose_name='匯入檔案',
+        help_text='上傳後保存的檔案，完成後刪除'
+    )
+    original_name = models.CharField(max_length=255, verbose_name='原始檔名')
+    key_field = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name='識別欄位',
+        help_text='員工資料匯入時比對既有員工的欄位'
+    )
+    chunk_size = models.PositiveIntegerField(default=1000, verbose_name='每批列數')
+    total_rows = models.PositiveIntegerField(default=0, verbose_name='總列數', help_text='不含標題列')
+    last_row_number = models.PositiveIntegerField(
+        default=1,
+        verbose_name='檢查點',
+        help_text='已提交的最後一列列號（標題列為第 1 列），續跑時從下一列開始'
+    )
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name='已處理列數')
+    created_count = models.PositiveIntegerField(default=0, verbose_name='新增筆數')
+    updated_count = models.PositiveIntegerField(default=0, verbose_name='更新筆數')
+    unchanged_count = models.PositiveIntegerField(default=0, verbose_name='未變動筆數')
+    error_count = models.PositiveIntegerField(default=0, verbose_name='錯誤筆數')
+    error_message = models.TextField(blank=True, verbose_name='錯誤訊息')
+    worker = models.CharField(max_length=100, blank=True, verbose_name='執行者')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='建立者'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='開始時間')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='最後回報時間')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='結束時間')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.original_name} - {self.get_status_display()}"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    @property
+    def progress_percent(self):
+        """完成百分比"""
+        if self.status == 'SUCCEEDED':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, int((self.last_row_number - 1) * 100 / self.total_rows))
+
+    @property
+    def elapsed_seconds(self):
+        """已執行秒數"""
+        if self.started_at is None:
+            return 0
+        end = self.finished_at or timezone.now()
+        return max(0, (end - self.started_at).total_seconds())
+
+    class Meta:
+        verbose_name = '匯入工作'
+        verbose_name_plural = '匯入工作'
+        ordering = ['-created_at']
+
+
+class ImportRowError(models.Model):
+    session = models.ForeignKey(
+        ImportSession,
+        on_delete=models.CASCADE,
+        related_name='row_errors',
+        verbose_name='匯入工作'
+    )
+    row_number = models.PositiveIntegerField(verbose_name='列號')
+    message = models.TextField(verbose_name='錯誤訊息')
+    row_data = models.JSONField(default=dict, blank=True, verbose_name='原始資料')
+
+    def __str__(self):
+        return f"第 {self.row_number} 列: {self.message}"
+
+    class Meta:
+        verbose_name = '匯入錯誤'
+        verbose_name_plural = '匯入錯誤'
+        ordering = ['session', 'row_number']
+
+
 class Salary(models.Model):
     employee = models.ForeignKey(
         Employee,
@@ -102,7 +363,50 @@ class Salary(models.Model):
         verbose_name='工作時數',
         help_text='兼職人員使用'
     )
+    gross_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='應發總額',
+        help_text='基本薪資 + 加班費 + 加給/獎金'
+    )
+    total_allowances = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='加給/獎金合計'
+    )
+    total_deductions = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='扣除合計'
+    )
+    net_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        verbose_name='實發金額'
+    )
     is_confirmed = models.BooleanField(default=False, verbose_name='已確認')
+    is_stale = models.BooleanField(
+        default=False,
+        db_index=True,
+        verbose_name='需重新計算',
+        help_text='打卡、請假、員工薪資或薪資項目變更後標記，重新計算後清除'
+    )
+    stale_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='標記時間',
+        help_text='最近一次標記為需重新計算的時間；計算開始後才標記的記錄於寫入時保留標記'
+    )
+
+    # 由出勤計算而來的欄位
+    FIGURE_FIELDS = ['base_amount', 'working_hours', 'overtime_hours', 'overtime_amount']
+    # 由明細彙總而來的欄位
+    TOTAL_FIELDS = ['gross_amount', 'total_allowances', 'total_deductions', 'net_amount']
     
     def __str__(self):
         return f"{self.employee.name} - {self.period}"
@@ -120,14 +424,35 @@ class Salary(models.Model):
 
     @property
     def total_salary(self):
-        salary_items = self.salarydetail_set.all()
-        total = self.base_amount + self.overtime_amount
-        for item in salary_items:
-            if item.item.item_type in ['ALLOWANCE', 'BONUS']:
-                total += item.amount
-            else:
-                total -= item.amount
-        return total
+        """實發金額（由 net_amount 欄位提供，寫入明細時同步更新）"""
+        return self.net_amount
+
+    def set_figures(self, base_amount, working_hours, overtime_hours, overtime_amount):
+        """
+        設定計算出的工時與金額（不儲存）
+
+        計算過程不做任何捨入，只在此處以 ROUND_HALF_UP 捨入一次：
+        時數至小數一位，金額至小數兩位，與欄位的儲存精度相同。
+        """
+        self.base_amount = round_amount(base_amount)
+        self.working_hours = round_hours(working_hours)
+        self.overtime_hours = round_hours(overtime_hours)
+        self.overtime_amount = round_amount(overtime_amount)
+
+    def set_totals(self, details):
+        """
+        依薪資明細設定彙總欄位（不儲存）
+
+        Args:
+            details: (項目類型, 金額) 的序列
+        """
+        for field, value in salary_totals(self.base_amount, self.overtime_amount, details).items():
+            setattr(self, field, value)
+
+    def refresh_totals(self):
+        """由資料庫中的明細重新計算並儲存彙總欄位"""
+        self.set_totals(self.salarydetail_set.values_list('item__item_type', 'amount'))
+        self.save(update_fields=self.TOTAL_FIELDS)
 
     @property
     def base_amount_int(self):
@@ -190,6 +515,12 @@ class Punch(models.Model):
     class Meta:
         verbose_name = '打卡記錄'
         verbose_name_plural = '打卡記錄'
+        constraints = [
+            # 打卡機重送或重複匯入不會產生重複記錄
+            models.UniqueConstraint(
+                fields=['employee', 'punch_time', 'punch_type'], name='unique_punch'
+            ),
+        ]
 
 class WorkSchedule(models.Model):
     SCHEDULE_TYPE_CHOICES = [
@@ -280,6 +611,7 @@ class SalaryItem(models.Model):
         ('DEDUCTION', '扣除'),
         ('BONUS', '獎金'),
     ]
+    ADDITION_TYPES = ['ALLOWANCE', 'BONUS']  # 計入應發金額的項目類型
     
     name = models.CharField(max_length=100, verbose_name='項目名稱')
     item_type = models.CharField(
@@ -317,6 +649,39 @@ class SalaryItem(models.Model):
         verbose_name = '薪資項目'
         verbose_name_plural = '薪資項目'
 
+class Holiday(models.Model):
+    KIND_CHOICES = [
+        ('NATIONAL', '國定假日'),
+        ('LUNAR', '農曆節日'),
+        ('COMPENSATORY', '補假'),
+        ('COMPANY', '公司假日'),
+        ('OTHER', '其他'),
+    ]
+
+    date = models.DateField(unique=True, verbose_name='日期')
+    name = models.CharField(max_length=100, verbose_name='名稱')
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        default='NATIONAL',
+        verbose_name='類型'
+    )
+    is_makeup_workday = models.BooleanField(
+        default=False,
+        verbose_name='補班日',
+        help_text='勾選表示此日為補行上班日，即使是週末或固定假日也視為工作日'
+    )
+    # 各行程以最後更新時間與筆數判斷假日行事曆快取是否過期
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
+
+    def __str__(self):
+        return f"{self.date} {self.name}"
+
+    class Meta:
+        verbose_name = '假日'
+        verbose_name_plural = '假日'
+        ordering = ['date']
+
 class Leave(models.Model):
     LEAVE_TYPES = [
         ('ANNUAL', '特休'),
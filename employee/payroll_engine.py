@@ -0,0 +1,526 @@
+"""
+批次薪資計算引擎
+以固定次數的查詢載入整個薪資期間的資料，於記憶體中計算後批次寫入
+"""
+import bisect
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .models import Employee, Salary, SalaryItem, Leave, round_amount
+from .attendance import PunchTimeline
+from .salary_details import sync_salary_details
+from .schedules import EMPTY_SCHEDULE_INDEX, ScheduleResolver
+from .salary_rules import LEAVE_DEDUCTION_ITEM_NAME, SalaryRuleProgram
+from .holidays import refresh_holiday_cache
+from .leaves import UNPAID_LEAVE_TYPES, load_unpaid_leaves
+from .payroll_stages import StageRecorder
+from .services import SalaryCalculationService
+
+
+# 批次寫入時每批的筆數
+BULK_BATCH_SIZE = 500
+
+# 平行計算時每個分片的預設員工數
+DEFAULT_SHARD_SIZE = 250
+
+# 分批寫入時每批的預設員工數
+DEFAULT_BATCH_SIZE = 500
+
+
+class PayrollDataset:
+    """
+    薪資期間資料集
+
+    一次載入期間內所有員工的打卡、班別指派、核准請假、薪資項目及既有薪資記錄，
+    查詢次數與員工人數無關。薪資項目於載入時編譯為規則程式，整個計算期間共用；
+    假日行事曆於載入時比對資料表版本，其他行程修改過假日時重新編譯。
+    """
+
+    def __init__(self, period, employees=None, read_only=False):
+        """
+        Args:
+            period: 薪資期間物件
+            employees: 要計算的員工 QuerySet，預設為所有在職員工
+            read_only: 僅供預覽，計算過程中不建立任何資料
+        """
+        self.period = period
+        self.read_only = read_only
+
+        if employees is None:
+            employees = Employee.objects.filter(active=True)
+        employees = employees.order_by('id')
+
+        self.employees = list(employees)
+        self.salaries = {
+            salary.employee_id: salary
+            for salary in Salary.objects.filter(period=period, employee__in=employees)
+        }
+        refresh_holiday_cache()
+        self.rule_program = SalaryRuleProgram.compile()
+        self.leave_deduction_item = self.rule_program.leave_deduction_item
+        self.timelines = PunchTimeline.for_employees(period, employees)
+        self.schedules = ScheduleResolver.for_employees(period, employees)
+        self.leaves = load_unpaid_leaves(period, employees)
+
+    def get_timeline(self, employee):
+        """取得員工的打卡時間軸"""
+        return self.timelines.get(employee.id) or PunchTimeline()
+
+    def get_schedule(self, employee):
+        """取得員工的班別索引"""
+        return self.schedules.get(employee.id, EMPTY_SCHEDULE_INDEX)
+
+    def get_leaves(self, employee):
+        """取得員工於期間內的核准無薪假"""
+        return self.leaves.get(employee.id, [])
+
+
+class BulkPayrollEngine:
+    """
+    批次薪資計算引擎
+
+    計算邏輯沿用 SalaryCalculationService 的各項規則，確保結果與逐一員工計算相同；
+    差別只在於資料載入與寫入方式。
+    """
+
+    def __init__(self, service=None):
+        if service is None:
+            service = SalaryCalculationService()
+        self.service = service
+        self.stages = service.stage_recorder  # 各計算階段的耗時記錄
+        self.summary = None  # 最近一次 run() 的執行摘要
+
+    def run(self, period, employees=None, workers=1, shard_size=DEFAULT_SHARD_SIZE):
+        """
+        計算並寫入期間內所有員工薪資
+
+        Args:
+            period: 薪資期間物件
+            employees: 要計算的員工 QuerySet，預設為所有在職員工
+            workers: 平行計算的行程數，1 表示於目前行程中一次計算
+            shard_size: 平行計算時每個分片的員工數
+
+        Returns:
+            int: 處理的員工數（含已確認而略過重算者）
+        """
+        if employees is None:
+            employees = Employee.objects.filter(active=True)
+
+        started = time.perf_counter()
+        # 此時間之後才標記的薪資，其變更可能未包含在載入的資料中，寫入時保留標記
+        loaded_at = timezone.now()
+        if workers > 1:
+            shards = self._compute_parallel(period, employees, workers, shard_size)
+        else:
+            shards = [_run_shard(self.service, period, employees.query, 0)]
+
+        # 合併階段：依分片順序（即員工 ID 順序）串接結果，與行程數無關
+        results = [result for shard in shards for result in shard['results']]
+        employee_count = sum(shard['employees'] for shard in shards)
+        for shard in shards:
+            self.stages.merge(shard['stages'])
+
+        write_started = time.perf_counter()
+        with self.stages.recording():
+            detail_changes = self.write(period, employees, results, loaded_at)
+        finished = time.perf_counter()
+
+        self.summary = {
+            'workers': workers,
+            'employees': employee_count,
+            'calculated': len(results),
+            'shards': [
+                {key: value for key, value in shard.items() if key not in ('results', 'stages')}
+                for shard in shards
+            ],
+            'details': detail_changes,
+            'write_seconds': round(finished - write_started, 3),
+            'total_seconds': round(finished - started, 3),
+        }
+        return employee_count
+
+    def run_batches(self, period, employees=None, batch_size=DEFAULT_BATCH_SIZE,
+                    workers=1, progress=None, start_after=None):
+        """
+        依員工 ID 分批計算並寫入
+
+        每批各自提交，提交後呼叫 progress 記錄檢查點；中斷後以 start_after 續跑，
+        已完成的批次不會重新計算。
+
+        Args:
+            period: 薪資期間物件
+            employees: 要計算的員工 QuerySet，預設為所有在職員工
+            batch_size: 每批的員工數
+            workers: 每批平行計算的行程數
+            progress: 每批提交後呼叫的函式 progress(已處理員工數, 員工總數, 最後員工 ID)，
+                      可拋出例外中止後續批次
+            start_after: 檢查點，只處理 ID 大於此值的員工
+
+        Returns:
+            int: 已處理的員工數（含檢查點之前已完成者）
+        """
+        if employees is None:
+            employees = Employee.objects.filter(active=True)
+
+        started = time.perf_counter()
+        employee_ids = list(employees.order_by('id').values_list('id', flat=True))
+        total = len(employee_ids)
+        resumed = 0
+        if start_after is not None:
+            resumed = bisect.bisect_right(employee_ids, start_after)
+            employee_ids = employee_ids[resumed:]
+        summary = {
+            'workers': workers,
+            'resumed_employees': resumed,
+            'employees': 0,
+            'calculated': 0,
+            'batches': 0,
+            'shards': [],
+            'details': {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0},
+            'write_seconds': 0,
+        }
+
+        for start in range(0, len(employee_ids), batch_size):
+            batch_ids = employee_ids[start:start + batch_size]
+            self.run(
+                period,
+                employees=employees.filter(id__gte=batch_ids[0], id__lte=batch_ids[-1]),
+                workers=workers,
+            )
+
+            batch_summary = self.summary
+            summary['employees'] += batch_summary['employees']
+            summary['calculated'] += batch_summary['calculated']
+            summary['batches'] += 1
+            for shard in batch_summary['shards']:
+                shard['index'] = len(summary['shards'])
+                summary['shards'].append(shard)
+            for key, count in batch_summary['details'].items():
+                summary['details'][key] += count
+            summary['write_seconds'] += batch_summary['write_seconds']
+
+            if progress is not None:
+                progress(resumed + summary['employees'], total, batch_ids[-1])
+
+        summary['write_seconds'] = round(summary['write_seconds'], 3)
+        summary['total_seconds'] = round(time.perf_counter() - started, 3)
+        self.summary = summary
+        return resumed + summary['employees']
+
+    def _compute_parallel(self, period, employees, workers, shard_size):
+        """將員工依 ID 切分為分片，於行程池中平行計算"""
+        if connection.in_atomic_block:
+            raise RuntimeError('平行計算需要已提交的資料，不可在交易區塊中執行')
+
+        employee_ids = list(employees.order_by('id').values_list('id', flat=True))
+        shard_ranges = [
+            (employee_ids[start], employee_ids[min(start + shard_size, len(employee_ids)) - 1])
+            for start in range(0, len(employee_ids), shard_size)
+        ]
+        if not shard_ranges:
+            return []
+
+        # 請假扣款項目須在分片計算前存在，避免多個行程同時建立
+        if Leave.objects.filter(
+            employee__in=employees,
+            status='APPROVED',
+            leave_type__in=UNPAID_LEAVE_TYPES,
+            start_date__lte=period.end_date,
+            end_date__gte=period.start_date
+        ).exists():
+            self.service._get_leave_deduction_item()
+
+        # 子行程需自行建立資料庫連線，不可沿用父行程的連線
+        connections.close_all()
+
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=context, initializer=_init_worker
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_shard,
+                    self.service,
+                    period,
+                    employees.filter(id__gte=first_id, id__lte=last_id).query,
+                    index,
+                )
+                for index, (first_id, last_id) in enumerate(shard_ranges)
+            ]
+            shards = [future.result() for future in futures]
+
+        return sorted(shards, key=lambda shard: shard['index'])
+
+    def compute(self, dataset):
+        """
+        於記憶體中計算資料集內所有未確認的薪資
+
+        Returns:
+            list: 每位員工的計算結果字典，依員工 ID 排序
+        """
+        results = []
+        for employee in dataset.employees:
+            salary = dataset.salaries.get(employee.id)
+            if salary is not None and salary.is_confirmed:
+                continue  # 已確認的薪資不重新計算
+            results.append(self.compute_employee(dataset, employee))
+        return results
+
+    def compute_employee(self, dataset, employee):
+        """計算單一員工的薪資數據（不寫入資料庫）"""
+        figures, leave_deduction, detail_rows = self._compute_figures(dataset, employee)
+        figures['details'] = [
+            {
+                'item_id': item.id,
+                'item_type': item.item_type,
+                'amount': amount,
+                'description': description,
+            }
+            for item, amount, description in detail_rows
+        ]
+        return figures
+
+    def preview(self, dataset):
+        """
+        依序產生資料集內每位員工的薪資預覽（不寫入資料庫）
+
+        Yields:
+            dict: 可直接 JSON 序列化的預覽資料
+        """
+        for employee in dataset.employees:
+            yield self.preview_employee(dataset, employee)
+
+    def preview_employee(self, dataset, employee):
+        """
+        計算單一員工的薪資預覽
+
+        金額經由與寫入相同的 Salary.set_figures/set_totals 捨入，預覽與處理後儲存的金額一致。
+        """
+        period = dataset.period
+        figures, leave_deduction, detail_rows = self._compute_figures(dataset, employee)
+
+        salary = Salary(employee=employee, period=period)
+        salary.set_figures(*(figures[field] for field in Salary.FIGURE_FIELDS))
+        salary.set_totals((item.item_type, amount) for item, amount, description in detail_rows)
+
+        items_preview = [
+            {
+                'name': item.name,
+                'type': item.get_item_type_display(),
+                'amount': float(round_amount(amount))
+            }
+            for item, amount, description in detail_rows
+        ]
+
+        return {
+            'employee_id': employee.id,
+            'employee_name': employee.name,
+            'period': f"{period.start_date} ~ {period.end_date}",
+            'base_amount': float(salary.base_amount),
+            'working_hours': float(salary.working_hours),
+            'overtime_hours': float(salary.overtime_hours),
+            'overtime_amount': float(salary.overtime_amount),
+            'leave_deduction': {
+                'amount': float(leave_deduction['total_amount']),
+                'days': leave_deduction['unpaid_days'],
+                'details': leave_deduction['details']
+            },
+            'salary_items': items_preview,
+            'total_allowances': float(salary.total_allowances),
+            'total_deductions': float(salary.total_deductions),
+            'gross_salary': float(salary.gross_amount),
+            'net_salary': float(salary.net_amount)
+        }
+
+    def _compute_figures(self, dataset, employee):
+        """
+        計算單一員工的薪資數據
+
+        Returns:
+            tuple: (薪資數據字典, 請假扣款資訊, 薪資明細列表)
+        """
+        service = self.service
+        stages = self.stages
+        period = dataset.period
+
+        # 工作時數和加班費
+        with stages.stage('attendance'):
+            working_hours, overtime_hours, overtime_amount = service._calculate_work_hours_and_overtime(
+                employee, period, dataset.get_timeline(employee), dataset.get_schedule(employee)
+            )
+
+        # 基本薪資：兼職員工依實際工作時數計算
+        with stages.stage('base_salary'):
+            base_amount = service._calculate_base_salary(employee, period, working_hours)
+
+        # 請假扣款
+        with stages.stage('leave'):
+            leave_deduction = service._calculate_leave_deduction(
+                employee, period, approved_leaves=dataset.get_leaves(employee)
+            )
+
+        # 百分比項目以捨入至儲存精度的金額為基數，與逐一員工計算（由薪資記錄取值）相同
+        with stages.stage('salary_items'):
+            detail_rows = service._build_detail_rows(
+                employee,
+                period,
+                round_amount(base_amount),
+                round_amount(overtime_amount),
+                dataset.rule_program,
+                leave_deduction,
+                lambda: self._get_leave_deduction_item(dataset),
+            )
+
+        figures = {
+            'employee_id': employee.id,
+            'base_amount': base_amount,
+            'working_hours': working_hours,
+            'overtime_hours': overtime_hours,
+            'overtime_amount': overtime_amount,
+        }
+        return figures, leave_deduction, detail_rows
+
+    def _get_leave_deduction_item(self, dataset):
+        """取得規則程式中的請假扣款項目，不存在時才建立"""
+        if dataset.leave_deduction_item is None:
+            if dataset.read_only:
+                # 預覽時不建立資料，使用未儲存的項目
+                dataset.leave_deduction_item = SalaryItem(
+                    name=LEAVE_DEDUCTION_ITEM_NAME, item_type='DEDUCTION', is_fixed=False
+                )
+            else:
+                dataset.leave_deduction_item = self.service._get_leave_deduction_item()
+        return dataset.leave_deduction_item
+
+    def write(self, period, employees, results, loaded_at=None):
+        """
+        以批次方式寫入計算結果
+
+        既有薪資記錄於寫入交易中鎖定並重新載入，計算期間才被確認的薪資不會被覆寫；
+        載入資料之後才被標記為需重新計算的薪資保留標記，由下次重新計算處理。
+        新增的薪資記錄使用 bulk_create，既有記錄使用 bulk_update，
+        明細與既有資料比對後只寫入有變動的資料列。
+
+        Args:
+            period: 薪資期間物件
+            employees: 計算的員工 QuerySet
+            results: compute() 的計算結果
+            loaded_at: 開始載入資料的時間，None 表示清除所有寫入記錄的標記
+
+        Returns:
+            dict: 新增、更新、刪除及未變動的明細筆數
+        """
+        update_fields = Salary.FIGURE_FIELDS + Salary.TOTAL_FIELDS + ['is_stale']
+
+        with transaction.atomic():
+            with self.stages.stage('load_data'):
+                salaries = {
+                    salary.employee_id: salary
+                    for salary in Salary.objects.select_for_update().filter(
+                        period=period, employee__in=employees
+                    )
+                }
+
+            new_salaries = []
+            existing_salaries = []
+            written = []
+            for result in results:
+                salary = salaries.get(result['employee_id'])
+                if salary is None:
+                    salary = Salary(employee_id=result['employee_id'], period=period)
+                    new_salaries.append(salary)
+                elif salary.is_confirmed:
+                    continue  # 計算期間已確認的薪資不覆寫
+                else:
+                    existing_salaries.append(salary)
+                salary.set_figures(*(result[field] for field in Salary.FIGURE_FIELDS))
+                salary.set_totals(
+                    (detail['item_type'], detail['amount']) for detail in result['details']
+                )
+                salary.is_stale = bool(
+                    salary.is_stale and loaded_at is not None
+                    and salary.stale_at is not None and salary.stale_at >= loaded_at
+                )
+                written.append(result)
+
+            with self.stages.stage('write_salaries') as stage:
+                if new_salaries:
+                    Salary.objects.bulk_create(new_salaries, batch_size=BULK_BATCH_SIZE)
+                    if any(salary.pk is None for salary in new_salaries):
+                        # 資料庫不支援回傳主鍵時重新查詢
+                        salary_ids = dict(
+                            Salary.objects.filter(period=period).values_list('employee_id', 'id')
+                        )
+                        for salary in new_salaries:
+                            salary.pk = salary_ids[salary.employee_id]
+                    for salary in new_salaries:
+                        salaries[salary.employee_id] = salary
+
+                if existing_salaries:
+                    Salary.objects.bulk_update(
+                        existing_salaries, update_fields, batch_size=BULK_BATCH_SIZE
+                    )
+                stage.rows = len(new_salaries) + len(existing_salaries)
+
+            with self.stages.stage('write_details') as stage:
+                changes = sync_salary_details(
+                    {
+                        salaries[result['employee_id']].pk: [
+                            (detail['item_id'], detail['amount'], detail['description'])
+                            for detail in result['details']
+                        ]
+                        for result in written
+                    },
+                    batch_size=BULK_BATCH_SIZE,
+                )
+                stage.rows = changes['created'] + changes['updated'] + changes['deleted']
+            return changes
+
+
+def _init_worker():
+    """行程池初始化：確保 Django 已載入，並使用各自的資料庫連線"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _run_shard(service, period, employee_query, index):
+    """
+    計算單一分片的薪資（不寫入資料庫）
+
+    Args:
+        service: SalaryCalculationService 物件
+        period: 薪資期間物件
+        employee_query: 分片員工的 Query 物件（可跨行程傳遞而不需先執行查詢）
+        index: 分片序號
+
+    Returns:
+        dict: 分片序號、計算結果、員工 ID 範圍、員工數、耗時及各階段耗時
+    """
+    started = time.perf_counter()
+    employees = Employee.objects.all()
+    employees.query = employee_query
+
+    # 分片各自記錄階段耗時，由 run() 合併（子行程中無法寫回父行程的記錄器）
+    engine = BulkPayrollEngine(service)
+    engine.stages = StageRecorder(service.stage_hooks)
+    with engine.stages.recording():
+        with engine.stages.stage('load_data'):
+            dataset = PayrollDataset(period, employees)
+        results = engine.compute(dataset)
+
+    return {
+        'index': index,
+        'first_employee_id': dataset.employees[0].id if dataset.employees else None,
+        'last_employee_id': dataset.employees[-1].id if dataset.employees else None,
+        'employees': len(dataset.employees),
+        'calculated': len(results),
+        'seconds': round(time.perf_counter() - started, 3),
+        'stages': engine.stages.as_dict(),
+        'results': results,
+    }
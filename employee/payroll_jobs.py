@@ -0,0 +1,203 @@
+"""
+薪資處理背景工作
+薪資期間的處理以 PayrollJob 記錄排入佇列，由 run_payroll_worker 指令啟動的工作程序執行，
+網頁只需建立工作並輪詢進度。工作依員工分批提交並記錄檢查點，中斷後可從檢查點續跑。
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Employee, PayrollJob
+from .services import SalaryCalculationService
+
+
+logger = logging.getLogger(__name__)
+
+# 每批處理的員工數，每批提交後記錄檢查點並檢查是否要求取消
+JOB_BATCH_SIZE = 500
+
+# 處理中的工作超過此秒數未回報進度，視為工作程序已中止，重新排入佇列續跑
+JOB_STALE_SECONDS = 600
+
+
+class PayrollJobCancelled(Exception):
+    """工作已被要求取消"""
+
+
+def worker_name():
+    """工作程序識別名稱（主機名稱:行程 ID）"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue_payroll_job(period, user=None):
+    """
+    建立薪資處理工作
+
+    同一期間已有等待中或處理中的工作時，直接回傳該工作；
+    前一次工作失敗或被取消時，新工作沿用其檢查點，已完成的員工不再重新計算。
+
+    Args:
+        period: 薪資期間物件
+        user: 建立工作的使用者
+
+    Returns:
+        PayrollJob: 薪資處理工作
+    """
+    if period.is_processed:
+        raise ValueError("此薪資期間已經處理過了")
+
+    job = PayrollJob.objects.filter(
+        period=period, status__in=PayrollJob.ACTIVE_STATUSES
+    ).order_by('created_at').first()
+    if job is not None:
+        return job
+
+    previous = PayrollJob.objects.filter(
+        period=period, status__in=['FAILED', 'CANCELLED'], last_employee_id__isnull=False
+    ).order_by('-created_at', '-id').first()
+
+    return PayrollJob.objects.create(
+        period=period,
+        created_by=user,
+        total_employees=Employee.objects.filter(active=True).count(),
+        processed_employees=previous.processed_employees if previous else 0,
+        last_employee_id=previous.last_employee_id if previous else None,
+    )
+
+
+def request_job_cancel(job):
+    """
+    取消薪資處理工作
+
+    等待中的工作直接標記為已取消；處理中的工作於目前批次完成後停止。
+
+    Returns:
+        bool: 是否已受理取消
+    """
+    now = timezone.now()
+    if PayrollJob.objects.filter(pk=job.pk, status='PENDING').update(
+        status='CANCELLED', cancel_requested=True, finished_at=now
+    ):
+        return True
+    return bool(
+        PayrollJob.objects.filter(pk=job.pk, status='RUNNING').update(cancel_requested=True)
+    )
+
+
+def requeue_stale_jobs(stale_seconds=JOB_STALE_SECONDS):
+    """
+    將停止回報進度的處理中工作重新排入佇列
+
+    工作程序中止（如行程被終止、主機重啟）時工作會停留在處理中，
+    重新排入後由下一個工作程序從檢查點續跑。
+
+    Returns:
+        int: 重新排入的工作數
+    """
+    now = timezone.now()
+    stale_jobs = PayrollJob.objects.filter(
+        status='RUNNING', heartbeat_at__lt=now - timedelta(seconds=stale_seconds)
+    )
+    # 已要求取消的工作不再續跑
+    stale_jobs.filter(cancel_requested=True).update(status='CANCELLED', finished_at=now)
+    return stale_jobs.update(status='PENDING', worker='')
+
+
+def claim_job(job, worker=None):
+    """
+    認領指定的等待中工作並標記為處理中
+
+    以條件更新（status='PENDING'）認領，多個工作程序同時執行時每個工作只會被取得一次。
+
+    Returns:
+        bool: 是否認領成功
+    """
+    now = timezone.now()
+    claimed = PayrollJob.objects.filter(pk=job.pk, status='PENDING').update(
+        status='RUNNING', worker=worker or worker_name(), started_at=now, heartbeat_at=now
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def claim_next_job(worker=None):
+    """
+    取得下一個等待中的工作並標記為處理中
+
+    Returns:
+        PayrollJob | None: 認領到的工作，沒有等待中的工作時為 None
+    """
+    pending_jobs = PayrollJob.objects.filter(status='PENDING').select_related(
+        'period'
+    ).order_by('created_at', 'id')[:10]
+
+    for job in pending_jobs:
+        if claim_job(job, worker):
+            return job
+    return None
+
+
+def run_payroll_job(job, batch_size=JOB_BATCH_SIZE, workers=1, service=None):
+    """
+    執行薪資處理工作
+
+    依員工分批計算，每批提交後記錄檢查點與進度；若已要求取消，於批次之間停止。
+    最後一批提交後所有員工皆已寫入，此時才收到的取消要求不再受理，工作照常完成並標記期間為已處理。
+    工作帶有檢查點時從檢查點之後的員工續跑。
+
+    Args:
+        job: 已認領（處理中）的薪資處理工作
+        batch_size: 每批的員工數
+        workers: 每批平行計算的行程數
+        service: SalaryCalculationService 物件，執行摘要記錄於其 last_run_summary，
+                 各階段耗時隨進度寫入工作的 stage_timings
+
+    Returns:
+        PayrollJob: 更新後的工作
+    """
+    def progress(processed, total, last_employee_id):
+        PayrollJob.objects.filter(pk=job.pk).update(
+            processed_employees=processed,
+            total_employees=total,
+            last_employee_id=last_employee_id,
+            stage_timings=service.stage_recorder.as_dict(),
+            heartbeat_at=timezone.now(),
+        )
+        if processed < total and PayrollJob.objects.filter(pk=job.pk, cancel_requested=True).exists():
+            raise PayrollJobCancelled()
+
+    if service is None:
+        service = SalaryCalculationService()
+    try:
+        service.process_payroll_for_period(
+            job.period,
+            batch_size=batch_size,
+            workers=workers,
+            progress=progress,
+            start_after=job.last_employee_id,
+        )
+    except PayrollJobCancelled:
+        _finish_job(job, 'CANCELLED', stage_timings=service.stage_recorder.as_dict())
+    except Exception as e:
+        logger.exception('薪資處理工作 %s 失敗', job.pk)
+        _finish_job(job, 'FAILED', str(e), stage_timings=service.stage_recorder.as_dict())
+    else:
+        _finish_job(job, 'SUCCEEDED', stage_timings=service.stage_recorder.as_dict())
+
+    job.refresh_from_db()
+    return job
+
+
+def _finish_job(job, status, error_message='', stage_timings=None):
+    fields = {
+        'status': status,
+        'error_message': error_message,
+        'finished_at': timezone.now(),
+    }
+    if stage_timings is not None:
+        fields['stage_timings'] = stage_timings
+    PayrollJob.objects.filter(pk=job.pk).update(**fields)
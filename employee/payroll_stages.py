@@ -0,0 +1,143 @@
+"""
+薪資計算階段計時
+記錄薪資計算各階段（載入資料、出勤工時、基本薪資、請假扣款、薪資項目、寫入）的
+耗時、查詢次數與寫入筆數，並可掛接自訂的監控函式
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+# 階段名稱與顯示名稱，依計算順序排列
+STAGE_LABELS = {
+    'load_data': '載入資料',
+    'attendance': '出勤工時',
+    'base_salary': '基本薪資',
+    'leave': '請假扣款',
+    'salary_items': '薪資項目',
+    'write_salaries': '寫入薪資',
+    'write_details': '寫入明細',
+}
+
+
+def _empty_stage():
+    return {'calls': 0, 'seconds': 0.0, 'queries': 0, 'rows': 0}
+
+
+class StageCall:
+    """單次階段執行，rows 由呼叫端設定寫入筆數"""
+
+    def __init__(self, stats):
+        self.rows = 0
+        self.stats = stats
+        self.child_seconds = 0.0  # 內層階段的耗時，不計入本階段
+
+
+class StageRecorder:
+    """
+    薪資計算階段記錄器
+
+    以 stage() 包住各階段；recording() 期間安裝 connection.execute_wrapper，
+    查詢次數計入當時執行中的階段。階段可以巢狀，各階段只記錄本身的耗時與查詢次數（不含內層階段），
+    所有階段相加即為總耗時。每次階段結束時依序呼叫 hooks：
+    hook(階段名稱, 耗時秒數, 查詢次數, 寫入筆數)。
+    """
+
+    def __init__(self, hooks=()):
+        self.hooks = hooks
+        self.stages = {}
+        self._active = None
+        self._recording = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._active is not None:
+            self._active.stats['queries'] += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def recording(self):
+        """計算查詢次數（巢狀呼叫時只安裝一次）"""
+        if self._recording:
+            yield self
+            return
+        self._recording = True
+        try:
+            with connection.execute_wrapper(self):
+                yield self
+        finally:
+            self._recording = False
+
+    @contextmanager
+    def stage(self, name):
+        """記錄單一階段的耗時與查詢次數（不含內層階段）"""
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = _empty_stage()
+        call = StageCall(stats)
+        previous = self._active
+        queries_before = stats['queries']
+        self._active = call
+        started = time.perf_counter()
+        try:
+            yield call
+        finally:
+            elapsed = time.perf_counter() - started
+            self._active = previous
+            if previous is not None:
+                previous.child_seconds += elapsed
+            seconds = elapsed - call.child_seconds
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['rows'] += call.rows
+            for hook in self.hooks:
+                hook(name, seconds, stats['queries'] - queries_before, call.rows)
+
+    def merge(self, stages):
+        """合併其他記錄器（如平行計算的分片）的 as_dict() 結果"""
+        for name, other in stages.items():
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = _empty_stage()
+            for key in stats:
+                stats[key] += other[key]
+
+    def as_dict(self):
+        """
+        各階段的彙總，可直接以 JSON 儲存
+
+        Returns:
+            dict: {階段名稱: {'calls', 'seconds', 'queries', 'rows'}}，依計算順序排列
+        """
+        order = list(STAGE_LABELS)
+        names = sorted(
+            self.stages,
+            key=lambda name: order.index(name) if name in order else len(order),
+        )
+        return {
+            name: dict(self.stages[name], seconds=round(self.stages[name]['seconds'], 4))
+            for name in names
+        }
+
+
+def stage_rows(stage_timings):
+    """
+    將儲存的階段彙總轉換為顯示用的列表
+
+    Returns:
+        list: 每個階段的名稱、顯示名稱、次數、耗時、查詢次數、寫入筆數及耗時佔比
+    """
+    stage_timings = stage_timings or {}
+    total_seconds = sum(stats['seconds'] for stats in stage_timings.values()) or 1
+    return [
+        {
+            'stage': name,
+            'label': STAGE_LABELS.get(name, name),
+            'calls': stats['calls'],
+            'seconds': stats['seconds'],
+            'queries': stats['queries'],
+            'rows': stats['rows'],
+            'percent': round(stats['seconds'] / total_seconds * 100, 1),
+        }
+        for name, stats in stage_timings.items()
+    ]
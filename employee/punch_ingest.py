@@ -0,0 +1,477 @@
+"""
+批次打卡寫入
+打卡機一次送出多筆打卡（JSON 陣列或 NDJSON），以員工編號對照表解析員工，
+全部驗證後以 bulk_create 分批寫入，並回傳每筆記錄的處理結果；
+Excel 打卡匯入以唯讀模式逐列讀取，分批寫入，記憶體用量與檔案大小無關。
+打卡記錄以（員工、打卡時間、打卡類型）唯一，已存在的記錄略過不重複寫入，重送與重複匯入皆安全
+"""
+import itertools
+import json
+import time
+from datetime import datetime
+
+import openpyxl
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Employee, Punch
+from .signals import mark_punches_stale
+
+
+# 每批寫入的打卡筆數
+PUNCH_BATCH_SIZE = 1000
+
+# 每批查詢員工編號的筆數
+EMPLOYEE_LOOKUP_BATCH_SIZE = 500
+
+# 單一請求可送出的打卡筆數上限
+MAX_BULK_PUNCHES = 10000
+
+# 打卡時間字串接受的格式，皆不符時再以 ISO 8601 解析（可帶時區）
+PUNCH_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+
+PUNCH_TYPES = {punch_type for punch_type, label in Punch.PUNCH_TYPES}
+
+# Excel 打卡匯入的必要欄位
+PUNCH_IMPORT_HEADERS = ['employee_id', 'punch_type', 'punch_time']
+
+# 匯入回應中列出的錯誤訊息上限，超過的只計入錯誤筆數
+MAX_REPORTED_ERRORS = 100
+
+
+class PunchRecordError(ValueError):
+    """單筆打卡記錄無效"""
+
+
+def parse_punch_time(value):
+    """
+    解析打卡時間
+
+    Args:
+        value: datetime 或字串；未帶時區者視為目前時區的當地時間
+
+    Returns:
+        datetime: 帶時區的打卡時間
+    """
+    if isinstance(value, datetime):
+        punch_time = value
+    elif isinstance(value, str):
+        value = value.strip()
+        for time_format in PUNCH_TIME_FORMATS:
+            try:
+                punch_time = datetime.strptime(value, time_format)
+                break
+            except ValueError:
+                continue
+        else:
+            try:
+                punch_time = datetime.fromisoformat(value)
+            except ValueError:
+                raise PunchRecordError(f'無法解析打卡時間: {value}')
+    else:
+        raise PunchRecordError('無法解析打卡時間格式。')
+
+    if timezone.is_naive(punch_time):
+        punch_time = timezone.make_aware(punch_time)
+    return punch_time
+
+
+def employee_code(value):
+    """員工編號正規化為字串（Excel 數值儲存格會讀成 1001.0）"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def load_all_employee_map():
+    """
+    建立所有員工的編號對照表（單一查詢，大小與員工數成正比，與匯入檔案大小無關）
+
+    Returns:
+        dict: {員工編號: 員工主鍵}
+    """
+    return dict(Employee.objects.values_list('employee_id', 'id').iterator())
+
+
+def load_employee_map(employee_codes, batch_size=EMPLOYEE_LOOKUP_BATCH_SIZE):
+    """
+    建立員工編號對照表
+
+    Args:
+        employee_codes: 員工編號（Employee.employee_id）
+
+    Returns:
+        dict: {員工編號: 員工主鍵}
+    """
+    codes = sorted({employee_code(code) for code in employee_codes if code not in (None, '')})
+    employee_map = {}
+    for start in range(0, len(codes), batch_size):
+        employee_map.update(
+            Employee.objects.filter(
+                employee_id__in=codes[start:start + batch_size]
+            ).values_list('employee_id', 'id')
+        )
+    return employee_map
+
+
+def build_punch(record, employee_map):
+    """
+    驗證單筆打卡記錄並建立（未儲存的）打卡物件
+
+    Args:
+        record: {'employee_id': 員工編號, 'punch_type': 'IN' 或 'OUT', 'punch_time': 打卡時間}，
+                未提供打卡時間時使用目前時間
+        employee_map: load_employee_map() 的對照表
+
+    Returns:
+        Punch: 未儲存的打卡物件
+    """
+    if not isinstance(record, dict):
+        raise PunchRecordError('打卡記錄必須為 JSON 物件。')
+
+    code = record.get('employee_id')
+    punch_type = record.get('punch_type')
+    if code in (None, '') or not punch_type:
+        raise PunchRecordError('缺少員工編號或打卡類型。')
+    if not isinstance(punch_type, str) or punch_type not in PUNCH_TYPES:
+        raise PunchRecordError(f'打卡類型必須為 {"、".join(sorted(PUNCH_TYPES))}。')
+
+    employee_pk = employee_map.get(employee_code(code))
+    if employee_pk is None:
+        raise PunchRecordError(f'員工編號 {code} 不存在。')
+
+    punch_time_value = record.get('punch_time')
+    punch_time = parse_punch_time(punch_time_value) if punch_time_value else timezone.now()
+    return Punch(employee_id=employee_pk, punch_time=punch_time, punch_type=punch_type)
+
+
+def parse_punch_payload(body, content_type=''):
+    """
+    解析批次打卡的請求內容
+
+    接受 JSON 陣列、{"punches": [...]} 或 NDJSON（每行一筆 JSON 物件）。
+
+    Returns:
+        list: 打卡記錄
+    """
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    if 'ndjson' not in content_type:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = None  # 多行 JSON 物件，以 NDJSON 解析
+        else:
+            if isinstance(data, dict) and 'punches' in data:
+                data = data['punches']
+            if isinstance(data, list):
+                return data
+            if isinstance(data, dict):
+                return [data]
+            raise ValueError('請求內容必須為打卡記錄的 JSON 陣列。')
+
+    records = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f'第 {line_number} 行不是有效的 JSON: {e.msg}')
+    return records
+
+
+def punch_key(punch):
+    """打卡記錄的唯一鍵（員工、打卡時間、打卡類型）"""
+    return (punch.employee_id, punch.punch_time, punch.punch_type)
+
+
+def find_existing_punches(punches):
+    """
+    查詢已存在的相同打卡記錄
+
+    Returns:
+        dict: {唯一鍵: 既有打卡記錄主鍵}
+    """
+    if not punches:
+        return {}
+    keys = {punch_key(punch) for punch in punches}
+    rows = Punch.objects.filter(
+        employee_id__in={key[0] for key in keys},
+        punch_time__in={key[1] for key in keys},
+    ).values_list('id', 'employee_id', 'punch_time', 'punch_type')
+    return {
+        (employee_id, punch_time, punch_type): pk
+        for pk, employee_id, punch_time, punch_type in rows
+        if (employee_id, punch_time, punch_type) in keys
+    }
+
+
+def insert_punches(punches, batch_size=PUNCH_BATCH_SIZE):
+    """
+    分批寫入打卡記錄並標記受影響的薪資需重新計算
+
+    打卡記錄以（員工、打卡時間、打卡類型）唯一，重送或重複匯入相同的記錄不會重複寫入：
+    每批先查詢已存在的記錄並略過，批次內重複的記錄只寫入一筆；
+    查詢後才由其他請求寫入而違反唯一限制時，依唯一鍵重新查詢，已存在的記錄視為重複並回填其主鍵，其餘重新寫入。
+    bulk_create 不會觸發 signal，因此寫入後以 mark_punches_stale 一併標記。
+
+    Args:
+        punches: 未儲存的打卡記錄；重複（未寫入）的記錄其 pk 設為既有記錄的主鍵
+
+    Returns:
+        list: 實際寫入的打卡記錄
+    """
+    inserted = []
+    with transaction.atomic():
+        for start in range(0, len(punches), batch_size):
+            batch = punches[start:start + batch_size]
+            existing = find_existing_punches(batch)
+            new_punches = []
+            for punch in batch:
+                key = punch_key(punch)
+                if key in existing:
+                    punch.pk = existing[key]
+                    continue
+                existing[key] = None  # 批次內重複
+                new_punches.append(punch)
+            if not new_punches:
+                continue
+            while new_punches:
+                try:
+                    with transaction.atomic():
+                        Punch.objects.bulk_create(new_punches)
+                    break
+                except IntegrityError:
+                    # 其他請求同時寫入相同的記錄：依唯一鍵重新查詢，已存在的視為重複，其餘重新寫入
+                    found = find_existing_punches(new_punches)
+                    if not found:
+                        raise
+                    existing.update(found)
+                    for punch in new_punches:
+                        # 回復的寫入可能已回填部分主鍵
+                        punch.pk = None
+                        punch._state.adding = True
+                    new_punches = [punch for punch in new_punches if punch_key(punch) not in found]
+            for punch in new_punches:
+                existing[punch_key(punch)] = punch.pk
+            for punch in batch:
+                if punch.pk is None:
+                    punch.pk = existing[punch_key(punch)]
+            inserted.extend(new_punches)
+        mark_punches_stale(inserted)
+    return inserted
+
+
+def remove_duplicate_punches(batch_size=EMPLOYEE_LOOKUP_BATCH_SIZE, dry_run=False, progress=None):
+    """
+    刪除重複的打卡記錄（相同員工、打卡時間與打卡類型只保留主鍵最小的一筆）
+
+    依員工分批處理，每批只查詢該批員工的重複群組並在單一交易中刪除，
+    大量資料可分批提交；刪除後標記受影響的薪資需重新計算。
+
+    Args:
+        batch_size: 每批處理的員工數
+        dry_run: 只計算不刪除
+        progress: 每批完成後呼叫 progress(已處理員工數, 員工總數, 累計刪除筆數)
+
+    Returns:
+        int: 刪除（或 dry_run 時將刪除）的筆數
+    """
+    employee_ids = list(
+        Punch.objects.order_by('employee_id').values_list('employee_id', flat=True).distinct()
+    )
+    removed = 0
+    for start in range(0, len(employee_ids), batch_size):
+        chunk = employee_ids[start:start + batch_size]
+        groups = {
+            (row['employee_id'], row['punch_time'], row['punch_type']): row['keep_id']
+            for row in Punch.objects.filter(employee_id__in=chunk).values(
+                'employee_id', 'punch_time', 'punch_type'
+            ).annotate(
+                keep_id=Min('id'), copies=Count('id')
+            ).filter(copies__gt=1).order_by()
+        }
+        if groups:
+            with transaction.atomic():
+                duplicates = [
+                    punch for punch in Punch.objects.filter(
+                        employee_id__in={key[0] for key in groups},
+                        punch_time__in={key[1] for key in groups},
+                    ).only('id', 'employee_id', 'punch_time', 'punch_type')
+                    if groups.get(punch_key(punch), punch.pk) != punch.pk
+                ]
+                removed += len(duplicates)
+                if not dry_run:
+                    Punch.objects.filter(pk__in=[punch.pk for punch in duplicates]).delete()
+                    # 受影響的薪資依員工與日期範圍一併標記
+                    mark_punches_stale(duplicates)
+        if progress is not None:
+            progress(min(start + batch_size, len(employee_ids)), len(employee_ids), removed)
+    return removed
+
+
+def ingest_punches(records, batch_size=PUNCH_BATCH_SIZE):
+    """
+    驗證並寫入批次打卡
+
+    先以單一對照表解析所有員工編號並驗證全部記錄，再將有效的記錄分批寫入；
+    無效的記錄不寫入，其餘記錄照常寫入，打卡機只需重送失敗的記錄。
+    已存在的相同打卡不重複寫入，結果為 duplicate 並帶既有記錄的主鍵，整批重送也是安全的。
+
+    Args:
+        records: 打卡記錄列表
+        batch_size: 每批寫入的筆數
+
+    Returns:
+        dict: 寫入筆數、重複筆數、無效筆數及每筆記錄的結果（依輸入順序）
+    """
+    employee_map = load_employee_map(
+        record.get('employee_id') for record in records if isinstance(record, dict)
+    )
+
+    results = []
+    punches = []
+    accepted = []
+    for index, record in enumerate(records):
+        try:
+            punch = build_punch(record, employee_map)
+        except PunchRecordError as e:
+            results.append({'index': index, 'status': 'error', 'message': str(e)})
+            continue
+        result = {'index': index, 'status': 'created'}
+        results.append(result)
+        punches.append(punch)
+        accepted.append(result)
+
+    inserted = set()
+    if punches:
+        inserted = {id(punch) for punch in insert_punches(punches, batch_size=batch_size)}
+        for punch, result in zip(punches, accepted):
+            if id(punch) not in inserted:
+                result['status'] = 'duplicate'
+            result['id'] = punch.pk
+
+    return {
+        'created': len(inserted),
+        'duplicates': len(punches) - len(inserted),
+        'rejected': len(records) - len(punches),
+        'results': results,
+    }
+
+
+class PunchImportError(ValueError):
+    """匯入檔案無法處理（如缺少必要欄位）"""
+
+
+def read_punch_workbook(uploaded_file):
+    """
+    逐列讀取 Excel 打卡記錄（唯讀模式）
+
+    Args:
+        uploaded_file: xlsx 檔案（路徑或檔案物件），第一列為欄位名稱
+
+    Yields:
+        tuple: (列號, {'employee_id', 'punch_type', 'punch_time'})，列號與試算表中的列號相同
+    """
+    workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+        missing = [header for header in PUNCH_IMPORT_HEADERS if header not in headers]
+        if missing:
+            raise PunchImportError(
+                f'Excel 檔案缺少必要的欄位。需要: {", ".join(PUNCH_IMPORT_HEADERS)}'
+            )
+        columns = [(header, headers.index(header)) for header in PUNCH_IMPORT_HEADERS]
+
+        for row_number, row in enumerate(rows, start=2):
+            if not any(value not in (None, '') for value in row):
+                continue  # 空白列
+            yield row_number, {
+                header: row[index] if index < len(row) else None for header, index in columns
+            }
+    finally:
+        workbook.close()
+
+
+def import_punch_rows(rows, employee_map=None, batch_size=PUNCH_BATCH_SIZE, error_rows=None):
+    """
+    匯入打卡記錄列
+
+    員工編號以預先載入的對照表解析，有效的記錄每累積 batch_size 筆即寫入並提交；
+    無效的列略過並記錄錯誤，已存在的打卡不重複寫入（重複匯入同一檔案不會產生重複記錄）。
+
+    Args:
+        rows: (列號, 打卡記錄) 的序列，如 read_punch_workbook() 的結果
+        employee_map: 員工編號對照表，未提供時載入所有員工
+        batch_size: 每批寫入的筆數
+        error_rows: 列表，提供時附加所有錯誤的 (列號, 訊息)，不受 MAX_REPORTED_ERRORS 限制
+
+    Returns:
+        dict: 讀取列數、寫入筆數、重複筆數、錯誤筆數、錯誤訊息（最多 MAX_REPORTED_ERRORS 筆）及批次數
+    """
+    if employee_map is None:
+        employee_map = load_all_employee_map()
+    stats = {'rows': 0, 'created': 0, 'duplicates': 0, 'error_count': 0, 'errors': [], 'batches': 0}
+    batch = []
+    for row_number, record in rows:
+        stats['rows'] += 1
+        try:
+            if not record['punch_time']:
+                raise PunchRecordError('缺少必要的打卡資訊 (員工編號、打卡類型或打卡時間)。')
+            batch.append(build_punch(record, employee_map))
+        except PunchRecordError as e:
+            stats['error_count'] += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append(f'第 {row_number} 行錯誤: {e}')
+            if error_rows is not None:
+                error_rows.append((row_number, str(e)))
+            continue
+
+        if len(batch) >= batch_size:
+            _insert_batch(batch, batch_size, stats)
+            batch = []
+
+    if batch:
+        _insert_batch(batch, batch_size, stats)
+    return stats
+
+
+def _insert_batch(batch, batch_size, stats):
+    created = len(insert_punches(batch, batch_size=batch_size))
+    stats['created'] += created
+    stats['duplicates'] += len(batch) - created
+    stats['batches'] += 1
+
+
+def import_punch_workbook(uploaded_file, batch_size=PUNCH_BATCH_SIZE):
+    """
+    以串流方式匯入 Excel 打卡記錄
+
+    活頁簿以唯讀模式開啟並逐列讀取，員工編號以預先載入的對照表解析，
+    有效的記錄每累積 batch_size 筆即寫入並提交；無效的列略過並記錄錯誤。
+
+    Args:
+        uploaded_file: xlsx 檔案（路徑或檔案物件），第一列為欄位名稱
+        batch_size: 每批寫入的筆數
+
+    Returns:
+        dict: 讀取列數、寫入筆數、重複筆數、錯誤筆數、錯誤訊息（最多 MAX_REPORTED_ERRORS 筆）、
+              批次數、耗時及每秒處理列數
+    """
+    started = time.perf_counter()
+    rows = read_punch_workbook(uploaded_file)
+    try:
+        first = next(rows, None)  # 先檢查欄位再載入員工對照表
+        stats = import_punch_rows(
+            itertools.chain([first] if first else [], rows), batch_size=batch_size
+        )
+    finally:
+        rows.close()
+
+    seconds = time.perf_counter() - started
+    stats['seconds'] = round(seconds, 3)
+    stats['rows_per_second'] = round(stats['rows'] / seconds) if seconds else None
+    return stats
@@ -0,0 +1,198 @@
+"""
+每個請求的查詢預算
+中介軟體記錄每個請求的查詢次數與資料庫耗時，依解析出的 URL 名稱彙總，
+超過 settings.QUERY_BUDGETS 設定的預算時記錄警告並列出重複執行的 SQL 指紋
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# 未設定 QUERY_BUDGETS 時使用的預算
+DEFAULT_QUERY_BUDGETS = {
+    'default': {'queries': 50, 'db_ms': 1000},
+}
+
+# 警告中列出的重複 SQL 指紋數
+REPEATED_FINGERPRINT_LIMIT = 5
+
+# 每個請求最多記錄的不同 SQL 數，超過後新的 SQL 只計入查詢次數，記憶體用量不隨查詢次數增加
+RECORDED_STATEMENT_LIMIT = 200
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST_RE = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def sql_fingerprint(sql):
+    """
+    SQL 指紋：字串與數字常值換成 ?，IN 清單合併為 (...)，
+    只有參數不同的查詢會得到相同的指紋
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def get_query_budget(view_name):
+    """
+    取得指定 URL 名稱的預算
+
+    Returns:
+        dict: {'queries': 查詢次數上限, 'db_ms': 資料庫耗時上限（毫秒）}，值為 None 表示不限制
+    """
+    budgets = getattr(settings, 'QUERY_BUDGETS', DEFAULT_QUERY_BUDGETS)
+    budget = {'queries': None, 'db_ms': None}
+    budget.update(budgets.get('default', {}))
+    budget.update(budgets.get(view_name, {}))
+    return budget
+
+
+class QueryRecorder:
+    """
+    以 connection.execute_wrapper 記錄查詢次數、耗時及各 SQL 的執行次數
+
+    SQL 的參數以佔位符表示，相同的查詢只保留一份；只在超過預算時才計算指紋。
+    """
+
+    def __init__(self, statement_limit=RECORDED_STATEMENT_LIMIT):
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.statement_limit = statement_limit
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.count += 1
+            if sql in self.statements or len(self.statements) < self.statement_limit:
+                self.statements[sql] += 1
+
+    def repeated_fingerprints(self, limit=REPEATED_FINGERPRINT_LIMIT):
+        """執行超過一次的 SQL 指紋，依次數排序"""
+        counts = Counter()
+        for sql, count in self.statements.items():
+            counts[sql_fingerprint(sql)] += count
+        return [(fingerprint, count) for fingerprint, count in counts.most_common(limit) if count > 1]
+
+
+def record_request(view_name, queries, db_seconds, violated):
+    """將單一請求的查詢次數與耗時加入彙總"""
+    with _lock:
+        stats = _stats.get(view_name)
+        if stats is None:
+            stats = _stats[view_name] = {
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'db_seconds': 0.0,
+                'max_db_seconds': 0.0,
+                'violations': 0,
+            }
+        stats['requests'] += 1
+        stats['queries'] += queries
+        stats['max_queries'] = max(stats['max_queries'], queries)
+        stats['db_seconds'] += db_seconds
+        stats['max_db_seconds'] = max(stats['max_db_seconds'], db_seconds)
+        if violated:
+            stats['violations'] += 1
+
+
+def get_query_stats():
+    """
+    本行程的查詢彙總，依總查詢次數排序
+
+    Returns:
+        list: 每個 URL 名稱的請求數、平均與最大查詢次數、資料庫耗時及超標次數
+    """
+    with _lock:
+        snapshot = {view_name: dict(stats) for view_name, stats in _stats.items()}
+
+    rows = []
+    for view_name, stats in snapshot.items():
+        budget = get_query_budget(view_name)
+        rows.append({
+            'view': view_name,
+            'requests': stats['requests'],
+            'queries': stats['queries'],
+            'avg_queries': round(stats['queries'] / stats['requests'], 1),
+            'max_queries': stats['max_queries'],
+            'avg_db_ms': round(stats['db_seconds'] / stats['requests'] * 1000, 2),
+            'max_db_ms': round(stats['max_db_seconds'] * 1000, 2),
+            'violations': stats['violations'],
+            'budget': budget,
+        })
+    rows.sort(key=lambda row: row['queries'], reverse=True)
+    return rows
+
+
+def reset_query_stats():
+    """清除本行程的查詢彙總"""
+    with _lock:
+        _stats.clear()
+
+
+class QueryBudgetMiddleware:
+    """
+    記錄每個請求的查詢次數與資料庫耗時並檢查預算
+
+    只計算預設資料庫連線在回應產生前執行的查詢；串流回應於傳送內容時執行的查詢不計入。
+    settings.QUERY_BUDGET_ENABLED 為 False 時不做任何記錄。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_BUDGET_ENABLED', True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.view_name:
+            return response
+
+        view_name = match.view_name
+        budget = get_query_budget(view_name)
+        db_ms = recorder.db_seconds * 1000
+        violated = (
+            (budget['queries'] is not None and recorder.count > budget['queries'])
+            or (budget['db_ms'] is not None and db_ms > budget['db_ms'])
+        )
+        record_request(view_name, recorder.count, recorder.db_seconds, violated)
+
+        if violated:
+            repeated = recorder.repeated_fingerprints()
+            logger.warning(
+                '查詢預算超標：%s %s 執行 %d 次查詢（預算 %s），資料庫耗時 %.1f ms（預算 %s ms），'
+                '行程 %s；重複查詢：%s',
+                request.method,
+                view_name,
+                recorder.count,
+                '不限' if budget['queries'] is None else budget['queries'],
+                db_ms,
+                '不限' if budget['db_ms'] is None else budget['db_ms'],
+                os.getpid(),
+                '; '.join(f'{count}× {fingerprint}' for fingerprint, count in repeated) or '無',
+            )
+        return response
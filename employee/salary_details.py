@@ -0,0 +1,118 @@
+"""
+薪資明細寫入
+將計算出的明細與資料庫中既有的明細比對，只新增、更新或刪除有變動的資料列；
+並提供依明細回填薪資彙總欄位的函式（0013 遷移與 backfill_salary_totals 指令共用）
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Salary, SalaryDetail, round_amount, salary_totals
+
+
+# 每批查詢、寫入或刪除的筆數
+DETAIL_BATCH_SIZE = 500
+
+
+def sync_salary_details(computed_details, batch_size=DETAIL_BATCH_SIZE):
+    """
+    同步薪資明細
+
+    既有明細依薪資項目比對（同一項目出現多次時依建立順序配對）：
+    金額於寫入時以 ROUND_HALF_UP 捨入至儲存精度，捨入後的金額或說明不同才更新，新項目批次新增，不再適用的項目批次刪除。
+
+    Args:
+        computed_details: {薪資記錄 ID: [(薪資項目 ID, 金額, 說明), ...]}
+        batch_size: 每批處理的筆數
+
+    Returns:
+        dict: 新增、更新、刪除及未變動的明細筆數
+    """
+    salary_ids = list(computed_details)
+    existing = defaultdict(lambda: defaultdict(list))
+    for start in range(0, len(salary_ids), batch_size):
+        for detail in SalaryDetail.objects.filter(
+            salary_id__in=salary_ids[start:start + batch_size]
+        ).order_by('id'):
+            existing[detail.salary_id][detail.item_id].append(detail)
+
+    to_create = []
+    to_update = []
+    to_delete = []
+    unchanged = 0
+
+    for salary_id, rows in computed_details.items():
+        current = existing.get(salary_id, {})
+        for item_id, amount, description in rows:
+            matches = current.get(item_id)
+            if not matches:
+                to_create.append(SalaryDetail(
+                    salary_id=salary_id,
+                    item_id=item_id,
+                    amount=round_amount(amount),
+                    description=description,
+                ))
+                continue
+
+            detail = matches.pop(0)
+            amount = round_amount(amount)
+            if round_amount(detail.amount) == amount and detail.description == description:
+                unchanged += 1
+            else:
+                detail.amount = amount
+                detail.description = description
+                to_update.append(detail)
+
+        # 剩下未配對的既有明細已不再適用
+        for matches in current.values():
+            to_delete.extend(detail.pk for detail in matches)
+
+    with transaction.atomic():
+        if to_update:
+            SalaryDetail.objects.bulk_update(to_update, ['amount', 'description'], batch_size=batch_size)
+        if to_create:
+            SalaryDetail.objects.bulk_create(to_create, batch_size=batch_size)
+        for start in range(0, len(to_delete), batch_size):
+            SalaryDetail.objects.filter(pk__in=to_delete[start:start + batch_size]).delete()
+
+    return {
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': len(to_delete),
+        'unchanged': unchanged,
+    }
+
+
+def backfill_salary_totals(salary_model, detail_model, batch_size=DETAIL_BATCH_SIZE):
+    """
+    依薪資明細回填所有薪資記錄的彙總欄位，重複執行結果相同
+
+    只使用傳入的模型類別，遷移中可傳入歷史模型。
+
+    Args:
+        salary_model: Salary 模型
+        detail_model: SalaryDetail 模型
+        batch_size: 每批處理的薪資筆數
+
+    Returns:
+        int: 更新的薪資筆數
+    """
+    salary_ids = list(salary_model.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(salary_ids), batch_size):
+        batch_ids = salary_ids[start:start + batch_size]
+
+        details = defaultdict(list)
+        for salary_id, item_type, amount in detail_model.objects.filter(
+            salary_id__in=batch_ids
+        ).values_list('salary_id', 'item__item_type', 'amount'):
+            details[salary_id].append((item_type, amount))
+
+        salaries = list(salary_model.objects.filter(id__in=batch_ids))
+        for salary in salaries:
+            totals = salary_totals(salary.base_amount, salary.overtime_amount, details[salary.id])
+            for field, value in totals.items():
+                setattr(salary, field, value)
+
+        with transaction.atomic():
+            salary_model.objects.bulk_update(salaries, Salary.TOTAL_FIELDS)
+    return len(salary_ids)
@@ -0,0 +1,92 @@
+"""
+薪資項目規則
+將 SalaryItem 編譯為不可變的規則程式，依僱用類型預先分組，
+每位員工的明細計算只需在記憶體中走訪一次。
+規則程式於每次計算開始時編譯（單一查詢），整次計算共用，不跨計算快取，
+因此任何行程修改薪資項目後，下一次計算即使用新的規則。
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from .models import SalaryItem
+
+
+LEAVE_DEDUCTION_ITEM_NAME = '請假扣款'
+
+
+class SalaryRule(namedtuple('SalaryRule', ['item', 'amount', 'factor'])):
+    """
+    單一薪資項目的計算規則（不可變）
+
+    amount 為固定金額；factor 為百分比換算後的倍數，兩者擇一。
+    """
+
+    __slots__ = ()
+
+    def evaluate(self, base_amount):
+        """
+        計算項目金額
+
+        Args:
+            base_amount: 百分比計算的基數（基本薪資 + 加班費）
+        """
+        if self.amount is not None:
+            return self.amount
+        return base_amount * self.factor
+
+    @classmethod
+    def compile(cls, item):
+        """編譯薪資項目，沒有設定金額或百分比的項目回傳 None"""
+        if item.is_fixed and item.amount:
+            return cls(item, item.amount, None)
+        elif item.percentage:
+            return cls(item, None, item.percentage / Decimal('100'))
+        return None
+
+
+class SalaryRuleProgram:
+    """
+    編譯後的薪資項目規則
+
+    規則依僱用類型預先分組（兼職只含適用兼職的項目），建立後不可修改。
+    """
+
+    def __init__(self, items):
+        rules = []
+        leave_deduction_item = None
+        for item in items:
+            if item.name == LEAVE_DEDUCTION_ITEM_NAME and leave_deduction_item is None:
+                leave_deduction_item = item
+            rule = SalaryRule.compile(item)
+            if rule is not None:
+                rules.append(rule)
+
+        self.rules_by_type = {
+            'FT': tuple(rules),
+            'PT': tuple(rule for rule in rules if rule.item.apply_to_parttime),
+        }
+        self.leave_deduction_item = leave_deduction_item
+
+    @classmethod
+    def compile(cls):
+        """由資料庫載入所有薪資項目並編譯（單一查詢）"""
+        return cls(SalaryItem.objects.order_by('id'))
+
+    def rules_for(self, employee):
+        """取得適用於員工僱用類型的規則"""
+        return self.rules_by_type['PT' if employee.employment_type == 'PT' else 'FT']
+
+    def evaluate(self, employee, period, base_amount, overtime_amount):
+        """
+        計算員工適用的薪資項目
+
+        Returns:
+            list: (薪資項目, 金額, 說明) 的列表
+        """
+        percentage_base = base_amount + overtime_amount
+        period_label = str(period)
+        return [
+            (rule.item, rule.evaluate(percentage_base), f'{rule.item.name} - {period_label}')
+            for rule in self.rules_for(employee)
+        ]
+
@@ -5,20 +5,23 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView, TemplateView
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
+from django.utils import timezone
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncMonth
 from datetime import date, datetime, timedelta
-from decimal import Decimal
 import json
 import csv
 import io
 
-from .models import Employee, Salary, PayrollPeriod, SalaryItem, WorkSchedule
+from .models import Employee, Salary, PayrollPeriod, PayrollJob, SalaryItem, WorkSchedule
 from .services import SalaryCalculationService
+from .payroll_engine import BulkPayrollEngine, PayrollDataset
+from .payroll_jobs import enqueue_payroll_job, request_job_cancel
 
 
 class SalaryListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
@@ -32,7 +35,9 @@ class SalaryListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return self.request.user.is_staff
 
     def get_queryset(self):
-        queryset = Salary.objects.select_related('employee', 'period').order_by('-period__start_date')
+        queryset = Salary.objects.select_related(
+            'employee', 'employee__department', 'period'
+        ).order_by('-period__start_date')
         
         # 篩選條件
         employee_id = self.request.GET.get('employee')
@@ -58,7 +63,7 @@ class SalaryListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['employees'] = Employee.objects.filter(active=True).order_by('name')
+        context['employees'] = Employee.objects.filter(active=True).select_related('department').order_by('name')
         context['periods'] = PayrollPeriod.objects.order_by('-start_date')
         
         # 獲取可用的年份（從薪資期間中提取）
@@ -85,15 +90,14 @@ class SalaryListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
                 pass
         
         # 統計資訊
-        queryset = self.get_queryset()
-        if queryset.exists():
-            context['total_records'] = queryset.count()
-            context['total_amount'] = sum(salary.total_salary for salary in queryset)
-            context['average_amount'] = context['total_amount'] / context['total_records']
-        else:
-            context['total_records'] = 0
-            context['total_amount'] = 0
-            context['average_amount'] = 0
+        totals = self.get_queryset().aggregate(
+            total_records=Count('id'),
+            total_amount=Sum('net_amount'),
+            average_amount=Avg('net_amount')
+        )
+        context['total_records'] = totals['total_records']
+        context['total_amount'] = totals['total_amount'] or 0
+        context['average_amount'] = totals['average_amount'] or 0
         
         return context
 
@@ -123,7 +127,24 @@ class PayrollManagementView(LoginRequiredMixin, UserPassesTestMixin, TemplateVie
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['periods'] = PayrollPeriod.objects.order_by('-start_date')[:10]
+        periods = list(PayrollPeriod.objects.order_by('-start_date')[:10])
+        active_jobs = {
+            job.period_id: job
+            for job in PayrollJob.objects.filter(
+                period__in=periods, status__in=PayrollJob.ACTIVE_STATUSES
+            )
+        }
+        # 已處理期間顯示最近一次完成工作的階段耗時
+        finished_jobs = {
+            job.period_id: job
+            for job in PayrollJob.objects.filter(
+                period__in=periods, status='SUCCEEDED'
+            ).order_by('finished_at', 'id')
+        }
+        for period in periods:
+            period.active_job = active_jobs.get(period.id)
+            period.last_job = finished_jobs.get(period.id)
+        context['periods'] = periods
         context['salary_items'] = SalaryItem.objects.all()
         context['work_schedules'] = WorkSchedule.objects.all()
         return context
@@ -220,21 +241,109 @@ def process_payroll(request):
                 'message': '此薪資期間已經處理過了'
             })
         
+        # 建立背景工作後立即回應，由工作程序（run_payroll_worker）執行
+        job = enqueue_payroll_job(period, user=request.user)
+        
+        return JsonResponse({
+            'status': 'success',
+            'message': '薪資處理工作已排入佇列',
+            'job': _payroll_job_data(job)
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'處理失敗：{str(e)}'
+        })
+
+
+def _payroll_job_data(job):
+    """薪資處理工作的狀態資料"""
+    eta_seconds = job.eta_seconds
+    return {
+        'id': job.id,
+        'period_id': job.period_id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'total_employees': job.total_employees,
+        'processed_employees': job.processed_employees,
+        'last_employee_id': job.last_employee_id,
+        'progress': job.progress_percent,
+        'elapsed_seconds': round(job.elapsed_seconds, 1),
+        'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+        'cancel_requested': job.cancel_requested,
+        'error_message': job.error_message,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'stages': job.stage_list,
+    }
+
+
+@login_required
+def payroll_job_status(request, job_id):
+    """薪資處理工作進度 API"""
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '權限不足'}, status=403)
+    
+    job = get_object_or_404(PayrollJob, id=job_id)
+    return JsonResponse({
+        'status': 'success',
+        'job': _payroll_job_data(job)
+    })
+
+
+@require_POST
+@login_required
+def cancel_payroll_job(request, job_id):
+    """取消薪資處理工作 API"""
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '權限不足'}, status=403)
+    
+    job = get_object_or_404(PayrollJob, id=job_id)
+    if not request_job_cancel(job):
+        return JsonResponse({
+            'status': 'error',
+            'message': f'工作{job.get_status_display()}，無法取消'
+        })
+    
+    job.refresh_from_db()
+    return JsonResponse({
+        'status': 'success',
+        'message': '已取消' if job.status == 'CANCELLED' else '已要求取消，將於目前批次完成後停止',
+        'job': _payroll_job_data(job)
+    })
+
+
+@require_POST
+@login_required
+def recompute_stale_salaries(request):
+    """重新計算需更新的薪資 API"""
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '權限不足'}, status=403)
+    
+    try:
+        data = json.loads(request.body or '{}')
+        period_id = data.get('period_id')
+        period = get_object_or_404(PayrollPeriod, id=period_id) if period_id else None
+        
         service = SalaryCalculationService()
         
         with transaction.atomic():
-            processed_count = service.process_payroll_for_period(period)
+            recomputed_count = service.recompute_stale_salaries(period)
         
         return JsonResponse({
             'status': 'success',
-            'message': f'薪資處理完成，共處理 {processed_count} 名員工',
-            'processed_count': processed_count
+            'message': f'重新計算完成，共更新 {recomputed_count} 筆薪資',
+            'recomputed_count': recomputed_count
         })
         
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': '無效的 JSON 格式'})
     except Exception as e:
         return JsonResponse({
             'status': 'error',
-            'message': f'處理失敗：{str(e)}'
+            'message': f'重新計算失敗：{str(e)}'
         })
 
 
@@ -381,82 +490,84 @@ def salary_calculation_preview(request):
         employee = get_object_or_404(Employee, id=employee_id)
         period = get_object_or_404(PayrollPeriod, id=period_id)
         
-        service = SalaryCalculationService()
-        
-        # 計算預覽數據
-        base_amount = service._calculate_base_salary(employee, period)
-        working_hours, overtime_hours, overtime_amount = service._calculate_work_hours_and_overtime(employee, period)
-        leave_deduction = service._calculate_leave_deduction(employee, period)
+        # 與批次計算使用相同的引擎，不寫入任何資料
+        engine = BulkPayrollEngine()
+        dataset = PayrollDataset(period, Employee.objects.filter(id=employee.id), read_only=True)
+        preview = engine.preview_employee(dataset, employee)
+        del preview['employee_id']
         
-        # 獲取適用的薪資項目
-        salary_items = SalaryItem.objects.filter(
-            Q(apply_to_parttime=True) | Q(apply_to_parttime=False)
-        )
-        
-        if employee.employment_type == 'PT':
-            salary_items = salary_items.filter(apply_to_parttime=True)
+        return JsonResponse({
+            'status': 'success',
+            'preview': preview
+        })
         
-        items_preview = []
-        total_allowances = 0
-        total_deductions = 0
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': '無效的 JSON 格式'})
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': f'預覽失敗：{str(e)}'})
+
+
+@require_POST
+@login_required
+def batch_salary_preview(request):
+    """
+    批次薪資計算預覽 API
+    
+    以 NDJSON 串流回傳，第一行為摘要，之後每行為一位員工的預覽，最後一行為結束標記。
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '權限不足'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        period_id = data.get('period_id')
+        employee_id = data.get('employee_id')
+        department_id = data.get('department_id')
         
-        for item in salary_items:
-            if item.is_fixed and item.amount:
-                amount = item.amount
-            elif item.percentage:
-                amount = (base_amount + overtime_amount) * (item.percentage / Decimal('100'))
-            else:
-                continue
-                
-            items_preview.append({
-                'name': item.name,
-                'type': item.get_item_type_display(),
-                'amount': float(amount)
-            })
-            
-            if item.item_type in ['ALLOWANCE', 'BONUS']:
-                total_allowances += amount
-            else:
-                total_deductions += amount
-        
-        # 添加請假扣款
-        if leave_deduction['total_amount'] > 0:
-            items_preview.append({
-                'name': '請假扣款',
-                'type': '扣除',
-                'amount': float(leave_deduction['total_amount'])
+        if not period_id:
+            return JsonResponse({
+                'status': 'error', 
+                'message': '請指定薪資期間'
             })
-            total_deductions += leave_deduction['total_amount']
         
-        gross_salary = base_amount + overtime_amount + total_allowances
-        net_salary = gross_salary - total_deductions
+        period = get_object_or_404(PayrollPeriod, id=period_id)
         
-        return JsonResponse({
-            'status': 'success',
-            'preview': {
-                'employee_name': employee.name,
-                'period': f"{period.start_date} ~ {period.end_date}",
-                'base_amount': float(base_amount),
-                'working_hours': float(working_hours),
-                'overtime_hours': float(overtime_hours),
-                'overtime_amount': float(overtime_amount),
-                'leave_deduction': {
-                    'amount': float(leave_deduction['total_amount']),
-                    'days': leave_deduction['unpaid_days'],
-                    'details': leave_deduction['details']
-                },
-                'salary_items': items_preview,
-                'total_allowances': float(total_allowances),
-                'total_deductions': float(total_deductions),
-                'gross_salary': float(gross_salary),
-                'net_salary': float(net_salary)
-            }
-        })
+        employees = Employee.objects.filter(active=True)
+        if employee_id:
+            employees = employees.filter(id=employee_id)
+        if department_id:
+            employees = employees.filter(department_id=department_id)
+        
+        # 資料在回應前一次載入，串流期間只進行記憶體內計算
+        engine = BulkPayrollEngine()
+        dataset = PayrollDataset(period, employees, read_only=True)
         
     except json.JSONDecodeError:
         return JsonResponse({'status': 'error', 'message': '無效的 JSON 格式'})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': f'預覽失敗：{str(e)}'})
+    
+    def stream():
+        yield _ndjson_line({
+            'type': 'summary',
+            'period': f"{period.start_date} ~ {period.end_date}",
+            'total': len(dataset.employees)
+        })
+        count = 0
+        try:
+            for preview in engine.preview(dataset):
+                count += 1
+                yield _ndjson_line({'type': 'preview', **preview})
+        except Exception as e:
+            yield _ndjson_line({'type': 'error', 'message': f'預覽失敗：{str(e)}'})
+        yield _ndjson_line({'type': 'end', 'count': count})
+    
+    return StreamingHttpResponse(stream(), content_type='application/x-ndjson; charset=utf-8')
+
+
+def _ndjson_line(data):
+    """將資料轉為一行 NDJSON"""
+    return json.dumps(data, ensure_ascii=False) + '\n'
 
 
 @login_required
@@ -470,7 +581,6 @@ def salary_chart_data(request):
         
         if chart_type == 'monthly':
             # 月度趨勢數據
-            from django.db.models import Avg
             from django.utils import timezone
             
             # 獲取過去12個月的數據
@@ -480,17 +590,16 @@ def salary_chart_data(request):
             monthly_data = (
                 Salary.objects
                 .filter(period__start_date__gte=start_date)
-                .extra({'month': "strftime('%%Y-%%m', period.start_date)"})
+                .annotate(month=TruncMonth('period__start_date'))
                 .values('month')
-                .annotate(avg_salary=Avg('total_salary'))
+                .annotate(avg_salary=Avg('net_amount'))
                 .order_by('month')
             )
             
             labels = []
             data = []
             for item in monthly_data:
-                year, month = item['month'].split('-')
-                labels.append(f"{month}月")
+                labels.append(f"{item['month'].month:02d}月")
                 data.append(float(item['avg_salary'] or 0))
             
             return JsonResponse({
@@ -509,14 +618,12 @@ def salary_chart_data(request):
         
         elif chart_type == 'department':
             # 部門分析數據
-            from django.db.models import Avg, Count
-            
             dept_data = (
                 Salary.objects
                 .select_related('employee__department')
                 .values('employee__department__name')
                 .annotate(
-                    avg_salary=Avg('total_salary'),
+                    avg_salary=Avg('net_amount'),
                     employee_count=Count('employee', distinct=True)
                 )
                 .order_by('-avg_salary')
@@ -566,8 +673,8 @@ def salary_chart_data(request):
             
             for min_val, max_val, label in ranges:
                 count = Salary.objects.filter(
-                    total_salary__gte=min_val,
-                    total_salary__lt=max_val
+                    net_amount__gte=min_val,
+                    net_amount__lt=max_val
                 ).values('employee').distinct().count()
                 
                 labels.append(label)
@@ -606,7 +713,9 @@ def salary_export(request):
     
     try:
         # 獲取篩選參數（與 SalaryListView 相同的邏輯）
-        queryset = Salary.objects.select_related('employee', 'period').order_by('-period__start_date')
+        queryset = Salary.objects.select_related(
+            'employee', 'employee__department', 'period'
+        ).order_by('-period__start_date')
         
         employee_id = request.GET.get('employee')
         period_id = request.GET.get('period')
@@ -670,7 +779,11 @@ def _export_csv(queryset, include_details=True):
                 '加班費': float(salary.overtime_amount),
                 '總薪資': float(salary.total_salary),
                 '狀態': '已確認' if salary.is_confirmed else '待確認',
-                '最後更新時間': salary.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+                # 薪資記錄沒有更新時間欄位，以薪資期間的處理時間為準
+                '最後更新時間': (
+                    timezone.localtime(salary.period.processed_date).strftime('%Y-%m-%d %H:%M:%S')
+                    if salary.period.processed_date else ''
+                ),
             })
     else:
         # 簡要匯出
@@ -712,7 +825,9 @@ def get_employee_salary_data(request):
         employee = Employee.objects.get(id=employee_id, active=True)
         
         # 獲取該員工的薪資記錄
-        salaries = Salary.objects.filter(employee=employee).select_related('period').order_by('-period__start_date')
+        salaries = Salary.objects.filter(employee=employee).select_related(
+            'employee__department', 'period'
+        ).order_by('-period__start_date')
         
         # 應用其他篩選條件
         period_id = request.GET.get('period')
@@ -0,0 +1,173 @@
+"""
+員工班別解析
+一次載入薪資期間內的員工班別指派，依生效區間建立每位員工的索引，
+以二分搜尋查詢指定日期適用的班別
+"""
+import bisect
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .attendance import duration_microseconds, microseconds_to_hours
+from .models import EmployeeSchedule
+
+
+# 未指派班別或班別未設定休息時間時沿用的休息規則
+DEFAULT_BREAK_HOURS = 1
+DEFAULT_BREAK_THRESHOLD_HOURS = 5  # 未設定休息時間時，工作超過此時數才扣除休息
+
+
+def _time_span(start, end):
+    """兩個時間之間的長度（timedelta），結束時間早於開始時間時視為跨日"""
+    span = datetime.combine(date.min, end) - datetime.combine(date.min, start)
+    if span <= timedelta(0):
+        span += timedelta(days=1)
+    return span
+
+
+class ShiftRule:
+    """
+    單一班別的工時規則
+
+    標準工時 = 班別長度 - 休息時間；班別設定休息時間時，
+    扣除的是實際工作區間與休息時段重疊的部分。
+    """
+
+    def __init__(self, work_schedule):
+        self.work_schedule = work_schedule
+        self.break_duration = None
+
+        shift_duration = _time_span(work_schedule.start_time, work_schedule.end_time)
+        if work_schedule.break_start and work_schedule.break_end:
+            self.break_duration = _time_span(work_schedule.break_start, work_schedule.break_end)
+            break_duration = self.break_duration
+        else:
+            break_duration = timedelta(hours=DEFAULT_BREAK_HOURS)
+        self.standard_microseconds = max(0, duration_microseconds(shift_duration - break_duration))
+        self.standard_hours = microseconds_to_hours(self.standard_microseconds)
+
+    @property
+    def has_break_window(self):
+        return self.break_duration is not None
+
+    def break_window(self, work_date):
+        """
+        指定工作日的休息時段
+
+        休息開始時間早於上班時間時（如夜班 22:00 上班、02:00 休息）視為隔日。
+
+        Returns:
+            tuple: (開始, 結束) 的 aware datetime，班別未設定休息時間時為 None
+        """
+        if not self.has_break_window:
+            return None
+        schedule = self.work_schedule
+        break_date = work_date
+        if schedule.break_start < schedule.start_time:
+            break_date = work_date + timedelta(days=1)
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime.combine(break_date, schedule.break_start), tz)
+        return start, start + self.break_duration
+
+    def break_overlap_microseconds(self, work_date, punch_in_time, punch_out_time):
+        """工作區間與休息時段重疊的整數微秒數"""
+        window = self.break_window(work_date)
+        if window is None:
+            return 0
+        overlap = min(punch_out_time, window[1]) - max(punch_in_time, window[0])
+        return max(0, duration_microseconds(overlap))
+
+
+class EmployeeScheduleIndex:
+    """
+    單一員工的班別區間索引
+
+    建立時將可能重疊的指派切分為互不重疊的區段，每個區段只保留優先的指派
+    （主要班別優先，其次為較晚生效者），查詢時以二分搜尋找到區段。
+    """
+
+    def __init__(self, assignments=()):
+        assignments = list(assignments)
+        boundaries = set()
+        for assignment in assignments:
+            boundaries.add(assignment.start_date.toordinal())
+            if assignment.end_date is not None:
+                boundaries.add(assignment.end_date.toordinal() + 1)
+
+        rules = {}
+        self._starts = []
+        self._rules = []
+        for start in sorted(boundaries):
+            covering = [
+                assignment for assignment in assignments
+                if assignment.start_date.toordinal() <= start
+                and (assignment.end_date is None or assignment.end_date.toordinal() >= start)
+            ]
+            rule = None
+            if covering:
+                best = max(covering, key=lambda a: (a.is_primary, a.start_date, a.id))
+                if best.work_schedule_id not in rules:
+                    rules[best.work_schedule_id] = ShiftRule(best.work_schedule)
+                rule = rules[best.work_schedule_id]
+            self._starts.append(start)
+            self._rules.append(rule)
+
+    def shift_on(self, day):
+        """
+        指定日期適用的班別規則
+
+        Returns:
+            ShiftRule | None: 當日沒有班別指派時為 None
+        """
+        index = bisect.bisect_right(self._starts, day.toordinal()) - 1
+        if index < 0:
+            return None
+        return self._rules[index]
+
+
+EMPTY_SCHEDULE_INDEX = EmployeeScheduleIndex()
+
+
+class ScheduleResolver:
+    """以單一查詢載入薪資期間內的班別指派"""
+
+    @classmethod
+    def for_employee(cls, employee, period):
+        """載入單一員工的班別索引"""
+        indexes = cls.for_employees(period, employee_ids=[employee.id])
+        return indexes.get(employee.id, EMPTY_SCHEDULE_INDEX)
+
+    @classmethod
+    def for_employees(cls, period, employees=None, employee_ids=None, margin_days=1):
+        """
+        載入多位員工的班別索引
+
+        Args:
+            period: 薪資期間物件
+            employees: 員工 QuerySet（以子查詢篩選）
+            employee_ids: 員工 ID 列表，適用於少量員工
+            margin_days: 期間前後額外載入的天數（跨日班別使用）
+
+        Returns:
+            dict: {員工 ID: EmployeeScheduleIndex}
+        """
+        range_start = period.start_date - timedelta(days=margin_days)
+        range_end = period.end_date + timedelta(days=margin_days)
+        assignments = EmployeeSchedule.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=range_start),
+            start_date__lte=range_end,
+        ).select_related('work_schedule')
+        if employees is not None:
+            assignments = assignments.filter(employee__in=employees)
+        if employee_ids is not None:
+            assignments = assignments.filter(employee_id__in=employee_ids)
+
+        grouped = defaultdict(list)
+        for assignment in assignments:
+            grouped[assignment.employee_id].append(assignment)
+        return {
+            employee_id: EmployeeScheduleIndex(employee_assignments)
+            for employee_id, employee_assignments in grouped.items()
+        }
@@ -2,15 +2,28 @@
 薪資計算服務
 處理薪資相關的業務邏輯和計算
 """
-from decimal import Decimal, ROUND_HALF_UP
-from datetime import date, datetime, timedelta
-from django.db.models import Q, Sum
+import time
+from decimal import Decimal
+from datetime import date, datetime
+from django.db.models import Count, Sum
 from django.utils import timezone
 
 from .models import (
-    Employee, Salary, SalaryDetail, SalaryItem, 
-    PayrollPeriod, Punch, Leave, WorkSchedule, EmployeeSchedule
+    Employee, Salary, SalaryItem, 
+    PayrollPeriod, WorkSchedule, EmployeeSchedule
 )
+from .attendance import (
+    MICROSECONDS_PER_HOUR, PunchTimeline, duration_microseconds, hours_to_microseconds,
+    microseconds_to_hours,
+)
+from .leaves import load_unpaid_leaves, sweep_unpaid_days
+from .metrics import record_payroll_run
+from .payroll_stages import StageRecorder
+from .schedules import DEFAULT_BREAK_HOURS, DEFAULT_BREAK_THRESHOLD_HOURS, ScheduleResolver
+from .salary_details import sync_salary_details
+from .salary_rules import LEAVE_DEDUCTION_ITEM_NAME, SalaryRuleProgram
+from . import holidays
+
 
 
 class SalaryCalculationService:
@@ -20,6 +33,10 @@ class SalaryCalculationService:
         self.overtime_rate = Decimal('1.33')  # 加班費倍率
         self.holiday_rate = Decimal('2.0')    # 假日加班費倍率
         self.standard_hours = 8               # 標準工作時數
+        # 各計算階段結束時呼叫的監控函式 hook(階段名稱, 耗時秒數, 查詢次數, 寫入筆數)，
+        # 平行計算時會隨服務物件傳至子行程，須可序列化
+        self.stage_hooks = []
+        self.stage_recorder = StageRecorder(self.stage_hooks)
     
     def calculate_salary_for_period(self, employee, period):
         """
@@ -32,158 +49,216 @@ class SalaryCalculationService:
         Returns:
             Salary: 薪資記錄物件
         """
-        # 檢查是否已存在薪資記錄
-        salary, created = Salary.objects.get_or_create(
-            employee=employee,
-            period=period,
-            defaults={
-                'base_amount': Decimal('0'),
-                'overtime_hours': Decimal('0'),
-                'overtime_amount': Decimal('0'),
-                'working_hours': Decimal('0'),
-            }
-        )
-        
-        if not created and salary.is_confirmed:
-            return salary  # 已確認的薪資不重新計算
-        
-        # 計算基本薪資
-        base_amount = self._calculate_base_salary(employee, period)
-        
-        # 計算工作時數和加班費
-        working_hours, overtime_hours, overtime_amount = self._calculate_work_hours_and_overtime(
-            employee, period
-        )
-        
-        # 處理請假扣款（需要在薪資項目計算前處理）
-        leave_deduction = self._calculate_leave_deduction(employee, period)
-        
-        # 更新薪資記錄
-        salary.base_amount = base_amount
-        salary.working_hours = working_hours
-        salary.overtime_hours = overtime_hours
-        salary.overtime_amount = overtime_amount
-        salary.save()
+        holidays.refresh_holiday_cache()
+        return self._calculate_salary_for_period(employee, period, SalaryRuleProgram.compile())
+    
+    def _calculate_salary_for_period(self, employee, period, program):
+        """
+        計算員工在指定期間的薪資
         
-        # 計算薪資項目明細（包含請假扣款）
-        self._calculate_salary_details(salary, leave_deduction)
+        假日行事曆已於計算開始時更新；program 為本次計算編譯的薪資項目規則，整次計算共用。
+        """
+        stages = self.stage_recorder
+        # 此時間之後才標記的薪資，其變更可能未包含在本次計算中，寫入時保留標記
+        started_at = timezone.now()
+        with stages.recording():
+            # 檢查是否已存在薪資記錄
+            with stages.stage('load_data') as stage:
+                salary, created = Salary.objects.get_or_create(
+                    employee=employee,
+                    period=period,
+                    defaults={
+                        'base_amount': Decimal('0'),
+                        'overtime_hours': Decimal('0'),
+                        'overtime_amount': Decimal('0'),
+                        'working_hours': Decimal('0'),
+                    }
+                )
+                stage.rows = int(created)
+            
+            if not created and salary.is_confirmed:
+                return salary  # 已確認的薪資不重新計算
+            
+            with stages.stage('attendance'):
+                # 期間內打卡記錄只查詢一次，工作時數與加班費共用
+                timeline = PunchTimeline.for_employee(employee, period)
+                
+                # 計算工作時數和加班費
+                working_hours, overtime_hours, overtime_amount = self._calculate_work_hours_and_overtime(
+                    employee, period, timeline
+                )
+            
+            # 計算基本薪資
+            with stages.stage('base_salary'):
+                base_amount = self._calculate_base_salary(employee, period, working_hours)
+            
+            # 處理請假扣款（需要在薪資項目計算前處理）
+            with stages.stage('leave'):
+                leave_deduction = self._calculate_leave_deduction(employee, period)
+            
+            # 更新薪資記錄（於此捨入至儲存精度）
+            with stages.stage('write_salaries') as stage:
+                salary.set_figures(base_amount, working_hours, overtime_hours, overtime_amount)
+                salary.save(update_fields=Salary.FIGURE_FIELDS)
+                cleared = Salary.objects.filter(pk=salary.pk).exclude(
+                    stale_at__gte=started_at
+                ).update(is_stale=False)
+                salary.is_stale = not cleared
+                stage.rows = 1
+            
+            # 計算薪資項目明細（包含請假扣款）
+            self._calculate_salary_details(salary, program, leave_deduction)
         
         return salary
     
-    def _calculate_base_salary(self, employee, period):
-        """計算基本薪資"""
+    def _calculate_base_salary(self, employee, period, working_hours=None):
+        """
+        計算基本薪資
+        
+        Args:
+            employee: 員工物件
+            period: 薪資期間物件
+            working_hours: 已計算的工作時數（兼職使用），未提供時重新計算
+        """
         if employee.employment_type == 'FT':
             # 正職員工：月薪制
             return employee.base_salary or Decimal('0')
         else:
             # 兼職員工：時薪制，需要計算實際工作時數
-            working_hours = self._get_working_hours(employee, period)
+            if working_hours is None:
+                working_hours = self._get_working_hours(employee, period)
             hourly_rate = employee.hourly_rate or Decimal('0')
             return working_hours * hourly_rate
     
-    def _calculate_work_hours_and_overtime(self, employee, period):
-        """計算工作時數和加班費"""
-        # 獲取期間內的打卡記錄
-        punches = Punch.objects.filter(
-            employee=employee,
-            punch_time__date__range=[period.start_date, period.end_date]
-        ).order_by('punch_time')
-        
-        total_working_hours = Decimal('0')
-        total_overtime_hours = Decimal('0')
-        total_overtime_amount = Decimal('0')
-        
-        # 按日期分組處理打卡記錄
-        current_date = period.start_date
-        while current_date <= period.end_date:
-            daily_punches = punches.filter(punch_time__date=current_date)
+    def _calculate_work_hours_and_overtime(self, employee, period, timeline=None, schedule=None):
+        """
+        計算工作時數和加班費
+        
+        Args:
+            employee: 員工物件
+            period: 薪資期間物件
+            timeline: 已載入的打卡時間軸，未提供時以單一查詢載入
+            schedule: 已載入的班別索引（EmployeeScheduleIndex），未提供時以單一查詢載入
+        """
+        if timeline is None:
+            timeline = PunchTimeline.for_employee(employee, period)
+        if schedule is None:
+            schedule = ScheduleResolver.for_employee(employee, period)
+        
+        # 依工作日處理配對後的工作區間
+        return self._accumulate_work_hours(employee, timeline.days(), schedule)
+    
+    def _accumulate_work_hours(self, employee, work_days, schedule=None):
+        """
+        累計每日工時與加班費
+        
+        逐日計算只使用整數微秒（打卡時間的精度）：工作時間直接累計，加班時間依當日加班費倍率分組累計，
+        期間結束後才一次換算為 Decimal 時數與加班費，不會累積逐日的捨入誤差。
+        
+        Args:
+            employee: 員工物件
+            work_days: 依日期排序的 (工作日, 當日工作區間) 序列
+            schedule: 班別索引，None 表示未指派班別
             
-            if daily_punches.exists():
-                daily_hours, overtime_hours = self._calculate_daily_hours(
-                    employee, current_date, daily_punches
-                )
-                
-                total_working_hours += daily_hours
-                
-                if overtime_hours > 0:
-                    total_overtime_hours += overtime_hours
-                    # 計算加班費
-                    hourly_rate = self._get_hourly_rate(employee)
-                    overtime_rate = self._get_overtime_rate(employee, current_date, True)
-                    
-                    daily_overtime_amount = overtime_hours * hourly_rate * overtime_rate
-                    total_overtime_amount += daily_overtime_amount
+        Returns:
+            tuple: (工作時數, 加班時數, 加班費)，皆為未捨入的 Decimal，
+                   儲存時由 Salary.set_figures 捨入
+        """
+        working_microseconds = 0
+        overtime_microseconds = 0
+        overtime_by_rate = {}  # {加班費倍率: 加班微秒數}
+        standard_microseconds = hours_to_microseconds(self.standard_hours)
+        
+        for current_date, intervals in work_days:
+            shift = schedule.shift_on(current_date) if schedule is not None else None
+            daily_microseconds, daily_overtime_microseconds = self._calculate_daily_microseconds(
+                current_date, intervals, shift, standard_microseconds
+            )
+            
+            working_microseconds += daily_microseconds
             
-            current_date += timedelta(days=1)
+            if daily_overtime_microseconds > 0:
+                overtime_microseconds += daily_overtime_microseconds
+                overtime_rate = self._get_overtime_rate(employee, current_date, True)
+                overtime_by_rate[overtime_rate] = (
+                    overtime_by_rate.get(overtime_rate, 0) + daily_overtime_microseconds
+                )
+        
+        # 加班費 = 時薪 × Σ(倍率 × 加班微秒數) / 每小時微秒數，時薪每位員工只計算一次
+        overtime_amount = Decimal('0')
+        if overtime_by_rate:
+            weighted_microseconds = sum(
+                rate * microseconds for rate, microseconds in overtime_by_rate.items()
+            )
+            hourly_rate = self._get_hourly_rate(employee)
+            overtime_amount = hourly_rate * weighted_microseconds / MICROSECONDS_PER_HOUR
         
-        return total_working_hours, total_overtime_hours, total_overtime_amount
+        return (
+            microseconds_to_hours(working_microseconds),
+            microseconds_to_hours(overtime_microseconds),
+            overtime_amount,
+        )
     
-    def _calculate_daily_hours(self, employee, date, punches):
-        """計算單日工作時數和加班時數"""
-        if punches.count() < 2:
-            return Decimal('0'), Decimal('0')
-        
-        # 找到當日的上班和下班打卡
-        punch_in = punches.filter(punch_type='IN').first()
-        punch_out = punches.filter(punch_type='OUT').last()
-        
-        if not punch_in or not punch_out:
-            return Decimal('0'), Decimal('0')
-        
-        # 計算總工作時間（小時）
-        work_duration = punch_out.punch_time - punch_in.punch_time
-        total_hours = Decimal(str(work_duration.total_seconds() / 3600))
-        
-        # 扣除午休時間（1小時）
-        if total_hours > 5:  # 工作超過5小時才扣午休
-            total_hours -= Decimal('1')
-        
-        # 計算加班時數
-        standard_hours = Decimal(str(self.standard_hours))
-        if total_hours > standard_hours:
-            overtime_hours = total_hours - standard_hours
-            working_hours = standard_hours
-        else:
-            overtime_hours = Decimal('0')
-            working_hours = total_hours
+    def _calculate_daily_microseconds(self, date, intervals, shift=None, standard_microseconds=None):
+        """
+        計算單日工作微秒數和加班微秒數
         
-        return working_hours, overtime_hours
+        intervals 為當日的工作區間 [(開始, 結束), ...]（由 PunchTimeline 配對），
+        分段班的各區間分別計算休息扣除後加總。
+        shift 為當日適用的班別規則（ShiftRule）：標準工時取自班別，
+        班別設定休息時段時扣除與休息時段重疊的時間；未指派班別時沿用標準工時與午休規則。
+        
+        Returns:
+            tuple: (工作微秒數, 加班微秒數)，皆為整數
+        """
+        if not intervals:
+            return 0, 0
+        
+        has_break_window = shift is not None and shift.has_break_window
+        break_threshold_microseconds = DEFAULT_BREAK_THRESHOLD_HOURS * MICROSECONDS_PER_HOUR
+        total_microseconds = 0
+        
+        for start, end in intervals:
+            work_microseconds = duration_microseconds(end - start)
+            if has_break_window:
+                # 扣除與班別休息時段重疊的時間
+                work_microseconds -= shift.break_overlap_microseconds(date, start, end)
+            elif work_microseconds > break_threshold_microseconds:
+                # 未設定休息時段：連續工作超過5小時才扣午休1小時
+                work_microseconds -= DEFAULT_BREAK_HOURS * MICROSECONDS_PER_HOUR
+            total_microseconds += work_microseconds
+        
+        # 計算加班微秒數
+        if shift is not None:
+            standard_microseconds = shift.standard_microseconds
+        elif standard_microseconds is None:
+            standard_microseconds = hours_to_microseconds(self.standard_hours)
+        if total_microseconds > standard_microseconds:
+            return standard_microseconds, total_microseconds - standard_microseconds
+        return total_microseconds, 0
     
-    def _calculate_leave_deduction(self, employee, period):
+    def _calculate_leave_deduction(self, employee, period, approved_leaves=None):
         """
         計算請假扣款
         
         Args:
             employee: 員工物件
             period: 薪資期間物件
+            approved_leaves: 已載入的核准請假記錄（批次計算時使用），
+                             未提供時由資料庫查詢
             
         Returns:
             dict: 包含扣款詳情的字典
         """
-        # 獲取期間內已核准的請假記錄
-        approved_leaves = Leave.objects.filter(
-            employee=employee,
-            status='APPROVED',
-            start_date__lte=period.end_date,
-            end_date__gte=period.start_date
-        )
-        
-        unpaid_leave_types = ['PERSONAL', 'SICK']  # 需要扣薪的假別
-        total_unpaid_days = 0
-        leave_details = []
-        
-        for leave in approved_leaves:
-            # 計算與薪資期間重疊的天數
-            overlap_start = max(leave.start_date, period.start_date)
-            overlap_end = min(leave.end_date, period.end_date)
-            
-            if overlap_start <= overlap_end:
-                overlap_days = (overlap_end - overlap_start).days + 1
-                
-                # 檢查是否為無薪假
-                if leave.leave_type in unpaid_leave_types:
-                    total_unpaid_days += overlap_days
-                    leave_details.append(f"{leave.get_leave_type_display()}{overlap_days}天")
+        # 獲取期間內已核准的無薪假
+        if approved_leaves is None:
+            approved_leaves = load_unpaid_leaves(period, employee_ids=[employee.id]).get(employee.id, [])
+        
+        # 合併重疊的請假區間，同一天只扣一次
+        total_unpaid_days, counted_leaves = sweep_unpaid_days(approved_leaves, period)
+        leave_details = [
+            f"{leave.get_leave_type_display()}{days}天" for leave, days in counted_leaves
+        ]
         
         # 計算扣款金額
         total_deduction = Decimal('0')
@@ -208,78 +283,93 @@ class SalaryCalculationService:
         else:
             return Decimal('0')
     
-    def _calculate_salary_details(self, salary, leave_deduction=None):
-        """計算薪資明細項目"""
-        # 刪除現有明細
-        salary.salarydetail_set.all().delete()
+    def _calculate_salary_details(self, salary, program, leave_deduction=None):
+        """
+        計算薪資明細項目
+        
+        Args:
+            salary: 已寫入工時與金額的薪資記錄
+            program: 編譯後的薪資項目規則（SalaryRuleProgram）
+            leave_deduction: 請假扣款資訊
         
+        Returns:
+            dict: 新增、更新、刪除及未變動的明細筆數
+        """
         employee = salary.employee
+        stages = self.stage_recorder
+        
+        with stages.stage('salary_items'):
+            detail_rows = self._build_detail_rows(
+                employee,
+                salary.period,
+                salary.base_amount,
+                salary.overtime_amount,
+                program,
+                leave_deduction,
+                lambda: program.leave_deduction_item or self._get_leave_deduction_item(),
+            )
         
-        # 獲取適用的薪資項目
-        salary_items = SalaryItem.objects.filter(
-            Q(apply_to_parttime=True) | Q(apply_to_parttime=False)
-        )
+        with stages.stage('write_details') as stage:
+            # 與既有明細比對，只寫入有變動的資料列
+            changes = sync_salary_details({
+                salary.pk: [(item.pk, amount, description) for item, amount, description in detail_rows]
+            })
+            stage.rows = changes['created'] + changes['updated'] + changes['deleted']
+        
+        with stages.stage('write_salaries'):
+            # 更新應發、扣除及實發金額
+            salary.set_totals((item.item_type, amount) for item, amount, description in detail_rows)
+            salary.save(update_fields=Salary.TOTAL_FIELDS)
         
-        if employee.employment_type == 'PT':
-            # 兼職員工只適用標記為適用兼職的項目
-            salary_items = salary_items.filter(apply_to_parttime=True)
-        
-        for item in salary_items:
-            if item.is_fixed and item.amount:
-                # 固定金額
-                amount = item.amount
-            elif item.percentage:
-                # 百分比計算
-                base_amount = salary.base_amount + salary.overtime_amount
-                amount = base_amount * (item.percentage / Decimal('100'))
-            else:
-                continue  # 跳過沒有設定金額或百分比的項目
+        return changes
+    
+    def _build_detail_rows(self, employee, period, base_amount, overtime_amount,
+                           program, leave_deduction, get_leave_deduction_item):
+        """
+        計算薪資明細內容（不寫入資料庫）
+        
+        Args:
+            employee: 員工物件
+            period: 薪資期間物件
+            base_amount: 基本薪資
+            overtime_amount: 加班費
+            program: 編譯後的薪資項目規則（SalaryRuleProgram）
+            leave_deduction: 請假扣款資訊
+            get_leave_deduction_item: 取得「請假扣款」項目的函式，僅在需要時呼叫
             
-            # 創建薪資明細
-            SalaryDetail.objects.create(
-                salary=salary,
-                item=item,
-                amount=amount,
-                description=f'{item.name} - {salary.period}'
-            )
+        Returns:
+            list: (薪資項目, 金額, 說明) 的列表
+        """
+        # 規則已依僱用類型分組並預先計算百分比倍數
+        rows = program.evaluate(employee, period, base_amount, overtime_amount)
         
         # 添加請假扣款項目
         if leave_deduction and leave_deduction['total_amount'] > 0:
-            # 創建或獲取請假扣款項目
-            leave_deduction_item, created = SalaryItem.objects.get_or_create(
-                name='請假扣款',
-                defaults={
-                    'item_type': 'DEDUCTION',
-                    'is_fixed': False,
-                    'apply_to_parttime': True,
-                    'description': '無薪假/事假扣款'
-                }
-            )
-            
-            SalaryDetail.objects.create(
-                salary=salary,
-                item=leave_deduction_item,
-                amount=leave_deduction['total_amount'],
-                description=f"請假扣款 - {leave_deduction['unpaid_days']}天 ({leave_deduction['details']})"
-            )
+            rows.append((
+                get_leave_deduction_item(),
+                leave_deduction['total_amount'],
+                f"請假扣款 - {leave_deduction['unpaid_days']}天 ({leave_deduction['details']})"
+            ))
+        
+        return rows
     
-    def _get_working_hours(self, employee, period):
-        """獲取員工在期間內的工作時數"""
-        punches = Punch.objects.filter(
-            employee=employee,
-            punch_time__date__range=[period.start_date, period.end_date]
+    def _get_leave_deduction_item(self):
+        """創建或獲取請假扣款項目"""
+        leave_deduction_item, created = SalaryItem.objects.get_or_create(
+            name=LEAVE_DEDUCTION_ITEM_NAME,
+            defaults={
+                'item_type': 'DEDUCTION',
+                'is_fixed': False,
+                'apply_to_parttime': True,
+                'description': '無薪假/事假扣款'
+            }
         )
-        
-        total_hours = Decimal('0')
-        current_date = period.start_date
-        
-        while current_date <= period.end_date:
-            daily_punches = punches.filter(punch_time__date=current_date)
-            daily_hours, _ = self._calculate_daily_hours(employee, current_date, daily_punches)
-            total_hours += daily_hours
-            current_date += timedelta(days=1)
-        
-        return total_hours
+        return leave_deduction_item
+    
+    def _get_working_hours(self, employee, period, timeline=None):
+        """獲取員工在期間內的工作時數"""
+        working_hours, _, _ = self._calculate_work_hours_and_overtime(employee, period, timeline)
+        return working_hours
     
     def _get_hourly_rate(self, employee):
         """獲取員工時薪"""
@@ -293,26 +383,8 @@ class SalaryCalculationService:
             return Decimal('200')  # 預設時薪
     
     def _is_holiday(self, date):
-        """判斷是否為假日"""
-        # 週六、週日
-        if date.weekday() >= 5:
-            return True
-        
-        # 國定假日（簡化版，可以根據需要擴展）
-        holidays = [
-            (1, 1),   # 元旦
-            (2, 28),  # 和平紀念日
-            (4, 4),   # 兒童節
-            (4, 5),   # 清明節
-            (5, 1),   # 勞動節
-            (10, 10), # 國慶日
-        ]
-        
-        for month, day in holidays:
-            if date.month == month and date.day == day:
-                return True
-        
-        return False
+        """判斷是否為假日（週末、國定假日及 Holiday 資料表，已扣除補班日）"""
+        return holidays.is_holiday(date)
     
     def _get_overtime_rate(self, employee, work_date, is_overtime):
         """
@@ -343,25 +415,105 @@ class SalaryCalculationService:
         )
         return period
     
-    def process_payroll_for_period(self, period):
-        """處理指定期間的所有員工薪資"""
+    def process_payroll_for_period(self, period, bulk=True, workers=1, batch_size=None,
+                                   progress=None, start_after=None):
+        """
+        處理指定期間的所有員工薪資
+        
+        Args:
+            period: 薪資期間物件
+            bulk: 是否使用批次計算引擎（預設）；False 時逐一員工計算
+            workers: 批次計算時的平行行程數，大於 1 時不可在交易區塊中呼叫
+            batch_size: 批次計算時每批的員工數，None 表示整個期間一次計算
+            progress: 分批計算時每批提交後呼叫的函式 progress(已處理員工數, 員工總數, 最後員工 ID)
+            start_after: 分批計算的檢查點，只處理 ID 大於此值的員工（續跑中斷的處理）
+            
+        Returns:
+            int: 處理的員工數；批次計算的分片耗時記錄於 self.last_run_summary，
+                 各階段耗時記錄於 self.stage_recorder
+        """
         if period.is_processed:
             raise ValueError("此薪資期間已經處理過了")
         
-        active_employees = Employee.objects.filter(active=True)
-        processed_count = 0
+        # 每次處理重新記錄各階段耗時
+        self.stage_recorder = StageRecorder(self.stage_hooks)
+        mode = ('batched' if batch_size else 'bulk') if bulk else 'single'
+        started = time.perf_counter()
+        try:
+            with self.stage_recorder.recording():
+                if bulk:
+                    from .payroll_engine import BulkPayrollEngine
+                    engine = BulkPayrollEngine(self)
+                    if batch_size:
+                        processed_count = engine.run_batches(
+                            period, batch_size=batch_size, workers=workers,
+                            progress=progress, start_after=start_after
+                        )
+                    else:
+                        processed_count = engine.run(period, workers=workers)
+                    self.last_run_summary = engine.summary
+                else:
+                    active_employees = Employee.objects.filter(active=True)
+                    processed_count = 0
+                    
+                    # 假日資料表版本只在計算開始時比對一次，薪資項目規則整次計算共用
+                    holidays.refresh_holiday_cache()
+                    program = SalaryRuleProgram.compile()
+                    for employee in active_employees:
+                        salary = self._calculate_salary_for_period(employee, period, program)
+                        processed_count += 1
+                    self.last_run_summary = {'employees': processed_count}
+                self.last_run_summary['stages'] = self.stage_recorder.as_dict()
+        except Exception:
+            record_payroll_run(
+                mode, time.perf_counter() - started, 0, self.stage_recorder.as_dict(), succeeded=False
+            )
+            raise
         
-        for employee in active_employees:
-            salary = self.calculate_salary_for_period(employee, period)
-            processed_count += 1
+        # 本次實際計算的員工數（不含檢查點之前已完成者）
+        record_payroll_run(
+            mode, time.perf_counter() - started, self.last_run_summary['employees'],
+            self.last_run_summary['stages']
+        )
         
-        # 標記期間為已處理
+        # 標記期間為已處理（分批計算時於最後一批提交後才標記）
         period.is_processed = True
         period.processed_date = timezone.now()
         period.save()
         
         return processed_count
     
+    def recompute_stale_salaries(self, period=None):
+        """
+        重新計算被標記為需重新計算的薪資記錄
+        
+        只處理受影響的員工 × 期間，已確認的薪資不會被修改。
+        
+        Args:
+            period: 只處理指定的薪資期間，None 表示所有期間
+            
+        Returns:
+            int: 重新計算的薪資筆數
+        """
+        from .payroll_engine import BulkPayrollEngine
+        
+        stale_salaries = Salary.objects.filter(is_stale=True, is_confirmed=False)
+        if period is not None:
+            stale_salaries = stale_salaries.filter(period=period)
+        
+        period_ids = stale_salaries.values_list('period_id', flat=True).distinct()
+        recomputed_count = 0
+        
+        for stale_period in PayrollPeriod.objects.filter(id__in=list(period_ids)).order_by('start_date'):
+            employees = Employee.objects.filter(
+                salary__period=stale_period,
+                salary__is_stale=True,
+                salary__is_confirmed=False
+            )
+            recomputed_count += BulkPayrollEngine(self).run(stale_period, employees=employees)
+        
+        return recomputed_count
+    
     def get_salary_summary(self, employee, year=None, month=None):
         """獲取員工薪資摘要"""
         salaries = employee.salary_set.all()
@@ -371,11 +523,13 @@ class SalaryCalculationService:
         if month:
             salaries = salaries.filter(period__start_date__month=month)
         
+        totals = salaries.aggregate(count=Count('id'), total_amount=Sum('net_amount'))
+        
         summary = {
-            'total_salaries': salaries.count(),
-            'total_amount': sum(s.total_salary for s in salaries),
+            'total_salaries': totals['count'],
+            'total_amount': totals['total_amount'] or Decimal('0'),
             'average_amount': 0,
-            'latest_salary': salaries.order_by('-period__start_date').first()
+            'latest_salary': salaries.select_related('period').order_by('-period__start_date').first()
         }
         
         if summary['total_salaries'] > 0:
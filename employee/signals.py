@@ -0,0 +1,194 @@
+"""
+薪資變更追蹤
+打卡、請假、員工薪資、班別、薪資項目或假日變更時，將受影響且尚未確認的薪資記錄標記為需重新計算，
+並清除相關的行程內快取
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .attendance import MAX_SHIFT
+
+from .models import (
+    Employee, Salary, SalaryItem, Punch, Leave, Holiday, WorkSchedule, EmployeeSchedule
+)
+from .holidays import invalidate_holiday_cache
+
+
+# 會影響薪資計算結果的員工欄位
+EMPLOYEE_SALARY_FIELDS = ('employment_type', 'base_salary', 'hourly_rate')
+
+# 批次標記時每次更新的員工數
+STALE_BATCH_SIZE = 500
+
+
+def mark_salaries_stale(employee_ids=None, start_date=None, end_date=None):
+    """
+    將未確認的薪資記錄標記為需重新計算
+
+    已標記的記錄也會更新標記時間，進行中的計算據此得知其載入的資料已過期，寫入時保留標記。
+
+    Args:
+        employee_ids: 員工 ID 列表，None 表示所有員工
+        start_date, end_date: 只標記與此日期區間重疊的薪資期間，None 表示不限
+
+    Returns:
+        int: 標記的筆數
+    """
+    salaries = Salary.objects.filter(is_confirmed=False)
+    if employee_ids is not None:
+        salaries = salaries.filter(employee_id__in=employee_ids)
+    if end_date is not None:
+        salaries = salaries.filter(period__start_date__lte=end_date)
+    if start_date is not None:
+        salaries = salaries.filter(period__end_date__gte=start_date)
+    return salaries.update(is_stale=True, stale_at=timezone.now())
+
+
+def mark_punches_stale(punches):
+    """
+    依打卡記錄標記受影響的薪資（供 bulk_create 等不觸發 signal 的匯入路徑使用）
+
+    日期範圍相同的員工合併為一次更新；同一班次的批次打卡通常只需一次查詢。
+
+    Args:
+        punches: 打卡記錄列表
+
+    Returns:
+        int: 標記的筆數
+    """
+    tz = timezone.get_current_timezone()
+    punch_dates = {}
+    for punch in punches:
+        first_date, last_date = _punch_work_dates(punch.punch_time, tz)
+        first, last = punch_dates.get(punch.employee_id, (first_date, last_date))
+        punch_dates[punch.employee_id] = (min(first, first_date), max(last, last_date))
+
+    employees_by_range = {}
+    for employee_id, date_range in punch_dates.items():
+        employees_by_range.setdefault(date_range, []).append(employee_id)
+
+    marked = 0
+    for (first, last), employee_ids in employees_by_range.items():
+        for start in range(0, len(employee_ids), STALE_BATCH_SIZE):
+            marked += mark_salaries_stale(employee_ids[start:start + STALE_BATCH_SIZE], first, last)
+    return marked
+
+
+def _punch_work_dates(punch_time, tz=None):
+    """
+    打卡可能歸屬的工作日範圍
+
+    跨日班別的下班打卡歸屬前一天的工作日，因此範圍往前延伸最長班別時數。
+    """
+    return (
+        timezone.localtime(punch_time - MAX_SHIFT, tz).date(),
+        timezone.localtime(punch_time, tz).date(),
+    )
+
+
+@receiver(pre_save, sender=Punch)
+def punch_pre_save(sender, instance, **kwargs):
+    """打卡時間或員工變更時，原本所屬的期間也需重新計算"""
+    if instance.pk is None:
+        return
+    previous = Punch.objects.filter(pk=instance.pk).values('employee_id', 'punch_time').first()
+    if previous and (
+        previous['employee_id'] != instance.employee_id
+        or previous['punch_time'] != instance.punch_time
+    ):
+        mark_salaries_stale([previous['employee_id']], *_punch_work_dates(previous['punch_time']))
+
+
+@receiver(post_save, sender=Punch)
+@receiver(post_delete, sender=Punch)
+def punch_changed(sender, instance, **kwargs):
+    mark_salaries_stale([instance.employee_id], *_punch_work_dates(instance.punch_time))
+
+
+@receiver(pre_save, sender=Leave)
+def leave_pre_save(sender, instance, **kwargs):
+    """已核准的請假被修改（含改為拒絕）時，原本的日期區間需重新計算"""
+    if instance.pk is None:
+        return
+    previous = Leave.objects.filter(pk=instance.pk).values(
+        'employee_id', 'start_date', 'end_date', 'status'
+    ).first()
+    if previous and previous['status'] == 'APPROVED':
+        mark_salaries_stale([previous['employee_id']], previous['start_date'], previous['end_date'])
+
+
+@receiver(post_save, sender=Leave)
+@receiver(post_delete, sender=Leave)
+def leave_changed(sender, instance, **kwargs):
+    # 只有核准的請假會影響薪資
+    if instance.status == 'APPROVED':
+        mark_salaries_stale([instance.employee_id], instance.start_date, instance.end_date)
+
+
+@receiver(pre_save, sender=Employee)
+def employee_pre_save(sender, instance, **kwargs):
+    """僱用類型、月薪或時薪變更時，該員工所有未確認薪資需重新計算"""
+    if instance.pk is None:
+        return
+    previous = Employee.objects.filter(pk=instance.pk).values(*EMPLOYEE_SALARY_FIELDS).first()
+    if previous and any(
+        previous[field] != getattr(instance, field) for field in EMPLOYEE_SALARY_FIELDS
+    ):
+        mark_salaries_stale([instance.pk])
+
+
+@receiver(pre_save, sender=EmployeeSchedule)
+def employee_schedule_pre_save(sender, instance, **kwargs):
+    """班別指派的員工或生效區間變更時，原本的區間也需重新計算"""
+    if instance.pk is None:
+        return
+    previous = EmployeeSchedule.objects.filter(pk=instance.pk).values(
+        'employee_id', 'start_date', 'end_date'
+    ).first()
+    if previous:
+        mark_salaries_stale([previous['employee_id']], previous['start_date'], previous['end_date'])
+
+
+@receiver(post_save, sender=EmployeeSchedule)
+@receiver(post_delete, sender=EmployeeSchedule)
+def employee_schedule_changed(sender, instance, **kwargs):
+    mark_salaries_stale([instance.employee_id], instance.start_date, instance.end_date)
+
+
+@receiver(post_save, sender=WorkSchedule)
+def work_schedule_changed(sender, instance, created=False, **kwargs):
+    # 班別時間變更時，指派此班別的員工需重新計算（刪除班別會連帶刪除指派，由上方處理）
+    if created:
+        return
+    employee_ids = list(
+        EmployeeSchedule.objects.filter(work_schedule=instance).values_list('employee_id', flat=True)
+    )
+    if employee_ids:
+        mark_salaries_stale(employee_ids)
+
+
+@receiver(post_save, sender=SalaryItem)
+@receiver(post_delete, sender=SalaryItem)
+def salary_item_changed(sender, instance, created=False, **kwargs):
+    # 新建立但沒有金額或百分比的項目（如請假扣款）不影響任何薪資
+    if created and not (instance.amount or instance.percentage):
+        return
+    mark_salaries_stale()
+
+
+@receiver(pre_save, sender=Holiday)
+def holiday_pre_save(sender, instance, **kwargs):
+    """假日日期變更時，原本日期所屬的期間也需重新計算"""
+    if instance.pk is None:
+        return
+    previous_date = Holiday.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+    if previous_date and previous_date != instance.date:
+        mark_salaries_stale(start_date=previous_date, end_date=previous_date)
+
+
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+def holiday_changed(sender, instance, **kwargs):
+    invalidate_holiday_cache()
+    mark_salaries_stale(start_date=instance.date, end_date=instance.date)
@@ -0,0 +1,24 @@
+"""
+測試執行器
+測試期間的指標快照寫入暫存目錄，不影響正式的 METRICS_DIR
+"""
+import tempfile
+from contextlib import ExitStack
+
+from django.test.runner import DiscoverRunner
+
+from .metrics import isolated_metrics
+
+
+class TestRunner(DiscoverRunner):
+    """於暫存的指標目錄中執行測試"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._metrics_stack = ExitStack()
+        directory = self._metrics_stack.enter_context(tempfile.TemporaryDirectory(prefix='hr_test_metrics_'))
+        self._metrics_stack.enter_context(isolated_metrics(directory))
+
+    def teardown_test_environment(self, **kwargs):
+        self._metrics_stack.close()
+        super().teardown_test_environment(**kwargs)
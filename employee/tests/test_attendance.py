@@ -0,0 +1,150 @@
+from datetime import date, datetime, timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from ..attendance import PunchTimeline, pair_punches
+from ..models import Employee, PayrollPeriod, Punch
+
+
+def at(day, hour, minute=0):
+    """2025 年 1 月 day 日的當地時間"""
+    return timezone.make_aware(datetime(2025, 1, day, hour, minute))
+
+
+class PairPunchesTest(SimpleTestCase):
+    """打卡配對狀態機"""
+
+    # (名稱, 打卡記錄, 預期工作區間, 預期捨棄的 (打卡時間, 打卡類型, 原因))
+    CASES = [
+        (
+            '正常上下班',
+            [(at(6, 8), 'IN'), (at(6, 17), 'OUT')],
+            [(at(6, 8), at(6, 17))],
+            [],
+        ),
+        (
+            '跨日夜班',
+            [(at(6, 22), 'IN'), (at(7, 6), 'OUT')],
+            [(at(6, 22), at(7, 6))],
+            [],
+        ),
+        (
+            '分段班',
+            [(at(6, 8), 'IN'), (at(6, 12), 'OUT'), (at(6, 17), 'IN'), (at(6, 21), 'OUT')],
+            [(at(6, 8), at(6, 12)), (at(6, 17), at(6, 21))],
+            [],
+        ),
+        (
+            '重複上班打卡保留最早一筆',
+            [(at(6, 8), 'IN'), (at(6, 8, 3), 'IN'), (at(6, 17), 'OUT')],
+            [(at(6, 8), at(6, 17))],
+            [(at(6, 8, 3), 'IN', '重複上班打卡')],
+        ),
+        (
+            '缺少下班打卡',
+            [(at(6, 8), 'IN'), (at(7, 8), 'IN'), (at(7, 17), 'OUT')],
+            [(at(7, 8), at(7, 17))],
+            [(at(6, 8), 'IN', '缺少下班打卡')],
+        ),
+        (
+            '最後一筆上班沒有下班打卡',
+            [(at(6, 8), 'IN'), (at(6, 17), 'OUT'), (at(7, 8), 'IN')],
+            [(at(6, 8), at(6, 17))],
+            [(at(7, 8), 'IN', '缺少下班打卡')],
+        ),
+        (
+            '區間結束後的下班打卡不延長區間',
+            [(at(6, 8), 'IN'), (at(6, 12), 'OUT'), (at(6, 20), 'OUT')],
+            [(at(6, 8), at(6, 12))],
+            [(at(6, 20), 'OUT', '缺少上班打卡')],
+        ),
+        (
+            '重複下班打卡保留最早一筆',
+            [(at(6, 8), 'IN'), (at(6, 17), 'OUT'), (at(6, 17, 1), 'OUT')],
+            [(at(6, 8), at(6, 17))],
+            [(at(6, 17, 1), 'OUT', '缺少上班打卡')],
+        ),
+        (
+            '沒有上班打卡的下班打卡',
+            [(at(6, 7), 'OUT'), (at(6, 8), 'IN'), (at(6, 17), 'OUT')],
+            [(at(6, 8), at(6, 17))],
+            [(at(6, 7), 'OUT', '缺少上班打卡')],
+        ),
+        (
+            '超過最長時數的區間',
+            [(at(6, 8), 'IN'), (at(7, 9), 'OUT')],
+            [],
+            [(at(6, 8), 'IN', '缺少下班打卡'), (at(7, 9), 'OUT', '缺少上班打卡')],
+        ),
+    ]
+
+    def test_cases(self):
+        for name, punches, expected, expected_dropped in self.CASES:
+            with self.subTest(name):
+                dropped = []
+                intervals = pair_punches(punches, dropped=dropped)
+                self.assertEqual([tuple(interval) for interval in intervals], expected)
+                self.assertEqual(dropped, expected_dropped)
+
+    def test_overnight_shift_belongs_to_start_date(self):
+        timeline = PunchTimeline(
+            [(at(6, 22), 'IN'), (at(7, 6), 'OUT'), (at(31, 22), 'IN'), (at(31, 23), 'OUT')],
+            start_date=date(2025, 1, 6), end_date=date(2025, 1, 30),
+        )
+        self.assertEqual(timeline.days(), [(date(2025, 1, 6), [(at(6, 22), at(7, 6))])])
+
+
+class PunchTimelineTest(TestCase):
+    """以單一查詢載入多位員工的打卡並依工作日分組"""
+
+    def setUp(self):
+        self.period = PayrollPeriod.objects.create(
+            start_date=date(2025, 1, 6), end_date=date(2025, 1, 10), pay_date=date(2025, 1, 15)
+        )
+        self.first = Employee.objects.create(employee_id='B001', name='員工甲')
+        self.second = Employee.objects.create(employee_id='B002', name='員工乙')
+
+    def punch(self, employee, punch_time, punch_type):
+        return Punch(employee=employee, punch_time=punch_time, punch_type=punch_type)
+
+    def test_buckets_interleaved_punches_per_employee_and_day(self):
+        Punch.objects.bulk_create([
+            # 期間開始前的夜班：上班日不在期間內
+            self.punch(self.first, at(5, 22), 'IN'),
+            self.punch(self.first, at(6, 6), 'OUT'),
+            self.punch(self.second, at(6, 9), 'IN'),
+            self.punch(self.first, at(6, 9), 'IN'),
+            self.punch(self.second, at(6, 12), 'OUT'),
+            self.punch(self.first, at(6, 18), 'OUT'),
+            self.punch(self.second, at(6, 13), 'IN'),
+            self.punch(self.second, at(6, 17), 'OUT'),
+            # 期間最後一天開始的夜班，下班打卡落在期間之後
+            self.punch(self.first, at(10, 22), 'IN'),
+            self.punch(self.first, at(11, 6), 'OUT'),
+            # 期間之後的工作日
+            self.punch(self.second, at(11, 9), 'IN'),
+            self.punch(self.second, at(11, 17), 'OUT'),
+        ])
+
+        with self.assertNumQueries(1):
+            timelines = PunchTimeline.for_employees(
+                self.period, Employee.objects.filter(pk__in=[self.first.pk, self.second.pk])
+            )
+        self.assertEqual(timelines[self.first.id].days(), [
+            (date(2025, 1, 6), [(at(6, 9), at(6, 18))]),
+            (date(2025, 1, 10), [(at(10, 22), at(11, 6))]),
+        ])
+        self.assertEqual(timelines[self.second.id].days(), [
+            (date(2025, 1, 6), [(at(6, 9), at(6, 12)), (at(6, 13), at(6, 17))]),
+        ])
+
+    def test_single_employee_matches_bulk_load(self):
+        Punch.objects.bulk_create([
+            self.punch(self.first, at(7, 8) + timedelta(minutes=minute), punch_type)
+            for minute, punch_type in [(0, 'IN'), (240, 'OUT'), (300, 'IN'), (545, 'OUT')]
+        ])
+        bulk = PunchTimeline.for_employees(self.period, Employee.objects.all())[self.first.id]
+        single = PunchTimeline.for_employee(self.first, self.period)
+        self.assertEqual(single.days(), bulk.days())
+        self.assertEqual(PunchTimeline.for_employee(self.second, self.period).days(), [])
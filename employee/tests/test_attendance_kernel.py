@@ -0,0 +1,63 @@
+import unittest
+from datetime import date, time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import attendance_kernel
+from ..models import EmployeeSchedule, Holiday, Salary, WorkSchedule
+from ..services import SalaryCalculationService
+from .utils import create_company
+
+
+@unittest.skipUnless(attendance_kernel.is_available(), '未安裝 numpy')
+class AttendanceKernelTest(TestCase):
+    """向量化出勤計算與逐日計算的結果一致"""
+
+    def setUp(self):
+        self.period, self.employees = create_company()
+        Holiday.objects.create(date=date(2025, 1, 28), name='除夕', kind='LUNAR')
+        # 部分員工指派設定休息時段的班別，涵蓋重疊扣除與班別標準工時
+        schedule = WorkSchedule.objects.create(
+            name='早班', schedule_type='REGULAR', start_time=time(8, 0), end_time=time(16, 0),
+            break_start=time(12, 0), break_end=time(12, 30),
+        )
+        for employee in self.employees[:3]:
+            EmployeeSchedule.objects.create(
+                employee=employee, work_schedule=schedule, start_date=date(2025, 1, 10)
+            )
+        self.service = SalaryCalculationService()
+
+    def test_cross_check_matches_daily_calculation(self):
+        self.assertEqual(attendance_kernel.cross_check(self.service, self.period), [])
+
+        # 向量化結果即為處理後儲存的工時與加班費（容許最後一位的捨入差異）
+        totals = attendance_kernel.compute_period_totals(self.service, self.period)
+        self.service.process_payroll_for_period(self.period)
+        for salary in Salary.objects.filter(period=self.period):
+            stored = (salary.working_hours, salary.overtime_hours, salary.overtime_amount)
+            for value, expected, tolerance in zip(totals[salary.employee_id], stored, ('0.1', '0.1', '0.01')):
+                self.assertLessEqual(abs(value - expected), Decimal(tolerance))
+
+    def test_cross_check_reports_mismatches(self):
+        kernel = attendance_kernel.AttendanceKernel(overtime_rate=1.5)
+        with mock.patch.object(attendance_kernel.AttendanceKernel, 'from_service', return_value=kernel):
+            mismatches = attendance_kernel.cross_check(self.service, self.period)
+        self.assertTrue(mismatches)
+        employee_id, vectorized, scalar = mismatches[0]
+        self.assertEqual(vectorized[:2], scalar[:2])  # 只有加班費不同
+        self.assertGreater(vectorized[2], scalar[2])
+
+    def test_command(self):
+        output = StringIO()
+        call_command('check_attendance_kernel', self.period.id, stdout=output)
+        self.assertIn(f'向量化計算 {len(self.employees)} 名員工', output.getvalue())
+        self.assertIn('結果一致', output.getvalue())
+
+        kernel = attendance_kernel.AttendanceKernel(overtime_rate=1.5)
+        with mock.patch.object(attendance_kernel.AttendanceKernel, 'from_service', return_value=kernel):
+            with self.assertRaisesMessage(CommandError, '名員工結果不一致'):
+                call_command('check_attendance_kernel', self.period.id, stdout=StringIO())
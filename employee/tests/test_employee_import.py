@@ -0,0 +1,135 @@
+import csv
+import os
+import tempfile
+from datetime import date
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ..employee_import import EMPLOYEE_IMPORT_FIELDS, import_employees
+from ..models import Department, Employee
+
+
+def employee_row(code, name, email, phone='0912345678', department='研發部', hire_date='2024-01-02'):
+    return {
+        'employee_id': code, 'name': name, 'email': email, 'phone': phone,
+        'department_name': department, 'hire_date': hire_date,
+    }
+
+
+def numbered(rows):
+    return list(enumerate(rows, start=2))
+
+
+class ImportEmployeesTest(TestCase):
+    """員工匯入依識別欄位新增、更新或略過未變動的員工"""
+
+    def setUp(self):
+        import_employees(numbered([
+            employee_row('E001', '王小明', 'ming@example.com'),
+            employee_row('E002', '李小華', 'hua@example.com'),
+            employee_row('E003', '陳大文', 'wen@example.com', department='業務部'),
+        ]))
+
+    def test_counts_by_employee_id(self):
+        stats = import_employees(numbered([
+            employee_row('E001', '王小明', 'ming@example.com'),                       # 未變動
+            employee_row('E002', '李小華', 'hua.li@example.com'),                     # 更新
+            employee_row('E003', '陳大文', 'wen@example.com', department='研發部'),   # 更新部門
+            employee_row('E004', '林小美', 'mei@example.com', department='人資部'),   # 新增
+            employee_row('E004', '林小美', 'mei.lin@example.com', department='人資部'),  # 重複，以此列為準
+        ]), batch_size=2)
+
+        self.assertEqual(
+            {key: stats[key] for key in ('rows', 'created', 'updated', 'unchanged', 'duplicates', 'error_count')},
+            {'rows': 5, 'created': 1, 'updated': 2, 'unchanged': 1, 'duplicates': 1, 'error_count': 0},
+        )
+        self.assertEqual(Employee.objects.count(), 4)
+        self.assertEqual(Employee.objects.get(employee_id='E002').email, 'hua.li@example.com')
+        self.assertEqual(Employee.objects.get(employee_id='E003').department.name, '研發部')
+        self.assertEqual(Employee.objects.get(employee_id='E004').email, 'mei.lin@example.com')
+        self.assertEqual(Department.objects.filter(name='人資部').count(), 1)
+
+        again = import_employees(numbered([
+            employee_row('E001', '王小明', 'ming@example.com'),
+            employee_row('E004', '林小美', 'mei.lin@example.com', department='人資部'),
+        ]))
+        self.assertEqual((again['created'], again['updated'], again['unchanged']), (0, 0, 2))
+
+    def test_counts_by_email(self):
+        stats = import_employees(numbered([
+            employee_row('E101', '王小明', 'ming@example.com'),   # 以電子郵件比對，更新員工編號
+            employee_row('E002', '李小華', 'hua@example.com'),    # 未變動
+            employee_row('E003', '陳同名', 'other@example.com'),  # 員工編號已屬於其他員工
+            employee_row('', '張新人', 'new@example.com'),        # 以電子郵件比對時員工編號可留空
+        ]), key_field='email')
+
+        self.assertEqual(
+            (stats['created'], stats['updated'], stats['unchanged'], stats['error_count']), (1, 1, 1, 1)
+        )
+        self.assertIn('員工編號 E003 已屬於其他員工', stats['errors'][0])
+        self.assertEqual(Employee.objects.get(email='ming@example.com').employee_id, 'E101')
+        self.assertIsNone(Employee.objects.get(email='new@example.com').employee_id)
+        self.assertFalse(Employee.objects.filter(email='other@example.com').exists())
+
+    def test_ambiguous_email_is_reported(self):
+        Employee.objects.create(employee_id='E009', name='王小明二號', email='ming@example.com')
+        error_rows = []
+        stats = import_employees(
+            numbered([employee_row('E001', '王小明', 'ming@example.com')]),
+            key_field='email', error_rows=error_rows,
+        )
+        self.assertEqual((stats['updated'], stats['error_count']), (0, 1))
+        self.assertEqual(error_rows[0][0], 2)
+        self.assertIn('有多名員工的 email', error_rows[0][1])
+
+    def test_invalid_rows_are_skipped(self):
+        missing_name = employee_row('E005', None, 'five@example.com')
+        stats = import_employees(numbered([
+            missing_name,
+            employee_row('E006', '日期錯誤', 'six@example.com', hire_date='2024/13/40'),
+            employee_row('E007', '正常員工', 'seven@example.com', hire_date=date(2024, 3, 1)),
+        ]))
+        self.assertEqual((stats['created'], stats['error_count']), (1, 2))
+        self.assertEqual(stats['errors'][0], '第 2 行錯誤: 缺少欄位 name')
+        self.assertTrue(stats['errors'][1].startswith('第 3 行錯誤: 日期格式不正確'))
+        self.assertEqual(Employee.objects.get(employee_id='E007').hire_date, date(2024, 3, 1))
+
+
+class ImportEmployeesCommandTest(TestCase):
+    """import_employees 指令讀取 CSV 並輸出匯入結果"""
+
+    def write_csv(self, rows, fields=EMPLOYEE_IMPORT_FIELDS):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def test_import_by_key(self):
+        path = self.write_csv([
+            employee_row('E001', '王小明', 'ming@example.com'),
+            employee_row('E002', '李小華', 'hua@example.com'),
+        ])
+        output = StringIO()
+        call_command('import_employees', path, '--key', 'employee_id', stdout=output)
+        self.assertIn('新增 2 筆、更新 0 筆、未變動 0 筆，錯誤 0 筆', output.getvalue())
+
+        path = self.write_csv([
+            employee_row('E001', '王小明', 'ming@example.com', phone='0987654321'),
+            employee_row('E002', '李小華', 'hua@example.com'),
+            employee_row('E002', '李小華', 'hua@example.com'),
+        ])
+        output = StringIO()
+        call_command('import_employees', path, stdout=output)  # 預設以 email 比對
+        self.assertIn('🔁 1 列的識別值重複', output.getvalue())
+        self.assertIn('新增 0 筆、更新 1 筆、未變動 1 筆', output.getvalue())
+        self.assertEqual(Employee.objects.get(employee_id='E001').phone, '0987654321')
+
+    def test_missing_columns(self):
+        path = self.write_csv([{'name': '王小明', 'email': 'ming@example.com'}], fields=['name', 'email'])
+        with self.assertRaisesMessage(CommandError, '檔案缺少必要的欄位'):
+            call_command('import_employees', path, stdout=StringIO())
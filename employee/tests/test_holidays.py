@@ -0,0 +1,73 @@
+from datetime import date
+from unittest import mock
+
+from django.test import TestCase
+
+from .. import holidays
+from ..models import Holiday
+from ..services import SalaryCalculationService
+
+
+class HolidayCalendarTest(TestCase):
+    """假日行事曆"""
+
+    def setUp(self):
+        holidays.invalidate_holiday_cache()
+        self.addCleanup(holidays.invalidate_holiday_cache)
+
+    def test_weekends_fixed_and_table_holidays(self):
+        Holiday.objects.create(date=date(2025, 1, 28), name='除夕', kind='LUNAR')
+        holidays.refresh_holiday_cache()
+        self.assertTrue(holidays.is_holiday(date(2025, 1, 4)))    # 週六
+        self.assertTrue(holidays.is_holiday(date(2025, 1, 1)))    # 元旦
+        self.assertTrue(holidays.is_holiday(date(2025, 1, 28)))   # 資料表中的假日
+        self.assertFalse(holidays.is_holiday(date(2025, 1, 27)))
+
+    def test_makeup_workday_overrides_weekend(self):
+        Holiday.objects.create(date=date(2025, 2, 8), name='補班', kind='OTHER', is_makeup_workday=True)
+        holidays.refresh_holiday_cache()
+        self.assertFalse(holidays.is_holiday(date(2025, 2, 8)))
+        self.assertTrue(holidays.is_holiday(date(2025, 2, 9)))
+
+        service = SalaryCalculationService()
+        self.assertEqual(service._get_overtime_rate(None, date(2025, 2, 8), True), service.overtime_rate)
+        self.assertEqual(service._get_overtime_rate(None, date(2025, 2, 9), True), service.holiday_rate)
+
+    def test_signal_invalidates_this_process(self):
+        holidays.refresh_holiday_cache()
+        self.assertFalse(holidays.is_holiday(date(2025, 3, 3)))
+        Holiday.objects.create(date=date(2025, 3, 3), name='公司假日', kind='COMPANY')
+        self.assertTrue(holidays.is_holiday(date(2025, 3, 3)))
+
+    def test_refresh_picks_up_changes_from_other_processes(self):
+        holidays.refresh_holiday_cache()
+        self.assertFalse(holidays.is_holiday(date(2025, 3, 3)))
+
+        # 其他行程修改假日時，本行程不會收到 signal
+        with mock.patch('employee.signals.invalidate_holiday_cache'):
+            holiday = Holiday.objects.create(date=date(2025, 3, 3), name='公司假日', kind='COMPANY')
+        self.assertFalse(holidays.is_holiday(date(2025, 3, 3)))
+        holidays.refresh_holiday_cache()
+        self.assertTrue(holidays.is_holiday(date(2025, 3, 3)))
+
+        with mock.patch('employee.signals.invalidate_holiday_cache'):
+            holiday.is_makeup_workday = True
+            holiday.save()
+        holidays.refresh_holiday_cache()
+        self.assertFalse(holidays.is_holiday(date(2025, 3, 3)))
+
+        with mock.patch('employee.signals.invalidate_holiday_cache'):
+            Holiday.objects.create(date=date(2025, 3, 4), name='公司假日', kind='COMPANY')
+            holiday.delete()
+        holidays.refresh_holiday_cache()
+        self.assertFalse(holidays.is_holiday(date(2025, 3, 3)))
+        self.assertTrue(holidays.is_holiday(date(2025, 3, 4)))
+
+    def test_calendar_compiled_once_per_version(self):
+        holidays.refresh_holiday_cache()
+        with self.assertNumQueries(1):
+            for day in range(1, 32):
+                holidays.is_holiday(date(2025, 1, day))
+        with self.assertNumQueries(1):
+            holidays.refresh_holiday_cache()
+            holidays.is_holiday(date(2025, 1, 2))
@@ -0,0 +1,119 @@
+import csv
+import io
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import import_sessions
+from ..import_sessions import (
+    ImportSessionError, claim_session, create_import_session, resume_import_session, run_import_session
+)
+from ..models import Employee, ImportRowError, ImportSession, Punch
+from .utils import punch_workbook
+
+
+class ImportSessionResumeTest(TestCase):
+    """中途失敗的匯入工作續跑後，已提交的批次不會重複寫入"""
+
+    def setUp(self):
+        # 檔案欄位的儲存位置於載入模型時決定，改以暫存目錄取代
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        patcher = mock.patch.object(
+            ImportSession._meta.get_field('file'), 'storage', FileSystemStorage(location=directory)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_with_failure(self, session, target, fail_on_call):
+        """執行匯入工作，第 fail_on_call 批寫入時拋出例外"""
+        original = getattr(import_sessions, target)
+        calls = []
+
+        def flaky(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == fail_on_call:
+                raise RuntimeError('模擬中斷')
+            return original(*args, **kwargs)
+
+        self.assertTrue(claim_session(session, 'test-worker'))
+        with mock.patch.object(import_sessions, target, flaky), \
+                self.assertLogs('employee.import_sessions', 'ERROR'):
+            return run_import_session(session)
+
+    def resume(self, session):
+        self.assertTrue(resume_import_session(session))
+        session.refresh_from_db()
+        self.assertTrue(claim_session(session, 'test-worker'))
+        return run_import_session(session)
+
+    def test_resumed_punch_import_writes_no_duplicates(self):
+        employee = Employee.objects.create(employee_id='R001', name='續跑員工')
+        rows = [['R001', 'IN', datetime(2025, 3, day, 9, 0)] for day in range(1, 11)]
+        rows.insert(4, ['NOPE', 'IN', datetime(2025, 3, 1, 9, 0)])
+        session = create_import_session(
+            SimpleUploadedFile('punches.xlsx', punch_workbook(rows)), 'PUNCHES', chunk_size=3
+        )
+
+        session = self.run_with_failure(session, 'import_punch_rows', fail_on_call=3)
+        self.assertEqual(session.status, 'FAILED')
+        self.assertEqual(session.last_row_number, 7)
+        self.assertEqual(Punch.objects.filter(employee=employee).count(), 5)
+
+        session = self.resume(session)
+        self.assertEqual(session.status, 'SUCCEEDED')
+        self.assertEqual(Punch.objects.filter(employee=employee).count(), 10)
+        self.assertEqual(
+            (session.processed_rows, session.created_count, session.unchanged_count, session.error_count),
+            (11, 10, 0, 1),
+        )
+        self.assertEqual(ImportRowError.objects.filter(session=session).count(), 1)
+
+    def test_resumed_employee_import_writes_no_duplicates(self):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['employee_id', 'name', 'email', 'phone', 'department_name', 'hire_date'])
+        for index in range(12):
+            writer.writerow([f'C{index:03d}', f'匯入員工{index}', f'c{index}@example.com', '', '業務部', '2024-05-01'])
+        session = create_import_session(
+            SimpleUploadedFile('employees.csv', output.getvalue().encode('utf-8')), 'EMPLOYEES', chunk_size=5
+        )
+
+        session = self.run_with_failure(session, 'import_employees', fail_on_call=2)
+        self.assertEqual(session.status, 'FAILED')
+        self.assertEqual(Employee.objects.count(), 5)
+
+        session = self.resume(session)
+        self.assertEqual(session.status, 'SUCCEEDED')
+        self.assertEqual(Employee.objects.count(), 12)
+        self.assertEqual(Employee.objects.values('employee_id').distinct().count(), 12)
+        self.assertEqual((session.processed_rows, session.created_count), (12, 12))
+
+
+    def test_rejects_invalid_files_without_keeping_them(self):
+        with self.assertRaises(ImportSessionError):
+            create_import_session(SimpleUploadedFile('employees.txt', b'x'), 'EMPLOYEES')
+        with self.assertRaises(ImportSessionError):
+            create_import_session(SimpleUploadedFile('employees.csv', b'name,email\nx,y'), 'EMPLOYEES')
+        self.assertFalse(ImportSession.objects.exists())
+
+    def test_error_report_lists_skipped_rows(self):
+        Employee.objects.create(employee_id='R001', name='續跑員工')
+        rows = [['R001', 'IN', datetime(2025, 3, 1, 9, 0)], ['NOPE', 'IN', datetime(2025, 3, 1, 9, 0)]]
+        session = create_import_session(SimpleUploadedFile('punches.xlsx', punch_workbook(rows)), 'PUNCHES')
+        self.assertTrue(claim_session(session, 'test-worker'))
+        run_import_session(session)
+
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        response = self.client.get(reverse('import_session_errors', args=[session.id]))
+        lines = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(lines[0], ['employee_id', 'punch_type', 'punch_time', '原始列號', '錯誤訊息'])
+        self.assertEqual(lines[1][:2] + lines[1][3:4], ['NOPE', 'IN', '3'])
@@ -0,0 +1,156 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+from ..services import SalaryCalculationService
+from .utils import create_company
+
+
+class MetricsEndpointAuthTest(TestCase):
+    """指標端點需要管理員或設定的 METRICS_TOKEN，未設定時不公開"""
+
+    def setUp(self):
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        User.objects.create_user('clerk', password='secret')
+        self.url = reverse('metrics_api')
+
+    @override_settings(METRICS_TOKEN='')
+    def test_without_token_only_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer ').status_code, 401)
+        self.client.login(username='clerk', password='secret')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.login(username='staff', password='secret')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        # 帶錯誤 token 的管理員仍拒絕，避免抓取端設定錯誤時改以登入身分通過
+        self.client.login(username='staff', password='secret')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+
+
+@override_settings(METRICS_DIR='')
+class MetricsMiddlewareTest(TestCase):
+    """請求指標的標籤數量有限"""
+
+    def setUp(self):
+        metrics.reset_metrics()
+        self.addCleanup(metrics.reset_metrics)
+
+    def requests_total(self):
+        return {
+            labels: value for (name, labels), value in metrics.collect().items()
+            if name == 'hr_http_requests_total'
+        }
+
+    def test_unknown_methods_and_urls_share_labels(self):
+        self.client.get(reverse('health_check'))
+        for method in ('PROPFIND', 'X-RANDOM-1', 'X-RANDOM-2'):
+            self.client.generic(method, reverse('health_check'))
+        self.client.get('/no-such-page/')
+
+        totals = self.requests_total()
+        self.assertEqual(totals[('health_check', 'GET', '200')], 1)
+        self.assertEqual(sum(value for (view, method, status), value in totals.items() if method == 'other'), 3)
+        self.assertEqual({method for view, method, status in totals}, {'GET', 'other'})
+        self.assertIn(('unresolved', 'GET', '404'), totals)
+
+
+class MetricsSnapshotTest(TestCase):
+    """各行程快照的彙總、輸出及已結束行程快照的合併"""
+
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(metrics.isolated_metrics(self.directory))
+
+    def write_snapshot(self, filename, data):
+        with open(os.path.join(self.directory, filename), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def runs_total(self):
+        return metrics.collect()[('hr_payroll_runs_total', ('bulk', 'success'))]
+
+    def test_render_merges_process_snapshots(self):
+        period, employees = create_company(3)
+        SalaryCalculationService().process_payroll_for_period(period)
+        metrics.inc('hr_cache_requests_total', 'a"b\\c', 'hit')
+        # 其他主機仍在執行的行程
+        self.write_snapshot('metrics_otherhost_1.json', [
+            ['hr_payroll_runs_total', ['bulk', 'success'], 2],
+            ['hr_payroll_run_duration_seconds', ['bulk'], [0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 3.5, 1]],
+            ['hr_unknown_metric', [], 1],
+        ])
+
+        text = metrics.render_metrics()
+        self.assertIn('# TYPE hr_payroll_runs_total counter', text)
+        self.assertIn('hr_payroll_runs_total{mode="bulk",result="success"} 3', text)
+        self.assertIn(f'hr_payroll_employees_processed_total{{mode="bulk"}} {len(employees)}', text)
+        self.assertIn('hr_payroll_run_duration_seconds_bucket{mode="bulk",le="1.0"} 1', text)
+        self.assertIn('hr_payroll_run_duration_seconds_bucket{mode="bulk",le="5.0"} 2', text)
+        self.assertIn('hr_payroll_run_duration_seconds_bucket{mode="bulk",le="+Inf"} 2', text)
+        self.assertIn('hr_payroll_run_duration_seconds_count{mode="bulk"} 2', text)
+        self.assertIn('hr_cache_requests_total{cache="a\\"b\\\\c",result="hit"} 1', text)
+        self.assertNotIn('hr_unknown_metric', text)
+        self.assertIn('metrics_otherhost_1.json', os.listdir(self.directory))
+
+    def test_compacts_snapshots_of_exited_processes(self):
+        # 未記錄任何指標的行程不產生快照
+        metrics.flush()
+        self.assertEqual(os.listdir(self.directory), [])
+
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        dead = f'metrics_{socket.gethostname()}_{exited.pid}.json'
+        self.write_snapshot(dead, [['hr_payroll_runs_total', ['bulk', 'success'], 2]])
+        self.write_snapshot('metrics_otherhost_1.json', [['hr_payroll_runs_total', ['bulk', 'success'], 2]])
+        # 行程 ID 被重複使用時，同名的舊快照屬於已結束的行程
+        self.write_snapshot(
+            os.path.basename(metrics._snapshot_path(self.directory)),
+            [['hr_payroll_runs_total', ['bulk', 'success'], 5]],
+        )
+
+        metrics.inc('hr_payroll_runs_total', 'bulk', 'success')
+        self.assertEqual(self.runs_total(), 2 + 2 + 5 + 1)
+        files = os.listdir(self.directory)
+        self.assertNotIn(dead, files)
+        self.assertIn('metrics_otherhost_1.json', files)
+        self.assertIn(metrics.AGGREGATE_FILENAME, files)
+
+        # 計數器不會因合併而倒退或重複計算
+        metrics.inc('hr_payroll_runs_total', 'bulk', 'success')
+        self.assertEqual(self.runs_total(), 11)
+
+        # 已併入彙總檔但尚未刪除的快照不重複計算
+        aggregate_path = os.path.join(self.directory, metrics.AGGREGATE_FILENAME)
+        with open(aggregate_path, encoding='utf-8') as f:
+            aggregate = json.load(f)
+        self.write_snapshot('metrics_folded_123.json', [['hr_payroll_runs_total', ['bulk', 'success'], 100]])
+        aggregate['folded'].append('metrics_folded_123.json')
+        with open(aggregate_path, 'w', encoding='utf-8') as f:
+            json.dump(aggregate, f)
+        self.assertEqual(self.runs_total(), 11)
+        self.assertNotIn('metrics_folded_123.json', os.listdir(self.directory))
+
+    def test_isolated_metrics_restores_process_metrics(self):
+        metrics.inc('hr_payroll_runs_total', 'bulk', 'success')
+        with tempfile.TemporaryDirectory() as directory:
+            with metrics.isolated_metrics(directory):
+                metrics.inc('hr_payroll_runs_total', 'bulk', 'success', amount=5)
+                self.assertEqual(self.runs_total(), 5)
+        self.assertEqual(self.runs_total(), 1)
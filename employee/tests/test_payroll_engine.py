@@ -0,0 +1,131 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from ..models import Salary
+from ..payroll_engine import BulkPayrollEngine
+from ..salary_rules import LEAVE_DEDUCTION_ITEM_NAME
+from ..services import SalaryCalculationService
+from .utils import create_company, salary_snapshot
+
+
+class BulkPayrollEngineTest(TestCase):
+    """批次計算的結果須與逐一員工計算相同"""
+
+    def setUp(self):
+        self.period, self.employees = create_company()
+        self.service = SalaryCalculationService()
+
+    def reprocess(self, **options):
+        Salary.objects.filter(period=self.period).delete()
+        self.period.is_processed = False
+        self.period.save()
+        self.service.process_payroll_for_period(self.period, **options)
+        return salary_snapshot(self.period)
+
+    def test_bulk_matches_single_employee_processing(self):
+        expected = self.reprocess(bulk=False)
+        self.assertEqual(len(expected), len(self.employees))
+        self.assertTrue(any(salary[2] for salary in expected.values()))  # 有加班時數
+        self.assertTrue(any(
+            name == LEAVE_DEDUCTION_ITEM_NAME
+            for salary in expected.values() for name, amount, description in salary[-1]
+        ))
+
+        self.assertEqual(self.reprocess(), expected)
+
+    def test_confirmed_salaries_are_not_recalculated(self):
+        self.service.process_payroll_for_period(self.period)
+        confirmed = Salary.objects.filter(period=self.period).first()
+        Salary.objects.filter(pk=confirmed.pk).update(is_confirmed=True, base_amount=1)
+        self.period.is_processed = False
+        self.period.save()
+
+        self.service.process_payroll_for_period(self.period)
+        confirmed.refresh_from_db()
+        self.assertEqual(confirmed.base_amount, 1)
+
+    def test_salary_confirmed_during_calculation_is_not_overwritten(self):
+        self.service.process_payroll_for_period(self.period)
+        confirmed = Salary.objects.filter(period=self.period).first()
+        details = list(confirmed.salarydetail_set.values_list('item_id', 'amount'))
+        self.period.is_processed = False
+        self.period.save()
+
+        compute = BulkPayrollEngine.compute
+
+        def confirm_after_compute(engine, dataset):
+            results = compute(engine, dataset)
+            # 計算完成後、寫入之前由其他請求確認並調整
+            Salary.objects.filter(pk=confirmed.pk).update(is_confirmed=True, base_amount=1)
+            return results
+
+        with mock.patch.object(BulkPayrollEngine, 'compute', confirm_after_compute):
+            self.service.process_payroll_for_period(self.period)
+        confirmed.refresh_from_db()
+        self.assertEqual(confirmed.base_amount, 1)
+        self.assertEqual(list(confirmed.salarydetail_set.values_list('item_id', 'amount')), details)
+
+
+class BatchedPayrollTest(TestCase):
+    """分批計算每批提交並記錄檢查點，中斷後從檢查點續跑"""
+
+    def setUp(self):
+        self.period, self.employees = create_company()
+        self.service = SalaryCalculationService()
+
+    reprocess = BulkPayrollEngineTest.reprocess
+
+    def test_batches_match_single_run(self):
+        expected = self.reprocess()
+        self.assertEqual(self.reprocess(batch_size=4), expected)
+        self.assertEqual(self.service.last_run_summary['batches'], 3)
+
+    def test_resume_from_checkpoint(self):
+        expected = self.reprocess()
+        Salary.objects.filter(period=self.period).delete()
+        self.period.is_processed = False
+        self.period.save()
+
+        class Interrupted(Exception):
+            pass
+
+        checkpoints = []
+
+        def progress(processed, total, last_employee_id):
+            checkpoints.append((processed, total, last_employee_id))
+            raise Interrupted()
+
+        with self.assertRaises(Interrupted):
+            self.service.process_payroll_for_period(self.period, batch_size=4, progress=progress)
+        processed, total, last_employee_id = checkpoints[0]
+        self.assertEqual((processed, total), (4, len(self.employees)))
+        self.assertEqual(Salary.objects.filter(period=self.period).count(), 4)
+        self.period.refresh_from_db()
+        self.assertFalse(self.period.is_processed)
+
+        self.service.process_payroll_for_period(
+            self.period, batch_size=4, start_after=last_employee_id
+        )
+        self.assertEqual(self.service.last_run_summary['resumed_employees'], 4)
+        self.assertEqual(self.service.last_run_summary['employees'], len(self.employees) - 4)
+        self.assertEqual(salary_snapshot(self.period), expected)
+
+
+class ParallelPayrollTest(TransactionTestCase):
+    """平行計算的結果須與單一行程計算相同（子行程需讀取已提交的資料）"""
+
+    def setUp(self):
+        # 子行程以各自的連線讀取資料，記憶體中的 SQLite 測試資料庫無法共用
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('平行計算需要存放於磁碟的測試資料庫')
+        self.period, self.employees = create_company()
+        self.service = SalaryCalculationService()
+
+    reprocess = BulkPayrollEngineTest.reprocess
+
+    def test_parallel_matches_single_process(self):
+        expected = self.reprocess(workers=1)
+        self.assertEqual(self.reprocess(workers=2), expected)
+        self.assertEqual(self.service.last_run_summary['workers'], 2)
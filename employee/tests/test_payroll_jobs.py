@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import PayrollJob, Salary
+from ..payroll_jobs import (
+    claim_job, claim_next_job, enqueue_payroll_job, request_job_cancel, requeue_stale_jobs, run_payroll_job
+)
+from .utils import create_company
+
+
+class PayrollJobTest(TestCase):
+    """薪資處理工作的排入、認領、續跑及取消"""
+
+    def setUp(self):
+        self.period, self.employees = create_company()
+
+    def test_enqueue_returns_active_job(self):
+        job = enqueue_payroll_job(self.period)
+        self.assertEqual((job.status, job.total_employees), ('PENDING', len(self.employees)))
+        self.assertEqual(enqueue_payroll_job(self.period).pk, job.pk)
+
+        claim_job(job, 'worker-1')
+        self.assertEqual(enqueue_payroll_job(self.period).pk, job.pk)
+
+    def test_enqueue_resumes_from_previous_checkpoint(self):
+        previous = PayrollJob.objects.create(
+            period=self.period, status='FAILED', processed_employees=4, last_employee_id=self.employees[3].id
+        )
+        job = enqueue_payroll_job(self.period)
+        self.assertNotEqual(job.pk, previous.pk)
+        self.assertEqual((job.processed_employees, job.last_employee_id), (4, self.employees[3].id))
+
+        self.period.is_processed = True
+        with self.assertRaises(ValueError):
+            enqueue_payroll_job(self.period)
+
+    def test_job_claimed_once(self):
+        first = enqueue_payroll_job(self.period)
+        self.assertEqual(claim_next_job('worker-1').pk, first.pk)
+        self.assertIsNone(claim_next_job('worker-2'))
+        self.assertFalse(claim_job(first, 'worker-2'))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.worker), ('RUNNING', 'worker-1'))
+
+    def test_requeue_stale_jobs(self):
+        stale = enqueue_payroll_job(self.period)
+        claim_job(stale, 'worker-1')
+        PayrollJob.objects.filter(pk=stale.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        cancelled = PayrollJob.objects.create(
+            period=self.period, status='RUNNING', cancel_requested=True,
+            heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+        alive = PayrollJob.objects.create(period=self.period, status='RUNNING', heartbeat_at=timezone.now())
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        statuses = dict(PayrollJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {stale.pk: 'PENDING', cancelled.pk: 'CANCELLED', alive.pk: 'RUNNING'})
+        self.assertEqual(PayrollJob.objects.get(pk=stale.pk).worker, '')
+        self.assertEqual(claim_next_job('worker-2').pk, stale.pk)
+
+    def test_run_job(self):
+        job = enqueue_payroll_job(self.period)
+        claim_job(job)
+        job = run_payroll_job(job, batch_size=4)
+        self.assertEqual(job.status, 'SUCCEEDED')
+        self.assertEqual(job.processed_employees, len(self.employees))
+        self.assertEqual(job.last_employee_id, self.employees[-1].id)
+        self.period.refresh_from_db()
+        self.assertTrue(self.period.is_processed)
+
+    def test_cancel_stops_between_batches_and_resumes(self):
+        job = enqueue_payroll_job(self.period)
+        claim_job(job)
+        self.assertTrue(request_job_cancel(job))
+        job = run_payroll_job(job, batch_size=4)
+        self.assertEqual((job.status, job.processed_employees), ('CANCELLED', 4))
+        self.assertEqual(Salary.objects.filter(period=self.period).count(), 4)
+        self.period.refresh_from_db()
+        self.assertFalse(self.period.is_processed)
+
+        resumed = enqueue_payroll_job(self.period)
+        self.assertEqual(resumed.last_employee_id, job.last_employee_id)
+        claim_job(resumed)
+        resumed = run_payroll_job(resumed, batch_size=4)
+        self.assertEqual((resumed.status, resumed.processed_employees), ('SUCCEEDED', len(self.employees)))
+        self.assertEqual(Salary.objects.filter(period=self.period).count(), len(self.employees))
+
+    def test_cancel_during_final_batch_completes_job(self):
+        job = enqueue_payroll_job(self.period)
+        claim_job(job)
+        # 取消要求於最後一批計算期間送達，所有員工皆已寫入
+        request_job_cancel(job)
+        job = run_payroll_job(job, batch_size=len(self.employees))
+        self.assertEqual(job.status, 'SUCCEEDED')
+        self.assertEqual(job.processed_employees, len(self.employees))
+        self.period.refresh_from_db()
+        self.assertTrue(self.period.is_processed)
+
+    def test_cancel_pending_job(self):
+        job = enqueue_payroll_job(self.period)
+        self.assertTrue(request_job_cancel(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'CANCELLED')
+        self.assertIsNone(claim_next_job('worker-1'))
+        self.assertFalse(request_job_cancel(job))
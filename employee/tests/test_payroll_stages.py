@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from ..models import Employee
+from ..payroll_stages import StageRecorder, stage_rows
+from ..services import SalaryCalculationService
+from .utils import create_company
+
+
+class StageRecorderTest(TestCase):
+    """巢狀階段只記錄本身的耗時與查詢次數"""
+
+    def test_nested_stages_record_self_time_and_queries(self):
+        calls = []
+        recorder = StageRecorder(hooks=[lambda *args: calls.append(args)])
+        # 外層 0–10 秒，內層 2–5 秒
+        clock = iter([0.0, 2.0, 5.0, 10.0])
+        with mock.patch('employee.payroll_stages.time.perf_counter', lambda: next(clock)):
+            with recorder.recording():
+                with recorder.stage('salary_items'):
+                    Employee.objects.count()
+                    with recorder.stage('write_details') as stage:
+                        Employee.objects.count()
+                        Employee.objects.count()
+                        stage.rows = 2
+
+        self.assertEqual(recorder.as_dict(), {
+            'salary_items': {'calls': 1, 'seconds': 7.0, 'queries': 1, 'rows': 0},
+            'write_details': {'calls': 1, 'seconds': 3.0, 'queries': 2, 'rows': 2},
+        })
+        self.assertEqual(calls, [('write_details', 3.0, 2, 2), ('salary_items', 7.0, 1, 0)])
+        self.assertEqual(
+            [row['percent'] for row in stage_rows(recorder.as_dict())], [70.0, 30.0]
+        )
+
+    def test_single_employee_processing_stages(self):
+        period, employees = create_company()
+        service = SalaryCalculationService()
+        service.process_payroll_for_period(period, bulk=False)
+        timings = service.stage_recorder.as_dict()
+        self.assertEqual(list(timings), [
+            'load_data', 'attendance', 'base_salary', 'leave', 'salary_items', 'write_salaries', 'write_details',
+        ])
+        self.assertEqual(timings['attendance']['calls'], len(employees))
+        self.assertEqual(timings['write_salaries']['rows'], len(employees))
@@ -0,0 +1,59 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import views
+from ..models import Employee, Punch
+
+
+class BulkPunchApiTest(TestCase):
+    """打卡機批次打卡 API"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(employee_id='A001', name='打卡員工')
+        self.url = reverse('bulk_punch_api')
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+
+    def post(self, body, content_type='application/json'):
+        return self.client.post(self.url, body, content_type=content_type)
+
+    def test_json_array_reports_each_record_in_order(self):
+        response = self.post(json.dumps([
+            {'employee_id': 'A001', 'punch_type': 'IN', 'punch_time': '2025-02-03 08:00:00'},
+            {'employee_id': 'NOPE', 'punch_type': 'IN', 'punch_time': '2025-02-03 08:00:00'},
+            {'employee_id': 'A001', 'punch_type': 'OUT', 'punch_time': '2025-02-03 17:00:00'},
+        ]))
+        data = response.json()
+        self.assertEqual(data['status'], 'error')
+        self.assertEqual((data['created'], data['duplicates'], data['rejected']), (2, 0, 1))
+        self.assertEqual([result['status'] for result in data['results']], ['created', 'error', 'created'])
+        self.assertEqual([result['index'] for result in data['results']], [0, 1, 2])
+        self.assertEqual(Punch.objects.filter(employee=self.employee).count(), 2)
+
+    def test_ndjson_payload(self):
+        body = '\n'.join(json.dumps(record) for record in [
+            {'employee_id': 'A001', 'punch_type': 'IN', 'punch_time': '2025-02-04 08:00:00'},
+            {'employee_id': 'A001', 'punch_type': 'OUT', 'punch_time': '2025-02-04 17:00:00'},
+        ])
+        data = self.post(body, 'application/x-ndjson').json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['created'], 2)
+
+    def test_rejects_invalid_and_oversized_payloads(self):
+        self.assertEqual(self.post('{"employee_id": ').status_code, 400)
+        self.assertEqual(self.post('[]').status_code, 400)
+        with mock.patch.object(views, 'MAX_BULK_PUNCHES', 1):
+            response = self.post(json.dumps([
+                {'employee_id': 'A001', 'punch_type': 'IN'},
+                {'employee_id': 'A001', 'punch_type': 'OUT'},
+            ]))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Punch.objects.exists())
+
+    def test_requires_staff(self):
+        self.client.logout()
+        self.assertEqual(self.post('[]').status_code, 403)
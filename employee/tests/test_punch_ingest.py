@@ -0,0 +1,139 @@
+import io
+from datetime import datetime, timedelta
+from unittest import mock
+
+import openpyxl
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .. import punch_ingest
+from ..models import Employee, Punch
+from ..punch_ingest import (
+    PunchImportError, import_punch_workbook, ingest_punches, insert_punches, remove_duplicate_punches
+)
+from .utils import punch_workbook
+
+
+class PunchWorkbookImportTest(TestCase):
+    """以串流方式分批匯入 Excel 打卡記錄"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(employee_id='P001', name='打卡員工')
+
+    def test_batches_and_errors(self):
+        content = punch_workbook([
+            ['P001', 'IN', datetime(2025, 2, day, 8, 30)] for day in range(3, 8)
+        ] + [
+            [None, None, None],
+            ['NOPE', 'IN', datetime(2025, 2, 3, 8, 30)],
+            ['P001', 'IN', None],
+        ])
+
+        stats = import_punch_workbook(io.BytesIO(content), batch_size=2)
+        self.assertEqual((stats['rows'], stats['created'], stats['error_count']), (7, 5, 2))
+        self.assertEqual(stats['batches'], 3)
+        self.assertEqual(len(stats['errors']), 2)
+        self.assertTrue(stats['errors'][0].startswith('第 8 行'))
+        self.assertEqual(Punch.objects.filter(employee=self.employee).count(), 5)
+
+    def test_missing_columns(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['employee_id', 'punch_type'])
+        output = io.BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        with self.assertRaises(PunchImportError):
+            import_punch_workbook(output)
+
+
+class IdempotentPunchStorageTest(TestCase):
+    """重送或重複匯入相同的打卡不會產生重複記錄"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(employee_id='P001', name='打卡員工')
+        self.punch_time = timezone.make_aware(datetime(2025, 2, 3, 8, 0))
+
+    def test_reingesting_records_reports_duplicates(self):
+        records = [
+            {'employee_id': 'P001', 'punch_type': 'IN', 'punch_time': '2025-02-03 08:00:00'},
+            {'employee_id': 'P001', 'punch_type': 'OUT', 'punch_time': '2025-02-03 17:30:00'},
+            {'employee_id': 'P001', 'punch_type': 'OUT', 'punch_time': '2025-02-03 17:30:00'},
+        ]
+        first = ingest_punches(records)
+        self.assertEqual((first['created'], first['duplicates']), (2, 1))
+
+        second = ingest_punches(records)
+        self.assertEqual((second['created'], second['duplicates']), (0, 3))
+        self.assertEqual({result['status'] for result in second['results']}, {'duplicate'})
+        self.assertEqual(
+            [result['id'] for result in second['results']],
+            [result['id'] for result in first['results']],
+        )
+        self.assertEqual(Punch.objects.count(), 2)
+
+    def test_reimporting_workbook_writes_nothing(self):
+        content = punch_workbook([['P001', 'IN', datetime(2025, 2, day, 8, 30)] for day in range(3, 8)])
+        self.assertEqual(import_punch_workbook(io.BytesIO(content), batch_size=2)['created'], 5)
+
+        second = import_punch_workbook(io.BytesIO(content), batch_size=2)
+        self.assertEqual((second['created'], second['duplicates']), (0, 5))
+        self.assertEqual(Punch.objects.count(), 5)
+
+    def test_concurrent_insert_is_counted_as_duplicate(self):
+        # 其他請求於查詢既有記錄之後才寫入相同的打卡
+        other = Punch.objects.create(employee=self.employee, punch_time=self.punch_time, punch_type='IN')
+        later = self.punch_time + timedelta(hours=9)
+        punches = [
+            Punch(employee=self.employee, punch_time=self.punch_time, punch_type='IN'),
+            Punch(employee=self.employee, punch_time=later, punch_type='OUT'),
+            Punch(employee=self.employee, punch_time=later, punch_type='OUT'),
+        ]
+        find_existing = punch_ingest.find_existing_punches
+        calls = []
+
+        def stale_lookup(batch):
+            calls.append(batch)
+            return {} if len(calls) == 1 else find_existing(batch)
+
+        with mock.patch.object(punch_ingest, 'find_existing_punches', stale_lookup):
+            inserted = insert_punches(punches)
+
+        self.assertEqual(inserted, [punches[1]])
+        self.assertEqual(punches[0].pk, other.pk)
+        self.assertEqual(punches[2].pk, punches[1].pk)
+        self.assertEqual(Punch.objects.count(), 2)
+
+
+class RemoveDuplicatePunchesTest(TransactionTestCase):
+    """清除唯一限制建立前留下的重複打卡（SQLite 修改資料表結構需在交易之外）"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(employee_id='P001', name='打卡員工')
+        self.punch_time = timezone.make_aware(datetime(2025, 2, 3, 8, 0))
+        # SQLite 依模型定義重建資料表，須先自模型移除限制
+        self.constraints = Punch._meta.constraints
+        Punch._meta.constraints = []
+        with connection.schema_editor() as editor:
+            for constraint in self.constraints:
+                editor.remove_constraint(Punch, constraint)
+
+    def tearDown(self):
+        Punch.objects.all().delete()
+        Punch._meta.constraints = self.constraints
+        with connection.schema_editor() as editor:
+            for constraint in self.constraints:
+                editor.add_constraint(Punch, constraint)
+
+    def test_keeps_oldest_copy(self):
+        kept = Punch.objects.create(employee=self.employee, punch_time=self.punch_time, punch_type='IN')
+        Punch.objects.bulk_create([
+            Punch(employee=self.employee, punch_time=self.punch_time, punch_type='IN') for _ in range(2)
+        ])
+        Punch.objects.create(employee=self.employee, punch_time=self.punch_time, punch_type='OUT')
+
+        self.assertEqual(remove_duplicate_punches(dry_run=True), 2)
+        self.assertEqual(Punch.objects.count(), 4)
+        self.assertEqual(remove_duplicate_punches(), 2)
+        self.assertEqual(Punch.objects.count(), 2)
+        self.assertTrue(Punch.objects.filter(pk=kept.pk).exists())
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .. import query_budget
+from ..models import Employee
+from ..query_budget import QueryRecorder, sql_fingerprint
+
+
+class QueryRecorderTest(TestCase):
+    """查詢記錄只保留有限數量的不同 SQL"""
+
+    def test_counts_repeated_statements_once(self):
+        recorder = QueryRecorder(statement_limit=2)
+        with connection.execute_wrapper(recorder):
+            for employee_id in range(20):
+                list(Employee.objects.filter(pk=employee_id))
+            for employee_ids in ([1, 2], [1, 2, 3]):
+                list(Employee.objects.filter(pk__in=employee_ids))
+
+        self.assertEqual(recorder.count, 22)
+        self.assertEqual(len(recorder.statements), 2)  # 第三個不同的 SQL 只計入次數
+        fingerprint, count = recorder.repeated_fingerprints()[0]
+        self.assertEqual(count, 20)
+        self.assertIn('FROM "employee_employee"', fingerprint)
+
+
+class SqlFingerprintTest(SimpleTestCase):
+    """只有參數不同的 SQL 得到相同的指紋"""
+
+    def test_literals_and_in_lists(self):
+        self.assertEqual(
+            sql_fingerprint("SELECT a FROM t WHERE id IN (%s, %s, %s) AND x = 5 AND n = 'ab''c'"),
+            'SELECT a FROM t WHERE id IN (...) AND x = ? AND n = ?',
+        )
+
+
+@override_settings(QUERY_BUDGETS={'default': {'queries': 50}, 'health_check': {'queries': 1}})
+class QueryBudgetMiddlewareTest(TestCase):
+    """超過預算的請求記錄警告並計入彙總"""
+
+    def setUp(self):
+        query_budget.reset_query_stats()
+        self.addCleanup(query_budget.reset_query_stats)
+
+    def test_violation_is_logged_and_recorded(self):
+        with self.assertLogs('employee.query_budget', 'WARNING') as logs:
+            self.client.get(reverse('health_check'))
+        self.assertIn('health_check', logs.output[0])
+        self.assertIn('2× SELECT COUNT(*)', logs.output[0])
+
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        views = {row['view']: row for row in self.client.get(reverse('query_stats_api')).json()['views']}
+        self.assertEqual(views['health_check']['requests'], 1)
+        self.assertEqual(views['health_check']['violations'], 1)
+        self.assertEqual(views['health_check']['budget']['queries'], 1)
+        self.assertGreater(views['health_check']['max_queries'], 1)
+
+    def test_within_budget_is_not_logged(self):
+        with self.assertNoLogs('employee.query_budget', 'WARNING'):
+            self.client.get(reverse('query_stats_api'))
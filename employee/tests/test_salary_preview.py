@@ -0,0 +1,53 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Salary, SalaryItem
+from ..services import SalaryCalculationService
+from .utils import create_company
+
+
+class BatchSalaryPreviewTest(TestCase):
+    """全公司薪資預覽"""
+
+    def setUp(self):
+        self.period, self.employees = create_company()
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+
+    def preview_lines(self, **filters):
+        response = self.client.post(
+            reverse('batch_salary_preview'),
+            json.dumps({'period_id': self.period.id, **filters}),
+            content_type='application/json',
+        )
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_preview_matches_stored_salary_without_writing(self):
+        item_count = SalaryItem.objects.count()
+        lines = self.preview_lines()
+        self.assertEqual(lines[0]['total'], len(self.employees))
+        self.assertEqual(lines[-1], {'type': 'end', 'count': len(self.employees)})
+        self.assertFalse(Salary.objects.exists())
+        self.assertEqual(SalaryItem.objects.count(), item_count)
+
+        SalaryCalculationService().process_payroll_for_period(self.period)
+        for preview in lines[1:-1]:
+            salary = Salary.objects.get(period=self.period, employee_id=preview['employee_id'])
+            self.assertEqual(preview['gross_salary'], float(salary.gross_amount))
+            self.assertEqual(preview['net_salary'], float(salary.net_amount))
+            self.assertEqual(preview['total_deductions'], float(salary.total_deductions))
+
+    def test_single_preview_matches_batch_line(self):
+        employee = self.employees[1]
+        batch = self.preview_lines(employee_id=employee.id)[1]
+        response = self.client.post(
+            reverse('salary_calculation_preview'),
+            json.dumps({'period_id': self.period.id, 'employee_id': employee.id}),
+            content_type='application/json',
+        ).json()
+        self.assertEqual(response['status'], 'success')
+        del batch['type'], batch['employee_id']
+        self.assertEqual(response['preview'], batch)
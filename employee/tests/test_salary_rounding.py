@@ -0,0 +1,80 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from ..attendance import MICROSECONDS_PER_HOUR
+from ..models import Employee, PayrollPeriod, Punch, Salary, SalaryItem, round_amount, round_hours
+from ..services import SalaryCalculationService
+
+
+class SalaryRoundingTest(TestCase):
+    """工時以整數微秒累計，金額與時數只在寫入時以 ROUND_HALF_UP 捨入一次"""
+
+    INTERVAL = timedelta(minutes=25, seconds=10)  # 每段 0.4194... 小時，逐段捨入會少算
+    INTERVALS_PER_DAY = 6
+
+    def setUp(self):
+        self.period = PayrollPeriod.objects.create(
+            start_date=date(2025, 1, 6), end_date=date(2025, 1, 31), pay_date=date(2025, 2, 5)
+        )
+        self.part_timer = Employee.objects.create(
+            employee_id='H001', name='兼職員工', employment_type='PT', hourly_rate=Decimal('200.5')
+        )
+        self.full_timer = Employee.objects.create(
+            employee_id='H002', name='正職員工', employment_type='FT', base_salary=Decimal('32000.10')
+        )
+        # 32000.10 × 5% = 1600.005、× 2.5% = 800.0025，皆落在捨入邊界
+        self.bonus = SalaryItem.objects.create(
+            name='績效獎金', item_type='BONUS', percentage=Decimal('5'), is_fixed=False, apply_to_parttime=False
+        )
+        self.insurance = SalaryItem.objects.create(
+            name='勞保', item_type='DEDUCTION', percentage=Decimal('2.5'), is_fixed=False,
+            apply_to_parttime=False
+        )
+
+        punches = []
+        self.days = 0
+        day = self.period.start_date
+        while day <= self.period.end_date:
+            start = timezone.make_aware(datetime(day.year, day.month, day.day, 8, 0))
+            for index in range(self.INTERVALS_PER_DAY):
+                punch_in = start + index * timedelta(minutes=30)
+                punches.append(Punch(employee=self.part_timer, punch_time=punch_in, punch_type='IN'))
+                punches.append(Punch(employee=self.part_timer, punch_time=punch_in + self.INTERVAL, punch_type='OUT'))
+            self.days += 1
+            day += timedelta(days=1)
+        Punch.objects.bulk_create(punches)
+
+    def assert_rounding(self):
+        interval_count = self.days * self.INTERVALS_PER_DAY
+        exact_hours = (
+            Decimal(interval_count * (self.INTERVAL // timedelta(microseconds=1))) / MICROSECONDS_PER_HOUR
+        )
+        part_timer = Salary.objects.get(employee=self.part_timer, period=self.period)
+        self.assertEqual(part_timer.working_hours, round_hours(exact_hours))
+        self.assertNotEqual(part_timer.working_hours, round_hours(0.4) * interval_count)
+        self.assertEqual(part_timer.base_amount, round_amount(exact_hours * Decimal('200.5')))
+        self.assertEqual(part_timer.overtime_hours, 0)
+
+        full_timer = Salary.objects.get(employee=self.full_timer, period=self.period)
+        amounts = dict(full_timer.salarydetail_set.values_list('item__name', 'amount'))
+        self.assertEqual(amounts, {'績效獎金': Decimal('1600.01'), '勞保': Decimal('800.00')})
+        self.assertEqual(full_timer.total_allowances, Decimal('1600.01'))
+        self.assertEqual(full_timer.total_deductions, Decimal('800.00'))
+        self.assertEqual(full_timer.gross_amount, Decimal('33600.11'))
+        self.assertEqual(full_timer.net_amount, Decimal('32800.11'))
+
+        for salary in (part_timer, full_timer):
+            stored = Salary.objects.get(pk=salary.pk)
+            stored.refresh_totals()
+            self.assertEqual(stored.net_amount, salary.net_amount)
+
+    def test_single_employee_processing(self):
+        SalaryCalculationService().process_payroll_for_period(self.period, bulk=False)
+        self.assert_rounding()
+
+    def test_bulk_processing(self):
+        SalaryCalculationService().process_payroll_for_period(self.period)
+        self.assert_rounding()
@@ -0,0 +1,79 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from ..models import Employee, PayrollPeriod, Salary, SalaryItem
+from ..salary_rules import LEAVE_DEDUCTION_ITEM_NAME, SalaryRuleProgram
+from ..services import SalaryCalculationService
+
+
+class SalaryRuleProgramTest(TestCase):
+    """薪資項目規則依僱用類型選取，每次計算重新編譯"""
+
+    def setUp(self):
+        self.period = PayrollPeriod.objects.create(
+            start_date=date(2025, 3, 1), end_date=date(2025, 3, 31), pay_date=date(2025, 4, 5)
+        )
+        self.full_timer = Employee.objects.create(
+            employee_id='R001', name='正職員工', employment_type='FT', base_salary=Decimal('30000')
+        )
+        self.part_timer = Employee.objects.create(
+            employee_id='R002', name='兼職員工', employment_type='PT', hourly_rate=Decimal('200')
+        )
+        self.meal = SalaryItem.objects.create(
+            name='伙食津貼', item_type='ALLOWANCE', amount=Decimal('2400'), is_fixed=True, apply_to_parttime=True
+        )
+        self.bonus = SalaryItem.objects.create(
+            name='績效獎金', item_type='BONUS', percentage=Decimal('10'), is_fixed=False, apply_to_parttime=False
+        )
+        self.leave = SalaryItem.objects.create(name=LEAVE_DEDUCTION_ITEM_NAME, item_type='DEDUCTION')
+
+    def test_rules_by_employment_type(self):
+        program = SalaryRuleProgram.compile()
+        self.assertEqual([rule.item for rule in program.rules_for(self.full_timer)], [self.meal, self.bonus])
+        self.assertEqual([rule.item for rule in program.rules_for(self.part_timer)], [self.meal])
+        self.assertEqual(program.leave_deduction_item, self.leave)
+
+        rows = program.evaluate(self.full_timer, self.period, Decimal('30000'), Decimal('1000'))
+        self.assertEqual([(item, amount) for item, amount, description in rows], [
+            (self.meal, Decimal('2400')),
+            (self.bonus, Decimal('3100')),
+        ])
+
+    def test_processing_applies_rules_by_employment_type(self):
+        for bulk in (True, False):
+            with self.subTest(bulk=bulk):
+                self.period.is_processed = False
+                SalaryCalculationService().process_payroll_for_period(self.period, bulk=bulk)
+                details = {
+                    salary.employee_id: set(salary.salarydetail_set.values_list('item__name', flat=True))
+                    for salary in Salary.objects.filter(period=self.period)
+                }
+                self.assertEqual(details[self.full_timer.id], {'伙食津貼', '績效獎金'})
+                self.assertEqual(details[self.part_timer.id], {'伙食津貼'})
+
+    def test_program_compiled_once_per_run(self):
+        with mock.patch.object(SalaryRuleProgram, 'compile', wraps=SalaryRuleProgram.compile) as compile_rules:
+            SalaryCalculationService().process_payroll_for_period(self.period, bulk=False)
+        self.assertEqual(compile_rules.call_count, 1)
+
+    def item_amounts(self, salary):
+        return dict(salary.salarydetail_set.values_list('item__name', 'amount'))
+
+    def test_item_changes_apply_to_next_run(self):
+        service = SalaryCalculationService()
+        salary = service.calculate_salary_for_period(self.full_timer, self.period)
+        self.assertEqual(self.item_amounts(salary)['伙食津貼'], Decimal('2400'))
+
+        # 其他行程修改薪資項目時，本行程不會收到 signal，下一次計算仍使用新的規則
+        with mock.patch('employee.signals.mark_salaries_stale'):
+            SalaryItem.objects.filter(pk=self.meal.pk).update(amount=Decimal('3000'))
+            self.bonus.apply_to_parttime = True
+            self.bonus.save()
+
+        salary = service.calculate_salary_for_period(self.full_timer, self.period)
+        self.assertEqual(self.item_amounts(salary)['伙食津貼'], Decimal('3000'))
+        salary = service.calculate_salary_for_period(self.part_timer, self.period)
+        self.assertEqual(set(self.item_amounts(salary)), {'伙食津貼', '績效獎金'})
@@ -0,0 +1,38 @@
+import importlib
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Salary
+from ..services import SalaryCalculationService
+from .utils import create_company
+
+
+class SalaryTotalsBackfillTest(TestCase):
+    """0013 遷移與 backfill_salary_totals 指令依明細回填相同的彙總欄位"""
+
+    def setUp(self):
+        self.period, self.employees = create_company()
+        SalaryCalculationService().process_payroll_for_period(self.period)
+        self.expected = self.totals()
+        self.assertTrue(all(totals[-1] for totals in self.expected.values()))
+        Salary.objects.update(gross_amount=0, total_allowances=0, total_deductions=0, net_amount=0)
+
+    def totals(self):
+        return {
+            salary_id: totals
+            for salary_id, *totals in Salary.objects.values_list('id', *Salary.TOTAL_FIELDS)
+        }
+
+    def test_migration_backfill(self):
+        migration = importlib.import_module('employee.migrations.0013_salary_totals')
+        migration.backfill_totals(apps, None)
+        self.assertEqual(self.totals(), self.expected)
+
+    def test_command_backfill(self):
+        output = StringIO()
+        call_command('backfill_salary_totals', '--batch-size', '4', stdout=output)
+        self.assertIn(f'共更新 {len(self.employees)} 筆', output.getvalue())
+        self.assertEqual(self.totals(), self.expected)
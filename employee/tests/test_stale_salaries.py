@@ -0,0 +1,134 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from ..attendance import PunchTimeline
+from ..models import Leave, PayrollPeriod, Punch, Salary, SalaryItem
+from ..payroll_engine import BulkPayrollEngine
+from ..services import SalaryCalculationService
+from .utils import create_company, salary_snapshot
+
+
+class StaleSalaryTest(TestCase):
+    """變更後標記受影響的薪資，並只重新計算被標記的記錄"""
+
+    def setUp(self):
+        self.period, self.employees = create_company()
+        self.next_period = PayrollPeriod.objects.create(
+            start_date=date(2025, 2, 1), end_date=date(2025, 2, 28), pay_date=date(2025, 3, 5)
+        )
+        self.service = SalaryCalculationService()
+        self.service.process_payroll_for_period(self.period)
+        self.service.process_payroll_for_period(self.next_period)
+        self.employee = self.employees[1]
+
+    def stale(self, period=None):
+        salaries = Salary.objects.filter(is_stale=True)
+        if period is not None:
+            salaries = salaries.filter(period=period)
+        return set(salaries.values_list('employee_id', 'period_id'))
+
+    def add_punch(self, day=15, hour=18):
+        return Punch.objects.create(
+            employee=self.employee,
+            punch_time=timezone.make_aware(datetime(2025, 1, day, hour, 0)),
+            punch_type='IN',
+        )
+
+    def test_punch_marks_only_overlapping_period(self):
+        self.assertEqual(self.stale(), set())
+        punch = self.add_punch()
+        self.assertEqual(self.stale(), {(self.employee.id, self.period.id)})
+
+        # 改到下一期間時，原本的期間與新期間都需重新計算
+        Salary.objects.update(is_stale=False)
+        punch.punch_time = timezone.make_aware(datetime(2025, 2, 10, 9, 0))
+        punch.save()
+        self.assertEqual(self.stale(), {(self.employee.id, self.period.id), (self.employee.id, self.next_period.id)})
+
+    def test_confirmed_salaries_are_not_marked(self):
+        Salary.objects.filter(employee=self.employee, period=self.period).update(is_confirmed=True)
+        self.add_punch()
+        self.assertEqual(self.stale(), set())
+
+    def test_leave_employee_and_salary_item_changes(self):
+        leave = Leave.objects.create(
+            employee=self.employee, leave_type='PERSONAL',
+            start_date=date(2025, 2, 3), end_date=date(2025, 2, 4), status='PENDING',
+        )
+        self.assertEqual(self.stale(), set())
+        leave.status = 'APPROVED'
+        leave.save()
+        self.assertEqual(self.stale(), {(self.employee.id, self.next_period.id)})
+
+        Salary.objects.update(is_stale=False)
+        self.employee.base_salary = Decimal('48000')
+        self.employee.save()
+        self.assertEqual(self.stale(), {(self.employee.id, self.period.id), (self.employee.id, self.next_period.id)})
+
+        Salary.objects.update(is_stale=False)
+        SalaryItem.objects.create(name='交通津貼', item_type='ALLOWANCE', amount=Decimal('1000'), is_fixed=True)
+        self.assertEqual(len(self.stale()), 2 * len(self.employees))
+
+    def test_marking_again_updates_stale_time(self):
+        self.add_punch()
+        salary = Salary.objects.get(employee=self.employee, period=self.period)
+        Salary.objects.filter(pk=salary.pk).update(stale_at=salary.stale_at - timedelta(hours=1))
+        self.add_punch(day=16)
+        self.assertGreater(Salary.objects.get(pk=salary.pk).stale_at, salary.stale_at - timedelta(hours=1))
+
+    def test_recompute_only_stale_salaries(self):
+        self.add_punch()
+        self.add_punch(day=15, hour=22)
+        other = Salary.objects.exclude(employee=self.employee).filter(period=self.period).first()
+        Salary.objects.filter(pk=other.pk).update(base_amount=1)  # 未標記的記錄不重新計算
+
+        self.assertEqual(self.service.recompute_stale_salaries(), 1)
+        self.assertEqual(self.stale(), set())
+        other.refresh_from_db()
+        self.assertEqual(other.base_amount, 1)
+
+        recomputed = salary_snapshot(self.period)[self.employee.id]
+        Salary.objects.filter(period=self.period).delete()
+        self.period.is_processed = False
+        self.period.save()
+        self.service.process_payroll_for_period(self.period)
+        self.assertEqual(recomputed, salary_snapshot(self.period)[self.employee.id])
+
+    def test_bulk_write_keeps_marks_made_during_calculation(self):
+        self.add_punch()
+        compute = BulkPayrollEngine.compute
+
+        def punch_after_compute(engine, dataset):
+            results = compute(engine, dataset)
+            # 計算期間新增的打卡未包含在計算結果中
+            self.add_punch(day=20)
+            return results
+
+        with mock.patch.object(BulkPayrollEngine, 'compute', punch_after_compute):
+            self.assertEqual(self.service.recompute_stale_salaries(), 1)
+        self.assertEqual(self.stale(), {(self.employee.id, self.period.id)})
+
+        self.assertEqual(self.service.recompute_stale_salaries(), 1)
+        self.assertEqual(self.stale(), set())
+
+    def test_single_employee_calculation_keeps_marks_made_during_calculation(self):
+        self.add_punch()
+        for_employee = PunchTimeline.for_employee
+
+        def punch_after_load(employee, period):
+            timeline = for_employee(employee, period)
+            self.add_punch(day=20)
+            return timeline
+
+        with mock.patch.object(PunchTimeline, 'for_employee', punch_after_load):
+            salary = self.service.calculate_salary_for_period(self.employee, self.period)
+        self.assertTrue(salary.is_stale)
+        self.assertEqual(self.stale(), {(self.employee.id, self.period.id)})
+
+        salary = self.service.calculate_salary_for_period(self.employee, self.period)
+        self.assertFalse(salary.is_stale)
+        self.assertEqual(self.stale(), set())
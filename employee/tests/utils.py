@@ -0,0 +1,94 @@
+"""
+測試共用的資料建立函式
+"""
+import io
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import openpyxl
+from django.utils import timezone
+
+from ..models import Department, Employee, Leave, PayrollPeriod, Punch, Salary, SalaryItem
+from ..services import SalaryCalculationService
+
+
+def create_company(employee_count=9):
+    """
+    建立測試用的部門、員工、薪資項目、打卡及請假記錄
+
+    包含正職（月薪含小數）與兼職員工、加班、重複打卡及無薪假，涵蓋各項捨入與扣款。
+
+    Returns:
+        tuple: (薪資期間, 員工列表)
+    """
+    SalaryCalculationService().create_default_salary_items()
+    SalaryItem.objects.create(name='主管加給', item_type='ALLOWANCE', amount=Decimal('5000'), is_fixed=True)
+    SalaryItem.objects.create(name='績效獎金', item_type='BONUS', percentage=Decimal('10'), is_fixed=False)
+    department = Department.objects.create(name='研發部')
+    start, end = date(2025, 1, 1), date(2025, 1, 31)
+    period = PayrollPeriod.objects.create(start_date=start, end_date=end, pay_date=end + timedelta(days=5))
+
+    employees = []
+    for index in range(employee_count):
+        full_time = index % 3 != 0
+        employees.append(Employee.objects.create(
+            employee_id=f'T{index:03d}',
+            name=f'測試員工{index}',
+            department=department,
+            employment_type='FT' if full_time else 'PT',
+            base_salary=Decimal(('32000', '45000.50', '51234')[index % 3]) if full_time else None,
+            hourly_rate=None if full_time else Decimal(('183', '200.5')[index % 2]),
+        ))
+
+    punches = []
+    day = start
+    while day <= end:
+        for index, employee in enumerate(employees):
+            if (day.day + index) % 7 == 0:
+                continue  # 缺勤
+            punch_in = timezone.make_aware(datetime(day.year, day.month, day.day, 8, (day.day * 7 + index) % 60, 13))
+            worked = timedelta(hours=7 + (day.day + index) % 5, minutes=17 * index % 60)
+            punches.append(Punch(employee=employee, punch_time=punch_in, punch_type='IN'))
+            punches.append(Punch(employee=employee, punch_time=punch_in + worked, punch_type='OUT'))
+            if (day.day * index) % 11 == 1:
+                punches.append(Punch(employee=employee, punch_time=punch_in + timedelta(minutes=3), punch_type='IN'))
+        day += timedelta(days=1)
+    Punch.objects.bulk_create(punches)
+
+    for index, employee in enumerate(employees[::2]):
+        leave_start = start + timedelta(days=3 + index * 4)
+        Leave.objects.create(
+            employee=employee,
+            leave_type=('PERSONAL', 'SICK', 'ANNUAL')[index % 3],
+            start_date=leave_start,
+            end_date=leave_start + timedelta(days=index % 3),
+            status='APPROVED',
+        )
+    return period, employees
+
+
+def salary_snapshot(period):
+    """期間內所有薪資及明細的內容，用於比較不同計算方式的結果"""
+    return {
+        salary.employee_id: (
+            salary.base_amount, salary.working_hours, salary.overtime_hours, salary.overtime_amount,
+            salary.total_allowances, salary.total_deductions, salary.gross_amount, salary.net_amount,
+            sorted(
+                (detail.item.name, detail.amount, detail.description)
+                for detail in salary.salarydetail_set.select_related('item')
+            ),
+        )
+        for salary in Salary.objects.filter(period=period)
+    }
+
+
+def punch_workbook(rows):
+    """建立打卡匯入用的 Excel 檔案內容"""
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.append(['employee_id', 'punch_type', 'punch_time'])
+    for row in rows:
+        worksheet.append(row)
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
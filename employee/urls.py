@@ -21,6 +21,11 @@ urlpatterns = [
     path('api/employees/import/', views.import_employees_api, name='import_employees_api'),
     path('api/punches/import_excel/', views.import_punches_excel_api, name='import_punches_excel_api'),
     path('api/punch/', views.punch_api, name='punch_api'),
+    path('api/punches/bulk/', views.bulk_punch_api, name='bulk_punch_api'),
+    path('api/imports/', views.create_import_session_api, name='create_import_session'),
+    path('api/imports/<int:session_id>/', views.import_session_status, name='import_session_status'),
+    path('api/imports/<int:session_id>/resume/', views.resume_import_session_api, name='resume_import_session'),
+    path('api/imports/<int:session_id>/errors/', views.import_session_errors, name='import_session_errors'),
     path('api/leave/', views.leave_api, name='leave_api'),
     path('api/leaves/pending/', views.get_pending_leaves_api, name='get_pending_leaves_api'),
     path('api/leaves/update_status/', views.update_leave_status_api, name='update_leave_status_api'),
@@ -29,8 +34,12 @@ urlpatterns = [
     # 薪資相關 API
     path('api/payroll/periods/create/', salary_views.create_payroll_period, name='create_payroll_period'),
     path('api/payroll/process/', salary_views.process_payroll, name='process_payroll'),
+    path('api/payroll/jobs/<int:job_id>/', salary_views.payroll_job_status, name='payroll_job_status'),
+    path('api/payroll/jobs/<int:job_id>/cancel/', salary_views.cancel_payroll_job, name='cancel_payroll_job'),
+    path('api/payroll/recompute-stale/', salary_views.recompute_stale_salaries, name='recompute_stale_salaries'),
     path('api/salary/calculate/', salary_views.calculate_single_salary, name='calculate_single_salary'),
     path('api/salary/preview/', salary_views.salary_calculation_preview, name='salary_calculation_preview'),
+    path('api/salary/preview/batch/', salary_views.batch_salary_preview, name='batch_salary_preview'),
     path('api/salary/chart-data/', salary_views.salary_chart_data, name='salary_chart_data'),
     path('api/salary/summary/<int:employee_id>/', salary_views.salary_summary_api, name='salary_summary_api'),
     path('api/salary/employee-data/', salary_views.get_employee_salary_data, name='get_employee_salary_data'),
@@ -38,5 +47,7 @@ urlpatterns = [
     
     # 系統相關
     path('api/health/', views.health_check, name='health_check'),
+    path('api/system/query-stats/', views.query_stats_api, name='query_stats_api'),
+    path('api/metrics/', views.metrics_api, name='metrics_api'),
     path('settings/', views.settings_view, name='settings'),
 ]
\ No newline at end of file
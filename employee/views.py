@@ -1,21 +1,34 @@
 import csv
 import json
 import logging
+import os
+import time
 from datetime import datetime
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
 from django.contrib.auth.views import LoginView, LogoutView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, View, DetailView
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
 from django.db import connection
+from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
 from django.db.utils import DatabaseError, OperationalError
-import openpyxl # 新增這一行
 
-from .models import Department, Employee, Salary, Punch, Leave
+from .models import Department, Employee, ImportSession, Salary, Punch, Leave
+from .employee_import import EmployeeImportError, import_employees, read_employee_file
+from .import_sessions import (
+    IMPORT_CHUNK_SIZE, ImportSessionError, create_import_session, iter_error_report, resume_import_session
+)
+from .metrics import record_import, render_metrics
+from .punch_ingest import (
+    MAX_BULK_PUNCHES, PunchImportError, import_punch_workbook, ingest_punches, parse_punch_payload
+)
+from .query_budget import get_query_stats
 
 # 設定日誌
 logger = logging.getLogger(__name__)
@@ -70,75 +83,12 @@ def import_employees_api(request):
     if file_extension not in ['csv', 'xlsx']:
         return JsonResponse({'status': 'error', 'message': '請上傳有效的 CSV 或 Excel 檔案 (.csv, .xlsx)。'})
 
-    imported_count = 0
-    updated_count = 0
-    errors = []
-
     try:
-        if file_extension == 'csv':
-            decoded_file = uploaded_file.read().decode('utf-8').splitlines()
-            reader = csv.DictReader(decoded_file)
-            rows = list(reader)
-        elif file_extension == 'xlsx':
-            workbook = openpyxl.load_workbook(uploaded_file)
-            sheet = workbook.active
-            headers = [cell.value for cell in sheet[1]]
-            rows = []
-            for row_idx in range(2, sheet.max_row + 1):
-                row_data = {}
-                for col_idx, cell in enumerate(sheet[row_idx]):
-                    row_data[headers[col_idx]] = cell.value
-                rows.append(row_data)
-
-        for i, row in enumerate(rows):
-            try:
-                # 檢查必要的欄位是否存在
-                required_fields = ['employee_id', 'name', 'email', 'phone', 'department_name', 'hire_date']
-                for field in required_fields:
-                    if field not in row or row[field] is None:
-                        raise KeyError(f"缺少欄位: {field}")
-
-                department_name = row['department_name']
-                department, created_dept = Department.objects.get_or_create(name=department_name)
-
-                hire_date_str = str(row['hire_date']) # 確保是字串，以防 Excel 讀取為 datetime 物件
-                # 處理 Excel 可能將日期讀取為 datetime 物件的情況
-                if isinstance(row['hire_date'], datetime):
-                    hire_date = row['hire_date'].date()
-                else:
-                    hire_date = datetime.strptime(hire_date_str, '%Y-%m-%d').date()
-
-                employee, created_emp = Employee.objects.update_or_create(
-                    employee_id=row['employee_id'], # 使用 employee_id 作為唯一識別碼
-                    defaults={
-                        'name': row['name'],
-                        'email': row['email'],
-                        'phone': row['phone'],
-                        'department': department,
-                        'hire_date': hire_date,
-                    }
-                )
-
-                if created_emp:
-                    imported_count += 1
-                else:
-                    updated_count += 1
-
-            except KeyError as e:
-                errors.append(f'第 {i+2} 行錯誤: 缺少欄位 {e}')
-            except ValueError as e:
-                errors.append(f'第 {i+2} 行錯誤: 日期格式不正確或資料無效 - {e}')
-            except (DatabaseError, OperationalError) as e:
-                logger.error(f'資料庫操作錯誤: {e}')
-                errors.append(f'第 {i+2} 行錯誤: 資料庫操作失敗')
-            except Exception as e:
-                errors.append(f'第 {i+2} 行錯誤: {e}')
-
-        if errors:
-            return JsonResponse({'status': 'error', 'message': '匯入完成，但存在錯誤。', 'errors': errors})
-        else:
-            return JsonResponse({'status': 'success', 'message': f'成功匯入 {imported_count} 筆新員工資料，更新 {updated_count} 筆員工資料。'})
-    
+        stats = import_employees(read_employee_file(uploaded_file, uploaded_file.name))
+    except EmployeeImportError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return JsonResponse({'status': 'error', 'message': f'無法讀取檔案，請確認為 UTF-8 編碼的 CSV: {e}'}, status=400)
     except (DatabaseError, OperationalError) as e:
         logger.error(f'匯入員工資料時發生資料庫錯誤: {e}')
         return JsonResponse({
@@ -152,6 +102,24 @@ def import_employees_api(request):
             'message': f'匯入失敗: {str(e)}'
         }, status=500)
 
+    record_import(
+        'employees', stats['seconds'],
+        created=stats['created'], updated=stats['updated'], unchanged=stats['unchanged'],
+        error=stats['error_count']
+    )
+    errors = stats.pop('errors')
+    summary = (
+        f"新增 {stats['created']} 筆、更新 {stats['updated']} 筆、未變動 {stats['unchanged']} 筆員工資料"
+    )
+    if errors:
+        return JsonResponse({
+            'status': 'error',
+            'message': f"匯入完成，但存在 {stats['error_count']} 筆錯誤（{summary}）。",
+            'errors': errors,
+            'stats': stats,
+        })
+    return JsonResponse({'status': 'success', 'message': f'匯入完成：{summary}。', 'stats': stats})
+
 @require_POST
 def import_punches_excel_api(request):
     if not request.user.is_authenticated or not request.user.is_staff:
@@ -171,68 +139,16 @@ def import_punches_excel_api(request):
     if file_extension != 'xlsx':
         return JsonResponse({'status': 'error', 'message': '請上傳有效的 Excel 檔案 (.xlsx)。'}) 
 
-    imported_count = 0
-    errors = []
-
     try:
-        workbook = openpyxl.load_workbook(uploaded_file)
-        sheet = workbook.active
-        headers = [cell.value for cell in sheet[1]]
-
-        # Expected headers for punch data
-        expected_headers = ['employee_id', 'punch_type', 'punch_time'] # 將 employee_email 改為 employee_id
-        if not all(h in headers for h in expected_headers):
-            return JsonResponse({'status': 'error', 'message': f'Excel 檔案缺少必要的欄位。需要: {", ".join(expected_headers)}'}, status=400)
-
-        for row_idx in range(2, sheet.max_row + 1):
-            row_data = {}
-            for col_idx, cell in enumerate(sheet[row_idx]):
-                if col_idx < len(headers):
-                    row_data[headers[col_idx]] = cell.value
-
-            try:
-                employee_id = row_data.get('employee_id') # 從 employee_email 改為 employee_id
-                punch_type = row_data.get('punch_type')
-                punch_time_value = row_data.get('punch_time')
-
-                if not employee_id or not punch_type or not punch_time_value:
-                    raise ValueError("缺少必要的打卡資訊 (員工編號、打卡類型或打卡時間)。")
-
-                employee = Employee.objects.get(employee_id=employee_id) # 從 email 改為 employee_id
-
-                # Handle various date/time formats from Excel
-                if isinstance(punch_time_value, datetime):
-                    punch_time = timezone.make_aware(punch_time_value)
-                elif isinstance(punch_time_value, str):
-                    try:
-                        punch_time = timezone.make_aware(datetime.strptime(punch_time_value, '%Y-%m-%d %H:%M:%S'))
-                    except ValueError:
-                        punch_time = timezone.make_aware(datetime.strptime(punch_time_value, '%Y-%m-%d %H:%M'))
-                else:
-                    raise ValueError("無法解析打卡時間格式。")
-
-                Punch.objects.create(
-                    employee=employee,
-                    punch_time=punch_time,
-                    punch_type=punch_type
-                )
-                imported_count += 1
-
-            except Employee.DoesNotExist:
-                errors.append(f'第 {row_idx} 行錯誤: 員工編號 {employee_id} 不存在。') # 錯誤訊息調整
-            except ValueError as e:
-                errors.append(f'第 {row_idx} 行錯誤: 資料格式不正確或無效 - {e}')
-            except (DatabaseError, OperationalError) as e:
-                logger.error(f'資料庫操作錯誤: {e}')
-                errors.append(f'第 {row_idx} 行錯誤: 資料庫操作失敗')
-            except Exception as e:
-                errors.append(f'第 {row_idx} 行錯誤: {e}')
-
-        if errors:
-            return JsonResponse({'status': 'error', 'message': '匯入完成，但存在錯誤。', 'errors': errors})
-        else:
-            return JsonResponse({'status': 'success', 'message': f'成功匯入 {imported_count} 筆打卡記錄。'})
-
+        stats = import_punch_workbook(uploaded_file)
+    except PunchImportError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except (DatabaseError, OperationalError) as e:
+        logger.error(f'匯入打卡記錄時發生資料庫錯誤: {e}')
+        return JsonResponse({
+            'status': 'error',
+            'message': '資料庫操作失敗，已提交的批次保留，請檢查資料庫連線或聯絡系統管理員。'
+        }, status=503)
     except Exception as e:
         logger.error(f'匯入打卡記錄時發生未預期錯誤: {e}')
         return JsonResponse({
@@ -240,9 +156,187 @@ def import_punches_excel_api(request):
             'message': f'匯入失敗: {str(e)}'
         }, status=500)
 
+    record_import(
+        'punches', stats['seconds'],
+        created=stats['created'], duplicate=stats['duplicates'], error=stats['error_count']
+    )
+    errors = stats.pop('errors')
+    duplicates = f"，{stats['duplicates']} 筆已存在未重複寫入" if stats['duplicates'] else ''
+    if errors:
+        return JsonResponse({
+            'status': 'error',
+            'message': f"匯入完成，但存在 {stats['error_count']} 筆錯誤{duplicates}。",
+            'errors': errors,
+            'stats': stats,
+        })
+    return JsonResponse({
+        'status': 'success',
+        'message': f"成功匯入 {stats['created']} 筆打卡記錄{duplicates}（每秒 {stats['rows_per_second']} 列）。",
+        'stats': stats,
+    })
+
+def _import_session_data(session):
+    """匯入工作的狀態資料"""
+    return {
+        'id': session.id,
+        'kind': session.kind,
+        'kind_display': session.get_kind_display(),
+        'status': session.status,
+        'status_display': session.get_status_display(),
+        'original_name': session.original_name,
+        'total_rows': session.total_rows,
+        'processed_rows': session.processed_rows,
+        'last_row_number': session.last_row_number,
+        'progress': session.progress_percent,
+        'created': session.created_count,
+        'updated': session.updated_count,
+        'unchanged': session.unchanged_count,
+        'error_count': session.error_count,
+        'error_message': session.error_message,
+        'error_report_url': reverse('import_session_errors', args=[session.id]),
+        'elapsed_seconds': round(session.elapsed_seconds, 1),
+        'created_at': session.created_at.isoformat(),
+        'started_at': session.started_at.isoformat() if session.started_at else None,
+        'finished_at': session.finished_at.isoformat() if session.finished_at else None,
+    }
+
+@require_POST
+def create_import_session_api(request):
+    """
+    建立可續傳的匯入工作
+
+    表單欄位：file（檔案）、kind（EMPLOYEES 或 PUNCHES）、key（員工資料的識別欄位，預設 employee_id）、
+    chunk_size（每批列數）。檔案保存後立即回應，由工作程序（run_import_worker）分批處理。
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '未授權。'}, status=403)
+
+    uploaded_file = request.FILES.get('file')
+    if not uploaded_file:
+        return JsonResponse({'status': 'error', 'message': '請選擇一個檔案。'}, status=400)
+
+    try:
+        chunk_size = int(request.POST.get('chunk_size') or IMPORT_CHUNK_SIZE)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': '每批列數必須為整數。'}, status=400)
+
+    try:
+        session = create_import_session(
+            uploaded_file,
+            request.POST.get('kind', ''),
+            user=request.user,
+            key_field=request.POST.get('key') or 'employee_id',
+            chunk_size=chunk_size,
+        )
+    except ImportSessionError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'message': '檔案已上傳，匯入工作已排入佇列',
+        'session': _import_session_data(session),
+    })
+
+@require_GET
+def import_session_status(request, session_id):
+    """匯入工作進度 API"""
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '未授權。'}, status=403)
+
+    session = get_object_or_404(ImportSession, id=session_id)
+    return JsonResponse({'status': 'success', 'session': _import_session_data(session)})
+
+@require_POST
+def resume_import_session_api(request, session_id):
+    """將失敗的匯入工作重新排入佇列，從最後提交的批次之後續跑"""
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '未授權。'}, status=403)
+
+    session = get_object_or_404(ImportSession, id=session_id)
+    try:
+        resumed = resume_import_session(session)
+    except ImportSessionError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    if not resumed:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'匯入工作{session.get_status_display()}，無法續跑'
+        })
+
+    session.refresh_from_db()
+    return JsonResponse({
+        'status': 'success',
+        'message': f'匯入工作已重新排入佇列，將從第 {session.last_row_number + 1} 列續跑',
+        'session': _import_session_data(session),
+    })
+
+@require_GET
+def import_session_errors(request, session_id):
+    """下載匯入工作的錯誤報表（CSV）"""
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '未授權。'}, status=403)
+
+    session = get_object_or_404(ImportSession, id=session_id)
+    response = StreamingHttpResponse(iter_error_report(session), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="import_{session.id}_errors.csv"'
+    return response
+
+@require_POST
+def bulk_punch_api(request):
+    """
+    打卡機批次打卡 API
+
+    請求內容為 JSON 陣列或 NDJSON，每筆為 {"employee_id": 員工編號, "punch_type": "IN"/"OUT",
+    "punch_time": "YYYY-MM-DD HH:MM:SS"}；無效的記錄不寫入，已存在的記錄不重複寫入（可安全重送），
+    回應中依輸入順序列出每筆結果。
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '未授權。'}, status=403)
+
+    try:
+        records = parse_punch_payload(request.body, request.content_type)
+    except (UnicodeDecodeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': f'無效的請求內容: {e}'}, status=400)
+
+    if not records:
+        return JsonResponse({'status': 'error', 'message': '沒有打卡記錄。'}, status=400)
+    if len(records) > MAX_BULK_PUNCHES:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'單次最多 {MAX_BULK_PUNCHES} 筆打卡記錄，請分批送出。'
+        }, status=413)
+
+    started = time.perf_counter()
+    try:
+        outcome = ingest_punches(records)
+    except (DatabaseError, OperationalError) as e:
+        logger.error(f'批次打卡寫入時發生資料庫錯誤: {e}')
+        return JsonResponse({
+            'status': 'error',
+            'message': '資料庫操作失敗，請稍後重送。'
+        }, status=503)
+    seconds = time.perf_counter() - started
+    record_import(
+        'bulk_punches', seconds,
+        created=outcome['created'], duplicate=outcome['duplicates'], error=outcome['rejected']
+    )
+    logger.info('批次打卡：寫入 %d 筆，重複 %d 筆，無效 %d 筆，耗時 %.3f 秒',
+                outcome['created'], outcome['duplicates'], outcome['rejected'], seconds)
+
+    duplicates = f"，{outcome['duplicates']} 筆已存在未重複寫入" if outcome['duplicates'] else ''
+    if outcome['rejected']:
+        message = f"{outcome['rejected']} 筆打卡記錄無效，其餘 {outcome['created']} 筆已寫入{duplicates}。"
+    else:
+        message = f"成功寫入 {outcome['created']} 筆打卡記錄{duplicates}。"
+    return JsonResponse({
+        'status': 'error' if outcome['rejected'] else 'success',
+        'message': message,
+        **outcome,
+    })
+
 @require_POST
 def punch_api(request):
-    logger.debug("收到打卡請求: %s", request.body.decode('utf-8'))
+    logger.debug("收到打卡請求: %d bytes", len(request.body))
     if not request.user.is_authenticated or not request.user.is_staff:
         logger.warning("未授權的打卡請求，用戶: %s", request.user)
         return JsonResponse({'status': 'error', 'message': '未授權。'}, status=403)
@@ -266,11 +360,18 @@ def punch_api(request):
         else:
             punch_time = timezone.now()
 
-        Punch.objects.create(
+        # 重送相同的打卡不會重複寫入
+        punch, created = Punch.objects.get_or_create(
             employee=employee,
             punch_time=punch_time,
             punch_type=punch_type
         )
+        if not created:
+            return JsonResponse({
+                'status': 'success',
+                'message': f'{employee.name} 的打卡記錄已存在 ({punch_type})。',
+                'duplicate': True,
+            })
         return JsonResponse({'status': 'success', 'message': f'{employee.name} 已成功打卡 ({punch_type})。'})
 
     except Employee.DoesNotExist:
@@ -329,7 +430,7 @@ def get_pending_leaves_api(request):
     if not request.user.is_authenticated or not request.user.is_staff:
         return JsonResponse({'status': 'error', 'message': '未授權。'}, status=403)
 
-    pending_leaves = Leave.objects.filter(status='PENDING').order_by('-applied_date')
+    pending_leaves = Leave.objects.filter(status='PENDING').select_related('employee').order_by('-applied_date')
     data = []
     for leave in pending_leaves:
         data.append({
@@ -372,8 +473,6 @@ def update_leave_status_api(request):
         return JsonResponse({'status': 'error', 'message': f'更新請假狀態失敗: {e}'})
 
 
-from django.shortcuts import get_object_or_404
-
 def employee_punches_view(request, employee_id):
     employee = get_object_or_404(Employee, pk=employee_id)
     punches = Punch.objects.filter(employee=employee).order_by('-punch_time')
@@ -419,6 +518,36 @@ def health_check(request):
             'timestamp': timezone.now().isoformat()
         }, status=500)
 
+@require_GET
+def query_stats_api(request):
+    """各 URL 的查詢次數與資料庫耗時彙總（本行程）"""
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': '未授權。'}, status=403)
+
+    return JsonResponse({
+        'status': 'success',
+        'worker': os.getpid(),
+        'views': get_query_stats(),
+    })
+
+@require_GET
+def metrics_api(request):
+    """
+    Prometheus 格式的系統指標（彙總 METRICS_DIR 中所有行程的快照）
+
+    抓取端須帶 Authorization: Bearer <METRICS_TOKEN>，或以管理員身分登入；未設定 METRICS_TOKEN 時只允許管理員。
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    if token and authorization:
+        authorized = constant_time_compare(authorization, f'Bearer {token}')
+    else:
+        authorized = request.user.is_authenticated and request.user.is_staff
+    if not authorized:
+        return HttpResponse('未授權。', status=401, content_type='text/plain; charset=utf-8')
+
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def settings_view(request):
     """渲染設定頁面"""
     return render(request, 'employee/settings.html')
\ No newline at end of file
@@ -13,7 +13,9 @@ sys.path.insert(0, project_root)
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HRSystem.settings')
 django.setup()
 
+from django.utils import timezone
 from employee.models import Department, Employee, Salary, Punch, Leave
+from employee.punch_ingest import insert_punches
 
 def create_more_fake_employees():
     """創建更多假員工資料"""
@@ -190,7 +192,7 @@ def generate_detailed_punch_records(employees):
     
     print(f"正在生成從 {two_months_ago} 到 {today} 的打卡記錄...")
     
-    total_records = 0
+    punches = []
     
     # 針對每位員工產生打卡記錄
     for employee in employees:
@@ -246,24 +248,16 @@ def generate_detailed_punch_records(employees):
                 
                 if not forgot_to_punch:
                     # 創建上班打卡記錄
-                    Punch.objects.create(
-                        employee=employee,
-                        punch_time=punch_in_time,
-                        punch_type='IN'
-                    )
-                    total_records += 1
+                    punches.append(Punch(employee=employee, punch_time=timezone.make_aware(punch_in_time), punch_type='IN'))
                     
                     # 創建下班打卡記錄
-                    Punch.objects.create(
-                        employee=employee,
-                        punch_time=punch_out_time,
-                        punch_type='OUT'
-                    )
-                    total_records += 1
+                    punches.append(Punch(employee=employee, punch_time=timezone.make_aware(punch_out_time), punch_type='OUT'))
             
             # 進入下一天
             current_date += timedelta(days=1)
     
+    # 相同員工、時間與類型的打卡已存在時不會重複寫入
+    total_records = len(insert_punches(punches))
     print(f"已為 {len(employees)} 位員工生成 {total_records} 筆打卡記錄")
 
 if __name__ == "__main__":
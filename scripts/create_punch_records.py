@@ -15,6 +15,7 @@ django.setup()
 
 from django.utils import timezone
 from employee.models import Department, Employee, Salary, Punch, Leave
+from employee.punch_ingest import insert_punches
 
 def create_punch_records():
     """創建正確日期時間的打卡記錄"""
@@ -32,7 +33,7 @@ def create_punch_records():
     
     # 獲取所有員工
     employees = Employee.objects.all()
-    total_records = 0
+    punches = []
     
     # 針對每位員工產生打卡記錄
     for employee in employees:
@@ -92,24 +93,16 @@ def create_punch_records():
                 
                 if not forgot_to_punch:
                     # 創建上班打卡記錄
-                    Punch.objects.create(
-                        employee=employee,
-                        punch_time=punch_in_time,
-                        punch_type='IN'
-                    )
-                    total_records += 1
+                    punches.append(Punch(employee=employee, punch_time=punch_in_time, punch_type='IN'))
                     
                     # 創建下班打卡記錄
-                    Punch.objects.create(
-                        employee=employee,
-                        punch_time=punch_out_time,
-                        punch_type='OUT'
-                    )
-                    total_records += 1
+                    punches.append(Punch(employee=employee, punch_time=punch_out_time, punch_type='OUT'))
             
             # 進入下一天
             current_date += timedelta(days=1)
     
+    # 相同員工、時間與類型的打卡已存在時不會重複寫入
+    total_records = len(insert_punches(punches))
     print(f"已為 {employees.count()} 位員工生成 {total_records} 筆打卡記錄")
     return total_records
 
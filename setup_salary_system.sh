@@ -37,6 +37,10 @@ python manage.py makemigrations
 echo "🔄 套用資料庫遷移..."
 python manage.py migrate
 
+# 回填薪資彙總欄位（既有薪資記錄）
+echo "🔄 回填薪資彙總金額..."
+python manage.py backfill_salary_totals
+
 echo "✅ 資料庫遷移完成"
 echo ""
 